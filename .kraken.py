@@ -18,7 +18,35 @@ python.black(additional_files=[__file__, project.directory / "examples"])
 python.flake8()
 python.isort(additional_files=[__file__, project.directory / "examples"])
 python.mypy(additional_args=["--exclude", "src/tests/integration/.*/data/.*"])
-python.pytest(ignore_dirs=["src/tests/integration"])
+python.pytest(ignore_dirs=["src/tests/integration", "src/tests/benchmarks"])
+# The benchmarks of pull requests are compared against a baseline that the `benchmark` CI job recorded with the
+# `pytestBenchmarkBaseline` task for the base branch, on the same kind of runner (see .github/workflows). Absolute
+# timings are not comparable between machines, so without a baseline the results are only reported.
+benchmark_baseline = project.directory / ".benchmarks" / "baseline.json"
+benchmark_baseline.parent.mkdir(exist_ok=True)
+python.pytest(
+    name="pytestBenchmark",
+    tests_dir="src/tests/benchmarks",
+    ignore_dirs=["src/tests/integration"],
+    group="benchmark",
+    doctest_modules=False,
+    # Fail if the minimum time of a benchmark regressed by more than 25%. The minimum is less sensitive to noise
+    # from other processes than the mean.
+    additional_args=["--benchmark-only"]
+    + (
+        [f"--benchmark-compare={benchmark_baseline}", "--benchmark-compare-fail=min:25%"]
+        if benchmark_baseline.is_file()
+        else []
+    ),
+)
+python.pytest(
+    name="pytestBenchmarkBaseline",
+    tests_dir="src/tests/benchmarks",
+    ignore_dirs=["src/tests/integration"],
+    group="benchmarkBaseline",
+    doctest_modules=False,
+    additional_args=["--benchmark-only", f"--benchmark-json={benchmark_baseline}"],
+)
 python.pytest(
     name="pytestIntegration",
     tests_dir="src/tests/integration",
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Collection, Sequence
+from typing import Any, Collection, Sequence
 
 from kraken.core.api import Project
 from nr.stream import Supplier
@@ -20,6 +20,7 @@ from .tasks.cargo_publish_task import CargoPublishTask
 from .tasks.cargo_sync_config_task import CargoSyncConfigTask
 from .tasks.cargo_test_task import CargoTestTask
 from .tasks.cargo_update_task import CargoUpdateTask
+from .tasks.cargo_workspace_publish_task import CargoWorkspacePublishTask
 
 __all__ = [
     "cargo_auth_proxy",
@@ -40,6 +41,7 @@ __all__ = [
     "CargoRegistry",
     "CargoSyncConfigTask",
     "CargoTestTask",
+    "CargoWorkspacePublishTask",
     "cargo_check_toolchain_version",
     "CargoCheckToolchainVersionTask",
 ]
@@ -201,6 +203,7 @@ def cargo_build(
     workspace: bool = False,
     *,
     exclude: Collection[str] = (),
+    fingerprint: bool = False,
     group: str | None = "build",
     name: str | None = None,
     project: Project | None = None,
@@ -213,6 +216,8 @@ def cargo_build(
     :param env: Override variables for the build environment variables. Values in this dictionary override
         variables in :attr:`CargoProject.build_env`.
     :param exclude: List of workspace crates to exclude from the build.
+    :param fingerprint: Skip the build if its inputs and outputs did not change since the last successful build
+        (see :attr:`CargoBuildTask.fingerprint`).
     :param name: The name of the task. If not specified, defaults to `:cargoBuild{mode.capitalised()}`.
     :param version: Bump the Cargo.toml version temporarily while building to the given version."""
 
@@ -238,6 +243,7 @@ def cargo_build(
         target=mode,
         additional_args=additional_args,
         env=Supplier.of_callable(lambda: {**cargo.build_env, **(env or {})}),
+        fingerprint=fingerprint,
     )
     task.add_relationship(f":{CARGO_BUILD_SUPPORT_GROUP_NAME}?")
     return task
@@ -281,6 +287,9 @@ def cargo_publish(
     additional_args: Sequence[str] = (),
     name: str = "cargoPublish",
     package_name: str | None = None,
+    workspace: bool = False,
+    max_workers: int = 4,
+    exclude: Collection[str] = (),
     project: Project | None = None,
 ) -> CargoPublishTask:
     """Creates a task that publishes the create to the specified *registry*.
@@ -293,14 +302,25 @@ def cargo_publish(
         task depend on the auth proxy.
     :param retry_attempts: Retry the publish task if it fails, up to a maximum number of attempts. Sometimes
         cargo publishes can be flakey depending on the destination. Defaults to 0 retries.
+    :param workspace: Publish all crates in the workspace, following the order of their path dependencies. Crates
+        that do not depend on each other are published concurrently. Cannot be combined with *package_name*.
+    :param max_workers: The maximum number of crates to publish concurrently if *workspace* is enabled.
+    :param exclude: Workspace crates to not publish if *workspace* is enabled.
     """
 
+    if workspace and package_name is not None:
+        raise ValueError("cargo_publish(): workspace and package_name cannot be combined")
+
     project = project or Project.current()
     cargo = CargoProject.get_or_create(project)
 
+    kwargs: dict[str, Any] = {}
+    if workspace:
+        kwargs.update(max_workers=max_workers, exclude=list(exclude))
+
     task = project.do(
         f"{name}/{package_name}" if package_name is not None else name,
-        CargoPublishTask,
+        CargoWorkspacePublishTask if workspace else CargoPublishTask,
         False,
         group="publish",
         registry=Supplier.of_callable(lambda: cargo.registries[registry]),
@@ -311,6 +331,7 @@ def cargo_publish(
         retry_attempts=retry_attempts,
         package_name=package_name,
         env=Supplier.of_callable(lambda: {**cargo.build_env, **(env or {})}),
+        **kwargs,
     )
 
     task.add_relationship(f":{CARGO_PUBLISH_SUPPORT_GROUP_NAME}?")
@@ -0,0 +1,75 @@
+"""
+Helpers to fingerprint the inputs and outputs of Cargo builds, which allows tasks to detect that a build is
+up to date without invoking Cargo.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import os
+import subprocess as sp
+from pathlib import Path
+from typing import Collection, Mapping
+
+#: Glob patterns for the files that are considered inputs to a Cargo build by default, relative to the project
+#: directory. A `*` also matches path separators.
+DEFAULT_SOURCE_PATTERNS = (
+    "*.rs",
+    "Cargo.toml",
+    "*/Cargo.toml",
+    "Cargo.lock",
+    ".cargo/config",
+    ".cargo/config.toml",
+    "rust-toolchain",
+    "rust-toolchain.toml",
+)
+
+#: Prefixes of environment variables that influence Cargo builds.
+ENV_PREFIXES = ("CARGO_", "RUST")
+
+_toolchain_versions: dict[tuple[str, str], str] = {}
+
+
+def hash_file(path: Path) -> str:
+    """Returns the SHA256 hex digest of the contents of *path*."""
+
+    hasher = hashlib.sha256()
+    with path.open("rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_source_files(directory: Path, patterns: Collection[str], skip_dirs: Collection[str]) -> dict[str, str]:
+    """Hash all files in *directory* whose POSIX path relative to *directory* matches one of the glob *patterns*.
+    Directories named in *skip_dirs* are not descended into.
+
+    :return: A dictionary that maps the relative paths of the files to their SHA256 hex digests.
+    """
+
+    result: dict[str, str] = {}
+    for root, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(d for d in dirnames if d not in skip_dirs)
+        for filename in sorted(filenames):
+            path = Path(root, filename)
+            relative_path = path.relative_to(directory).as_posix()
+            if any(fnmatch.fnmatchcase(relative_path, pattern) for pattern in patterns):
+                result[relative_path] = hash_file(path)
+    return result
+
+
+def get_toolchain_version(directory: Path, env: Mapping[str, str]) -> str:
+    """Returns the output of `rustc -vV` for the toolchain that is active in *directory*. The result is cached per
+    directory and `RUSTUP_TOOLCHAIN` for the lifetime of the process."""
+
+    key = (str(directory.absolute()), env.get("RUSTUP_TOOLCHAIN", ""))
+    if key not in _toolchain_versions:
+        _toolchain_versions[key] = sp.check_output(["rustc", "-vV"], cwd=directory, env=env).decode()
+    return _toolchain_versions[key]
+
+
+def get_build_env(env: Mapping[str, str]) -> dict[str, str]:
+    """Returns the variables from the process environment that influence Cargo builds, overridden by *env*."""
+
+    return {**{k: v for k, v in os.environ.items() if k.startswith(ENV_PREFIXES)}, **env}
@@ -2,13 +2,15 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
+import os
 import subprocess
-from dataclasses import dataclass, fields
+from dataclasses import dataclass, field, fields
 from enum import Enum
 from pathlib import Path
-from typing import Any, List
+from typing import Any, List, Optional, Tuple
 
 import tomli
 import tomli_w
@@ -16,6 +18,21 @@ from pydantic import ClassError
 
 logger = logging.getLogger(__name__)
 
+#: Directories that are skipped when searching a Cargo workspace for files that affect `cargo metadata`.
+_FINGERPRINT_SKIP_DIRS = frozenset(["target", ".git"])
+
+#: An in-memory cache for :meth:`CargoMetadata.read`, shared by all tasks in the same Kraken run. Maps the
+#: project directory to the workspace fingerprint and the metadata that was read for it.
+_metadata_cache: dict[Path, tuple[str, CargoMetadata]] = {}
+
+#: The files that affect `cargo metadata` for a project directory. The workspace is only searched for them once per
+#: process, see :func:`get_workspace_fingerprint`.
+_fingerprint_files: dict[Path, list[Path]] = {}
+
+#: Maps the project directory and the stat results of its :data:`_fingerprint_files` to the fingerprint of their
+#: contents, so the files only need to be read again if they changed.
+_fingerprint_memo: dict[tuple[Path, str, Tuple[Optional[Tuple[int, ...]], ...]], str] = {}
+
 
 @dataclass
 class Bin:
@@ -52,6 +69,14 @@ class WorkspaceMember:
     edition: str
     manifest_path: Path
 
+    #: Names of the packages that this member depends on via a `path` dependency (excluding dev-dependencies,
+    #: which do not need to be published before the member can be published).
+    path_dependencies: list[str] = field(default_factory=list)
+
+    #: The registries that the member may be published to. `None` means there are no restrictions, an empty
+    #: list means that the member must not be published (`publish = false` in `Cargo.toml`).
+    publish: list[str] | None = None
+
 
 @dataclass
 class CargoMetadata:
@@ -63,7 +88,47 @@ class CargoMetadata:
     target_directory: Path
 
     @classmethod
-    def read(cls, project_dir: Path) -> CargoMetadata:
+    def read(cls, project_dir: Path, cache_file: Path | None = None) -> CargoMetadata:
+        """Read the metadata of the Cargo workspace in *project_dir* using `cargo metadata`.
+
+        The result is cached in memory for the duration of the process and, if a *cache_file* is specified, also
+        on disk. Cache entries are keyed by :func:`get_workspace_fingerprint`, so a change to any `Cargo.toml`,
+        `Cargo.lock` or `.cargo/config.toml` file in the workspace invalidates them.
+
+        :param project_dir: The directory that contains the `Cargo.toml` of the project or workspace.
+        :param cache_file: A JSON file to persist the metadata in (usually located in the build directory).
+        """
+
+        key = project_dir.absolute()
+        fingerprint = get_workspace_fingerprint(key)
+        cached = _metadata_cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        data: dict[str, Any] | None = None
+        if cache_file is not None and cache_file.is_file():
+            try:
+                payload = json.loads(cache_file.read_text())
+            except (OSError, ValueError) as exc:
+                logger.warning("ignoring unreadable Cargo metadata cache %s (%s)", cache_file, exc)
+            else:
+                if isinstance(payload, dict) and payload.get("fingerprint") == fingerprint:
+                    data = payload["data"]
+
+        if data is None:
+            data = cls._run_cargo_metadata(project_dir)
+            if cache_file is not None:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+                tmp_file.write_text(json.dumps({"fingerprint": fingerprint, "data": data}))
+                os.replace(tmp_file, cache_file)
+
+        metadata = cls.of(project_dir, data)
+        _metadata_cache[key] = (fingerprint, metadata)
+        return metadata
+
+    @staticmethod
+    def _run_cargo_metadata(project_dir: Path) -> dict[str, Any]:
         cmd = [
             "cargo",
             "metadata",
@@ -90,7 +155,8 @@ class CargoMetadata:
             )
             raise RuntimeError("Could not read cargo metadata. Please see logs for instructions.")
         else:
-            return cls.of(project_dir, json.loads(result.stdout.decode("utf-8")))
+            data: dict[str, Any] = json.loads(result.stdout.decode("utf-8"))
+            return data
 
     @classmethod
     def of(cls, path: Path, data: dict[str, Any]) -> CargoMetadata:
@@ -99,9 +165,20 @@ class CargoMetadata:
         for package in data["packages"]:
             id = package["id"]
             if id in data["workspace_members"]:
+                path_dependencies = [
+                    dep["name"]
+                    for dep in package.get("dependencies", [])
+                    if dep.get("path") is not None and dep.get("kind") != "dev"
+                ]
                 workspace_members.append(
                     WorkspaceMember(
-                        id, package["name"], package["version"], package["edition"], Path(package["manifest_path"])
+                        id,
+                        package["name"],
+                        package["version"],
+                        package["edition"],
+                        Path(package["manifest_path"]),
+                        path_dependencies,
+                        package.get("publish"),
                     )
                 )
                 for target in package["targets"]:
@@ -113,6 +190,76 @@ class CargoMetadata:
         return cls(path, data, workspace_members, artifacts, Path(data["target_directory"]))
 
 
+def get_workspace_fingerprint(project_dir: Path) -> str:
+    """Compute a fingerprint over all files that influence the output of `cargo metadata` for the workspace in
+    *project_dir*. This includes every `Cargo.toml` and `Cargo.lock` in the workspace, the manifest and lock file of
+    the workspace root if *project_dir* is a workspace member, `.cargo/config.toml` (or the legacy `.cargo/config`)
+    in the workspace and its parent directories, and the `CARGO_TARGET_DIR` variable.
+
+    The workspace is searched for these files only once per process. After that, the files are only read again if
+    their stat results changed.
+    """
+
+    files = _fingerprint_files.get(project_dir)
+    if files is None:
+        files = _fingerprint_files[project_dir] = _find_fingerprint_files(project_dir)
+
+    signature = (project_dir, os.getenv("CARGO_TARGET_DIR", ""), tuple(_stat_signature(path) for path in files))
+    fingerprint = _fingerprint_memo.get(signature)
+    if fingerprint is not None:
+        return fingerprint
+
+    hasher = hashlib.sha256()
+    hasher.update(os.getenv("CARGO_TARGET_DIR", "").encode())
+    for path in files:
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            continue
+        hasher.update(str(path).encode() + b"\0")
+        hasher.update(hashlib.sha256(content).digest())
+    fingerprint = _fingerprint_memo[signature] = hasher.hexdigest()
+    return fingerprint
+
+
+def _find_fingerprint_files(project_dir: Path) -> list[Path]:
+    # The manifest and lock file of the project are included even if they don't exist yet.
+    files = [project_dir / "Cargo.toml", project_dir / "Cargo.lock"]
+    for root, dirnames, filenames in os.walk(project_dir):
+        dirnames[:] = sorted(d for d in dirnames if d not in _FINGERPRINT_SKIP_DIRS)
+        for filename in sorted(filenames):
+            if filename in ("Cargo.toml", "Cargo.lock"):
+                files.append(Path(root, filename))
+            elif os.path.basename(root) == ".cargo" and filename in ("config.toml", "config"):
+                files.append(Path(root, filename))
+
+    # Like Cargo, search the parent directories for the workspace root if the project is a workspace member.
+    in_workspace = _is_workspace_root(project_dir / "Cargo.toml")
+    for parent in project_dir.parents:
+        files += [parent / ".cargo" / "config.toml", parent / ".cargo" / "config"]
+        if not in_workspace and (parent / "Cargo.toml").is_file():
+            files += [parent / "Cargo.toml", parent / "Cargo.lock"]
+            in_workspace = _is_workspace_root(parent / "Cargo.toml")
+
+    return list(dict.fromkeys(files))
+
+
+def _is_workspace_root(manifest: Path) -> bool:
+    try:
+        with manifest.open("rb") as fp:
+            return "workspace" in tomli.load(fp)
+    except (OSError, tomli.TOMLDecodeError):
+        return False
+
+
+def _stat_signature(path: Path) -> tuple[int, ...] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
 @dataclass
 class Package:
     name: str
@@ -0,0 +1,116 @@
+"""
+Parse the JSON messages that Cargo emits with `--message-format=json` (see
+https://doc.rust-lang.org/cargo/reference/external-tools.html#json-messages).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+#: Crate types of library targets.
+LIBRARY_KINDS = frozenset(["lib", "rlib", "dylib", "cdylib", "staticlib", "proc-macro"])
+
+
+@dataclass
+class CargoArtifact:
+    name: str
+    path: Path
+
+
+@dataclass
+class CargoMessageCollector:
+    """Collects the artifacts and statistics of a Cargo build from its JSON messages. Only artifacts of local
+    (path) packages are collected, and artifacts built in test mode are ignored."""
+
+    #: The executables that have been built.
+    binaries: list[CargoArtifact] = field(default_factory=list)
+
+    #: The library files that have been built.
+    libraries: list[CargoArtifact] = field(default_factory=list)
+
+    #: The number of units that were up to date.
+    fresh: int = 0
+
+    #: The number of units that were (re)built.
+    rebuilt: int = 0
+
+    #: The compile time in seconds per package, summed over all of its units (e.g. the library, binaries and the
+    #: build script). Cargo only emits this information with `--timings=json`.
+    timings: dict[str, float] = field(default_factory=dict)
+
+    #: The `timing-info` messages, one per unit (i.e. per target, mode and package).
+    unit_timings: list[dict[str, Any]] = field(default_factory=list)
+
+    #: Set from the `build-finished` message.
+    success: bool | None = None
+
+    def feed(self, line: str) -> bool:
+        """Process a line of Cargo's output. Returns `False` if the line is not a JSON message, in which case the
+        caller should pass it through to the user."""
+
+        if not line.startswith("{"):
+            return False
+        try:
+            message: dict[str, Any] = json.loads(line)
+        except json.JSONDecodeError:
+            return False
+
+        reason = message.get("reason")
+        if reason == "compiler-artifact":
+            self._on_compiler_artifact(message)
+        elif reason == "timing-info":
+            name = get_package_name(message["package_id"])
+            self.timings[name] = self.timings.get(name, 0.0) + float(message["duration"])
+            self.unit_timings.append(message)
+        elif reason == "build-finished":
+            self.success = bool(message["success"])
+        elif reason == "compiler-message":
+            # Only emitted with --message-format=json; with json-render-diagnostics, Cargo renders them itself.
+            rendered = message["message"].get("rendered")
+            if rendered:
+                logger.info("%s", rendered.rstrip())
+        return True
+
+    def _on_compiler_artifact(self, message: dict[str, Any]) -> None:
+        if message["fresh"]:
+            self.fresh += 1
+        else:
+            self.rebuilt += 1
+
+        if message["profile"]["test"] or not is_local_package(message["package_id"]):
+            return
+
+        target = message["target"]
+        if "bin" in target["kind"] and message.get("executable"):
+            self.binaries.append(CargoArtifact(target["name"], Path(message["executable"])))
+        elif LIBRARY_KINDS.intersection(target["kind"]):
+            for filename in message["filenames"]:
+                # The .rmeta files only contain metadata for the compiler and are not useful as an artifact.
+                if not filename.endswith(".rmeta"):
+                    self.libraries.append(CargoArtifact(f"lib{target['name']}", Path(filename)))
+
+
+def is_local_package(package_id: str) -> bool:
+    """Returns `True` if the *package_id* refers to a package on the local filesystem (e.g. a workspace member),
+    as opposed to a package from a registry or Git repository. Supports both the `name version (source)` format
+    and the package ID specification format (`path+file:///path#name@version`) used by Cargo 1.77 and later."""
+
+    return package_id.startswith("path+file://") or "(path+file://" in package_id
+
+
+def get_package_name(package_id: str) -> str:
+    """Extract the package name from a *package_id* in either of the formats supported by :func:`is_local_package`."""
+
+    if " " in package_id:
+        return package_id.split(" ", 1)[0]
+    url, _, fragment = package_id.partition("#")
+    if "@" in fragment:
+        return fragment.split("@", 1)[0]
+    # The name is omitted if it matches the last path component of the URL.
+    return url.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
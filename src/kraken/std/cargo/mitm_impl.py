@@ -1,50 +1,546 @@
+"""
+An HTTP(S) proxy server built on :mod:`asyncio` that intercepts TLS connections to hosts for which credentials are
+configured and injects them into every request using HTTP Basic authentication. Connections to other hosts are
+tunneled through unmodified.
+"""
+
 from __future__ import annotations
 
+import asyncio
 import base64
-import json
+import datetime
+import ipaddress
 import logging
-import os
-from typing import Optional, TypeVar
+import ssl
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
 
-from proxy.http.parser import HttpParser
-from proxy.http.proxy.plugin import HttpProxyBasePlugin
+import certifi
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+from cryptography.x509.oid import NameOID
 
 logger = logging.getLogger(__name__)
-T = TypeVar("T")
 
+#: The buffer size to use when copying data between connections.
+_CHUNK_SIZE = 64 * 1024
+
+#: Headers are a list of (name, value) tuples to preserve their order and case.
+Headers = List[Tuple[str, str]]
+
+
+class CertificateAuthority:
+    """Creates certificates for intercepted hosts, signed by a CA certificate that the client trusts. The CA key is
+    also used as the key of the host certificates, which saves us from generating a new key for every proxy."""
+
+    def __init__(self, cert_file: Path, key_file: Path, directory: Path) -> None:
+        """
+        :param cert_file: The CA certificate.
+        :param key_file: The private key of the CA certificate.
+        :param directory: A directory to write the host certificates to.
+        """
+
+        self._key_file = key_file
+        self._directory = directory
+        self._ca_cert = x509.load_pem_x509_certificate(cert_file.read_bytes())
+        key = serialization.load_pem_private_key(key_file.read_bytes(), password=None)
+        if not isinstance(key, RSAPrivateKey):
+            raise ValueError(f"expected an RSA private key in {key_file}")
+        self._ca_key = key
+        self._contexts: Dict[str, ssl.SSLContext] = {}
+        self._lock = threading.Lock()
+
+    def _create_certificate(self, host: str) -> Path:
+        try:
+            san: x509.GeneralName = x509.IPAddress(ipaddress.ip_address(host))
+        except ValueError:
+            san = x509.DNSName(host)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, host)]))
+            .issuer_name(self._ca_cert.subject)
+            .public_key(self._ca_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=365))
+            .add_extension(x509.SubjectAlternativeName([san]), critical=False)
+            .sign(self._ca_key, hashes.SHA256())
+        )
+        cert_file = self._directory / f"{host}.pem"
+        cert_file.write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+        return cert_file
+
+    def get_server_context(self, host: str) -> ssl.SSLContext:
+        """Returns an SSL context to serve TLS connections for *host* with."""
+
+        with self._lock:
+            if host not in self._contexts:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+                context.load_cert_chain(self._create_certificate(host), self._key_file)
+                context.set_alpn_protocols(["http/1.1"])
+                self._contexts[host] = context
+            return self._contexts[host]
+
+
+class _Connection(NamedTuple):
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    idle_since: float
+
+
+class UpstreamConnectionPool:
+    """A pool of keep-alive connections to upstream servers, keyed by host, port and whether TLS is used."""
+
+    def __init__(
+        self,
+        ssl_context: ssl.SSLContext,
+        max_idle_per_host: int = 16,
+        idle_timeout: float = 30.0,
+        connect_timeout: float | None = None,
+    ) -> None:
+        self._ssl_context = ssl_context
+        self._max_idle_per_host = max_idle_per_host
+        self._idle_timeout = idle_timeout
+        self._connect_timeout = connect_timeout
+        self._idle: Dict[Tuple[str, int, bool], List[_Connection]] = {}
+
+    async def acquire(self, host: str, port: int, tls: bool) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        """Returns a connection to the upstream server and whether it is a reused connection."""
+
+        idle = self._idle.get((host, port, tls), [])
+        while idle:
+            conn = idle.pop()
+            if conn.reader.at_eof() or time.perf_counter() - conn.idle_since > self._idle_timeout:
+                conn.writer.close()
+                continue
+            return conn.reader, conn.writer, True
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host,
+                port,
+                ssl=self._ssl_context if tls else None,
+                server_hostname=host if tls else None,
+                limit=_CHUNK_SIZE,
+            ),
+            self._connect_timeout,
+        )
+        return reader, writer, False
+
+    def release(
+        self,
+        host: str,
+        port: int,
+        tls: bool,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        reusable: bool,
+    ) -> None:
+        """Return a connection to the pool. Connections that are not *reusable* are closed."""
 
-def not_none(v: T | None) -> T:
-    assert v is not None
-    return v
+        idle = self._idle.setdefault((host, port, tls), [])
+        if not reusable or reader.at_eof() or len(idle) >= self._max_idle_per_host:
+            writer.close()
+        else:
+            idle.append(_Connection(reader, writer, time.perf_counter()))
 
+    def close(self) -> None:
+        for connections in self._idle.values():
+            for conn in connections:
+                conn.writer.close()
+        self._idle.clear()
 
-class AuthInjector(HttpProxyBasePlugin):
-    """This proxy.py plugin injects credentials according to the `INJECT_AUTH` environment variable."""
 
-    # TODO (@NiklasRosenstein): Find a better way than environment variables to pass configuration to this plugin.
+class AuthProxyServer:
+    """An HTTP(S) proxy server that injects Basic-auth credentials into requests to the hosts in *auth*. HTTPS
+    connections to these hosts are intercepted with certificates issued by *ca*, connections to all other hosts are
+    tunneled through as-is."""
 
-    _auth: dict[str, tuple[str, str]] | None = None
+    def __init__(
+        self,
+        auth: dict[str, tuple[str, str]],
+        ca: CertificateAuthority,
+        host: str = "127.0.0.1",
+        port: int = 8899,
+        timeout: float | None = None,
+        upstream_ssl_context: ssl.SSLContext | None = None,
+    ) -> None:
+        """
+        :param auth: Maps host names to the `(username, password)` to inject into requests to the host.
+        :param ca: The certificate authority to issue certificates for intercepted hosts with.
+        :param host: The address to bind the proxy to.
+        :param port: The port to bind the proxy to. Use `0` to pick a free port.
+        :param timeout: Timeout in seconds for idle client connections and for connecting to upstream servers.
+        :param upstream_ssl_context: The SSL context to connect to upstream servers with. Defaults to a context that
+            verifies certificates against the :mod:`certifi` CA bundle.
+        """
+
+        if upstream_ssl_context is None:
+            upstream_ssl_context = ssl.create_default_context(cafile=certifi.where())
+            upstream_ssl_context.set_alpn_protocols(["http/1.1"])
+
+        self._auth = auth
+        self._ca = ca
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._pool = UpstreamConnectionPool(upstream_ssl_context, connect_timeout=timeout)
+        self._server: asyncio.base_events.Server | None = None
+        self._handlers: Set[asyncio.Task[Any]] = set()
+        self._active_requests = 0
+
+    @property
+    def port(self) -> int:
+        """The port that the proxy is bound to. Only available after :meth:`start`."""
+
+        assert self._server is not None, "server is not started"
+        return int(self._server.sockets[0].getsockname()[1])
 
     @property
-    def auth(self) -> dict[str, tuple[str, str]]:
-        if self._auth is None:
-            self._auth = json.loads(os.environ["INJECT_AUTH"])
-        return self._auth
+    def active_requests(self) -> int:
+        """The number of requests and tunnels that are currently being served."""
+
+        return self._active_requests
+
+    async def start(self) -> None:
+        """Bind the server socket and start accepting connections."""
+
+        self._server = await asyncio.start_server(self._handle_client, self._host, self._port, limit=_CHUNK_SIZE)
+        logger.info("proxy server listening on %s:%s", self._host, self.port)
+
+    async def stop(self) -> None:
+        """Stop accepting connections and close all open connections."""
+
+        if self._server is not None:
+            self._server.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        if self._handlers:
+            await asyncio.wait(self._handlers)
+        if self._server is not None:
+            await self._server.wait_closed()
+        self._pool.close()
+
+    def _inject_auth(self, host: str, method: str, headers: Headers) -> None:
+        if host in self._auth and _get_header(headers, "authorization") is None:
+            logger.debug("injecting Authorization for %s request to %s", method, host)
+            username, password = self._auth[host]
+            token = base64.b64encode(f"{username}:{password}".encode()).decode()
+            headers.append(("Authorization", f"Basic {token}"))
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self._handlers.add(task)
+        try:
+            head = await asyncio.wait_for(_read_head(reader), self._timeout)
+            if head is None:
+                return
+            start_line, headers = head
+            method, target, _version = start_line.split(" ", 2)
+            if method == "CONNECT":
+                host, _, port = target.rpartition(":")
+                writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+                await writer.drain()
+                if host in self._auth:
+                    reader, writer = await _start_tls(reader, writer, self._ca.get_server_context(host))
+                    await self._serve_requests(reader, writer, (host, int(port), True), None)
+                else:
+                    await self._tunnel(reader, writer, host, int(port))
+            else:
+                await self._serve_requests(reader, writer, None, head)
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError, ssl.SSLError) as exc:
+            logger.debug("closing client connection (%s: %s)", type(exc).__name__, exc)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("unhandled exception in proxy connection handler")
+        finally:
+            writer.close()
+            self._handlers.discard(task)
+
+    async def _tunnel(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, port: int) -> None:
+        upstream_reader, upstream_writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, limit=_CHUNK_SIZE), self._timeout
+        )
+        self._active_requests += 1
+        try:
+            await asyncio.gather(_pipe(reader, upstream_writer), _pipe(upstream_reader, writer))
+        finally:
+            self._active_requests -= 1
+            upstream_writer.close()
+
+    async def _serve_requests(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        origin: tuple[str, int, bool] | None,
+        head: tuple[str, Headers] | None,
+    ) -> None:
+        """Serve requests from the client until it closes the connection. If *origin* is set, the requests are sent
+        to that host (this is the case in an intercepted tunnel), otherwise the requests must specify an absolute
+        URL (plain HTTP proxy requests)."""
+
+        while True:
+            if head is None:
+                head = await asyncio.wait_for(_read_head(reader), self._timeout)
+                if head is None:
+                    return
+            start_line, headers = head
+            head = None
+            method, target, version = start_line.split(" ", 2)
+
+            if origin is None:
+                if not target.startswith("http://"):
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    return
+                netloc, _, path = target.split("://", 1)[1].partition("/")
+                host, _, port = netloc.partition(":")
+                upstream = (host, int(port or 80), False)
+                start_line = f"{method} /{path} {version}"
+            else:
+                upstream = origin
+
+            _remove_header(headers, "proxy-connection")
+            _remove_header(headers, "proxy-authorization")
+            if (_get_header(headers, "expect") or "").lower() == "100-continue":
+                _remove_header(headers, "expect")
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            self._inject_auth(upstream[0], method, headers)
+
+            self._active_requests += 1
+            try:
+                keep_alive = await self._forward(reader, writer, upstream, method, start_line, headers)
+            finally:
+                self._active_requests -= 1
+            if not keep_alive or not _is_keep_alive(version, headers):
+                return
+
+    async def _forward(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        upstream: tuple[str, int, bool],
+        method: str,
+        start_line: str,
+        headers: Headers,
+    ) -> bool:
+        """Forward a request to the *upstream* server and relay the response back to the client. Returns `False`
+        if the client connection can not be used for further requests."""
+
+        has_request_body = _get_header(headers, "content-length") not in (None, "0") or _is_chunked(headers)
+
+        while True:
+            up_reader, up_writer, reused = await self._pool.acquire(*upstream)
+            reusable = False
+            try:
+                up_writer.write(_render_head(start_line, headers))
+                if has_request_body:
+                    await _relay_body(reader, up_writer, headers, until_eof=False)
+                await up_writer.drain()
+                response = await _read_head(up_reader)
+                while response is not None and response[0].split(" ", 2)[1].startswith("1"):
+                    # Informational responses; the final response follows.
+                    writer.write(_render_head(*response))
+                    response = await _read_head(up_reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused or has_request_body:
+                    raise
+                response = None
+            if response is None:
+                self._pool.release(*upstream, up_reader, up_writer, False)
+                if reused and not has_request_body:
+                    # The server closed the idle connection before we could use it, try again with a new one.
+                    continue
+                raise ConnectionError(f"upstream {upstream[0]}:{upstream[1]} closed the connection")
+            break
+
+        try:
+            status_line, response_headers = response
+            _, status, _ = (status_line.split(" ", 2) + [""])[:3]
+            writer.write(_render_head(status_line, response_headers))
+            has_body = method != "HEAD" and status not in ("204", "304")
+            length_known = _is_chunked(response_headers) or _get_header(response_headers, "content-length") is not None
+            if has_body:
+                await _relay_body(up_reader, writer, response_headers, until_eof=True)
+            await writer.drain()
+            reusable = _is_keep_alive(status_line.split(" ", 1)[0], response_headers) and (length_known or not has_body)
+        finally:
+            self._pool.release(*upstream, up_reader, up_writer, reusable)
+
+        return length_known or not has_body
+
+
+class AuthProxyThread:
+    """Runs an :class:`AuthProxyServer` in a background thread with its own event loop."""
+
+    def __init__(self, server: AuthProxyServer) -> None:
+        self.server = server
+        self._thread = threading.Thread(target=self._run, name="AuthProxyThread", daemon=True)
+        self._ready = threading.Event()
+        self._error: BaseException | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stop_event: asyncio.Event | None = None
+
+    def _run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_event_loop()
+        self._stop_event = asyncio.Event()
+        try:
+            await self.server.start()
+        except BaseException as exc:
+            self._error = exc
+            return
+        finally:
+            self._ready.set()
+        try:
+            await self._stop_event.wait()
+        finally:
+            await self.server.stop()
+
+    def start(self) -> None:
+        """Start the thread and block until the server socket is bound.
+
+        :raise OSError: If the server socket could not be bound.
+        """
+
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Wait up to *timeout* seconds until the server has no more requests in flight. Returns `True` if the server
+        is idle."""
+
+        deadline = time.perf_counter() + timeout
+        while self.server.active_requests > 0:
+            if time.perf_counter() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, drain_timeout: float = 0.0) -> None:
+        """Stop the server and wait for the thread to finish. Requests that are in flight get up to *drain_timeout*
+        seconds to complete before their connections are closed."""
+
+        if drain_timeout > 0 and not self.wait_idle(drain_timeout):
+            logger.warning("stopping proxy server with %s request(s) in flight", self.server.active_requests)
+        if self._loop is not None and self._stop_event is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        self._thread.join()
+
+
+async def _start_tls(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, context: ssl.SSLContext
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Upgrade the server side of a connection to TLS. Returns the streams to use for the encrypted connection."""
+
+    loop = asyncio.get_event_loop()
+    tls_reader = asyncio.StreamReader(limit=_CHUNK_SIZE)
+    protocol = asyncio.StreamReaderProtocol(tls_reader)
+    transport = await loop.start_tls(writer.transport, protocol, context, server_side=True)
+    assert transport is not None
+    protocol.connection_made(transport)
+    return tls_reader, asyncio.StreamWriter(transport, protocol, tls_reader, loop)
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Optional[tuple[str, Headers]]:
+    """Read the start line and headers of an HTTP message. Returns `None` if the connection was closed before
+    a message started."""
+
+    try:
+        data = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial.strip():
+            return None
+        raise
+    lines = data.decode("latin-1").split("\r\n")
+    headers: Headers = []
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+
+def _render_head(start_line: str, headers: Headers) -> bytes:
+    return "".join([start_line, "\r\n", *(f"{name}: {value}\r\n" for name, value in headers), "\r\n"]).encode("latin-1")
+
+
+def _get_header(headers: Headers, name: str) -> str | None:
+    return next((value for key, value in headers if key.lower() == name), None)
+
+
+def _remove_header(headers: Headers, name: str) -> None:
+    headers[:] = [(key, value) for key, value in headers if key.lower() != name]
+
+
+def _is_chunked(headers: Headers) -> bool:
+    return "chunked" in (_get_header(headers, "transfer-encoding") or "").lower()
+
+
+def _is_keep_alive(version: str, headers: Headers) -> bool:
+    connection = (_get_header(headers, "connection") or "").lower()
+    if version == "HTTP/1.0":
+        return "keep-alive" in connection
+    return "close" not in connection
+
+
+async def _copy_exactly(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, size: int) -> None:
+    while size > 0:
+        chunk = await reader.read(min(size, _CHUNK_SIZE))
+        if not chunk:
+            raise asyncio.IncompleteReadError(b"", size)
+        writer.write(chunk)
+        await writer.drain()
+        size -= len(chunk)
 
-    def handle_client_request(self, request: HttpParser) -> Optional[HttpParser]:
-        # NOTE (@NiklasRosenstein): This method is only called for requests in an HTTPS tunnel if TLS
-        #       interception is enabled, which requires a self-signed CA-certificate.
 
-        if not request.method or not request.headers:
-            return request
+async def _relay_body(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: Headers, until_eof: bool
+) -> None:
+    """Relay the body of an HTTP message from *reader* to *writer*. If the message specifies neither a chunked
+    transfer encoding nor a content length, the body is read until the connection is closed if *until_eof* is set,
+    otherwise it is assumed that there is no body."""
 
-        method = request.method.decode()
-        host = not_none(request.headers)[b"host"][1].partition(b":")[0].decode()
+    content_length = _get_header(headers, "content-length")
+    if _is_chunked(headers):
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            writer.write(line)
+            size = int(line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # Relay the trailers, terminated by an empty line.
+                while line != b"\r\n":
+                    line = await reader.readuntil(b"\r\n")
+                    writer.write(line)
+                break
+            await _copy_exactly(reader, writer, size + 2)
+    elif content_length is not None:
+        await _copy_exactly(reader, writer, int(content_length))
+    elif until_eof:
+        await _pipe(reader, writer, close=False)
 
-        if method != "CONNECT" and host in self.auth and not request.has_header(b"Authorization"):
-            logger.info("injecting Authorization for %s request to %s", not_none(request.method).decode(), host)
-            creds = self.auth[host]
-            auth = base64.b64encode(f"{creds[0]}:{creds[1]}".encode())
-            request.add_header(b"Authorization", b"Basic " + auth)
 
-        return request
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, close: bool = True) -> None:
+    try:
+        while True:
+            chunk = await reader.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+            await writer.drain()
+    finally:
+        if close and writer.can_write_eof():
+            try:
+                writer.write_eof()
+            except OSError:
+                pass
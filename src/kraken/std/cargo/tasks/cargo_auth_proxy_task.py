@@ -3,8 +3,9 @@ from __future__ import annotations
 import contextlib
 import logging
 import time
+import warnings
 from pathlib import Path
-from typing import Iterator, List
+from typing import Iterator, List, Optional
 from urllib.parse import urlparse
 
 import tomli
@@ -40,12 +41,18 @@ class CargoAuthProxyTask(BackgroundTask):
     #: The path to the certificate file that needs to be trusted in order to talk to the proxy over HTTPS.
     proxy_cert_file: Property[Path] = Property.output()
 
-    #: The number of seconds to wait after the proxy started.
-    startup_wait_time: Property[float] = Property.default(1.0)
+    #: The maximum number of seconds to wait for requests that are still in flight when the proxy is stopped.
+    shutdown_timeout: Property[float] = Property.default(10.0)
 
-    #: The number of seconds the proxy must be alive at least before terminating it. This is to avoid cryptic error
-    #: messages if the proxy is killed during it's startup time.
-    min_lifetime: Property[float] = Property.default(2.0)
+    #: The number of seconds it took to start the proxy. The proxy accepts connections once it has started.
+    proxy_wait_time: Property[float] = Property.output()
+
+    #: Deprecated and ignored. The task is started as soon as the proxy accepts connections.
+    startup_wait_time: Property[Optional[float]] = Property.default(None)
+
+    #: Deprecated and ignored. The proxy is stopped as soon as no more requests are in flight, see
+    #: :attr:`shutdown_timeout`.
+    min_lifetime: Property[Optional[float]] = Property.default(None)
 
     @contextlib.contextmanager
     def _inject_config(self) -> Iterator[None]:
@@ -87,6 +94,12 @@ class CargoAuthProxyTask(BackgroundTask):
     def start_background_task(self, exit_stack: contextlib.ExitStack) -> TaskStatus:
         from ..mitm import mitm_auth_proxy
 
+        for prop in (self.startup_wait_time, self.min_lifetime):
+            if prop.get() is not None:
+                warnings.warn(
+                    f"{self.path}: the `{prop.name}` property is deprecated and has no effect", DeprecationWarning
+                )
+
         auth: dict[str, tuple[str, str]] = {}
         for registry in self.registries.get():
             if not registry.read_credentials:
@@ -94,27 +107,20 @@ class CargoAuthProxyTask(BackgroundTask):
             host = not_none(urlparse(registry.index).hostname)
             auth[host] = registry.read_credentials
 
+        # The proxy accepts connections by the time the context is entered, so there is no need to poll it.
+        start_time = time.perf_counter()
         try:
-            proxy_url, cert_file = exit_stack.enter_context(mitm_auth_proxy(auth=auth, port=self.proxy_port.get()))
-        except FileNotFoundError as exc:
-            return TaskStatus.skipped(
-                f"Could not start proxy ({exc}). This may cause errors when Cargo tries to fetch dependencies. "
-                "Please run `pipx install proxy.py; pipx inject proxy.py certifi`."
+            proxy_url, cert_file = exit_stack.enter_context(
+                mitm_auth_proxy(auth=auth, port=self.proxy_port.get(), drain_timeout=self.shutdown_timeout.get())
             )
+        except OSError as exc:
+            return TaskStatus.failed(f"Could not start proxy ({exc}).")
+        self.proxy_wait_time.set(time.perf_counter() - start_time)
 
         self.proxy_url.set(proxy_url)
         exit_stack.callback(lambda: self.proxy_url.clear())
         self.proxy_cert_file.set(cert_file)
         exit_stack.callback(lambda: self.proxy_cert_file.clear())
 
-        # Make sure the proxy is alive for at least a certain amount of time to avoid a cryptic error message.
-        self._start_time = time.perf_counter()
-        exit_stack.callback(
-            lambda: time.sleep(max(0, self.min_lifetime.get() - (time.perf_counter() - self._start_time)))
-        )
-
-        # Give the proxy some time to start up.
-        time.sleep(self.startup_wait_time.get())
-
         exit_stack.enter_context(self._inject_config())
         return TaskStatus.started()
@@ -1,15 +1,32 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
 import shlex
 import subprocess as sp
+import sys
 import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 from kraken.core.api import Project, Property, Task, TaskStatus
 
-from kraken.std.cargo.manifest import ArtifactKind, CargoMetadata
+from kraken.std.cargo.fingerprint import (
+    DEFAULT_SOURCE_PATTERNS,
+    get_build_env,
+    get_toolchain_version,
+    hash_file,
+    hash_source_files,
+)
+from kraken.std.cargo.messages import CargoMessageCollector
+from kraken.std.cargo.timings import (
+    CrateTimingRegression,
+    compare_crate_timings,
+    read_timings_report,
+    write_timings_report,
+)
 from kraken.std.descriptors.resource import BinaryArtifact, LibraryArtifact
 
 
@@ -28,7 +45,7 @@ class CargoBuildTask(Task):
     credentials configured in :attr:`CargoProjectSettings.auth`."""
 
     #: The build target (debug or release). If this is anything else, the :attr:`out_binaries` will be set
-    #: to an empty list instead of parsed from the Cargo manifest.
+    #: to an empty list instead of parsed from Cargo's JSON messages.
     target: Property[str]
 
     #: Additional arguments to pass to the Cargo command-line.
@@ -43,14 +60,55 @@ class CargoBuildTask(Task):
     #: Number of times to retry before failing this job
     retry_attempts: Property[int] = Property.default(0)
 
+    #: Number of seconds to wait between retries.
+    retry_delay: Property[float] = Property.default(10.0)
+
+    #: If enabled, a fingerprint of the build inputs (the files matching :attr:`fingerprint_patterns`, the
+    #: environment, the Cargo command and the Rust toolchain version) and of the produced artifacts is stored in the
+    #: build directory after a successful build. The task is then up to date without invoking Cargo for as long as
+    #: the fingerprint does not change.
+    fingerprint: Property[bool] = Property.default(False)
+
+    #: Glob patterns for the files that are inputs to the build, relative to the project directory. A `*` also
+    #: matches path separators. The Cargo target directory and the Kraken build directory are never considered.
+    fingerprint_patterns: Property[List[str]] = Property.default_factory(lambda: list(DEFAULT_SOURCE_PATTERNS))
+
+    #: If enabled, the build runs with `--timings=json` to record the compile time of every crate in a report in the
+    #: build directory, which is compared against the report of the previous build to detect regressions. This is an
+    #: unstable Cargo option, so it requires a nightly toolchain or `RUSTC_BOOTSTRAP=1` in the :attr:`env`.
+    timings: Property[bool] = Property.default(False)
+
+    #: The relative increase in a crate's compile time above which it is reported as a regression.
+    timing_regression_threshold: Property[float] = Property.default(0.2)
+
+    #: The absolute increase in seconds that a crate's compile time must exceed to be reported as a regression.
+    timing_regression_min_seconds: Property[float] = Property.default(1.0)
+
+    #: Fail the task if the compile time of any crate regressed.
+    fail_on_timing_regression: Property[bool] = Property.default(False)
+
     #: An output property for the Cargo binaries that are being produced by this build.
     out_binaries: Property[List[CargoBinaryArtifact]] = Property.output()
 
     #: An output property for the Cargo libraries that are being produced by this build.
     out_libraries: Property[List[CargoLibraryArtifact]] = Property.output()
 
+    #: The compile time in seconds per crate. Cargo only reports these when the build runs with `--timings=json`.
+    out_crate_timings: Property[Dict[str, float]] = Property.output()
+
+    #: The number of units (i.e. crate targets) that Cargo considered up to date.
+    out_fresh_count: Property[int] = Property.output()
+
+    #: The number of units (i.e. crate targets) that Cargo had to build.
+    out_rebuilt_count: Property[int] = Property.output()
+
+    #: The crates whose compile time regressed compared to the previous build. Only set if :attr:`timings` is
+    #: enabled.
+    out_timing_regressions: Property[List[CrateTimingRegression]] = Property.output()
+
     def __init__(self, name: str, project: Project) -> None:
         super().__init__(name, project)
+        self._input_fingerprint: str | None = None
 
     def get_description(self) -> str | None:
         command = self.get_cargo_command({})
@@ -69,59 +127,203 @@ class CargoBuildTask(Task):
     def make_safe(self, args: List[str], env: Dict[str, str]) -> None:
         pass
 
+    def get_timings_file(self) -> Path:
+        return self.project.build_directory / "cargo" / f"{self.name}.timings.json"
+
+    def _update_timings_report(self, messages: CargoMessageCollector) -> List[CrateTimingRegression]:
+        """Write the timings report for this build and return the crates whose compile time regressed compared to
+        the previous report."""
+
+        timings_file = self.get_timings_file()
+        previous = read_timings_report(timings_file)
+        if previous is None:
+            write_timings_report(timings_file, messages.timings, messages.unit_timings)
+            return []
+        # Crates that were fresh in this build keep the timings from the previous report.
+        write_timings_report(timings_file, {**previous["crates"], **messages.timings}, messages.unit_timings)
+        return compare_crate_timings(
+            previous["crates"],
+            messages.timings,
+            self.timing_regression_threshold.get(),
+            self.timing_regression_min_seconds.get(),
+        )
+
+    def get_fingerprint_file(self) -> Path:
+        return self.project.build_directory / "cargo" / f"{self.name}.fingerprint.json"
+
+    def get_input_fingerprint(self) -> str:
+        """Compute a fingerprint over all inputs of the build."""
+
+        env = self.env.get()
+        command = self.get_cargo_command(env) + self.get_cargo_command_additional_flags()
+        env = get_build_env(env)
+        target_dir = Path(env.get("CARGO_TARGET_DIR", "target"))
+        skip_dirs = {".git", target_dir.name, self.project.build_directory.name}
+        data = {
+            "command": command,
+            "target": self.target.get_or(None),
+            "env": env,
+            "toolchain": get_toolchain_version(self.project.directory, {**os.environ, **env}),
+            "sources": hash_source_files(self.project.directory, self.fingerprint_patterns.get(), skip_dirs),
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    def _write_fingerprint_record(
+        self, out_binaries: List[CargoBinaryArtifact], out_libraries: List[CargoLibraryArtifact]
+    ) -> None:
+        artifacts = [*out_binaries, *out_libraries]
+        record = {
+            "inputs": self._input_fingerprint,
+            "artifacts": {str(a.path): hash_file(a.path) for a in artifacts if a.path.is_file()},
+            "out_binaries": [{"name": a.name, "path": str(a.path)} for a in out_binaries],
+            "out_libraries": [{"name": a.name, "path": str(a.path)} for a in out_libraries],
+        }
+        fingerprint_file = self.get_fingerprint_file()
+        fingerprint_file.parent.mkdir(parents=True, exist_ok=True)
+        fingerprint_file.write_text(json.dumps(record, indent=2))
+
+    def _read_fingerprint_record(self) -> Dict[str, Any] | None:
+        try:
+            record: Dict[str, Any] = json.loads(self.get_fingerprint_file().read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return record
+
+    # Task
+
+    def prepare(self) -> TaskStatus | None:
+        if not self.fingerprint.get():
+            return None
+
+        try:
+            self._input_fingerprint = self.get_input_fingerprint()
+        except (OSError, sp.CalledProcessError) as exc:
+            self.logger.warning("could not compute the fingerprint of the build inputs (%s)", exc)
+            return TaskStatus.pending()
+        record = self._read_fingerprint_record()
+        if record is None or record["inputs"] != self._input_fingerprint:
+            return TaskStatus.pending()
+        for path, digest in record["artifacts"].items():
+            if not Path(path).is_file() or hash_file(Path(path)) != digest:
+                return TaskStatus.pending()
+
+        self.out_binaries.set([CargoBinaryArtifact(a["name"], Path(a["path"])) for a in record["out_binaries"]])
+        self.out_libraries.set([CargoLibraryArtifact(a["name"], Path(a["path"])) for a in record["out_libraries"]])
+        self.out_crate_timings.set({})
+        self.out_fresh_count.set(0)
+        self.out_rebuilt_count.set(0)
+        if self.timings.get():
+            self.out_timing_regressions.set([])
+        return TaskStatus.up_to_date("inputs and artifacts are unchanged since the last build")
+
     def execute(self) -> TaskStatus:
         env = self.env.get()
         command = self.get_cargo_command(env) + self.get_cargo_command_additional_flags()
 
+        # We only expect binaries and libraries to be built if the target is debug or release. Cargo tells us
+        # about the exact files that it produced in its JSON messages.
+        collect_artifacts = self.target.get_or(None) in ("debug", "release")
+        timings = self.timings.get()
+        if timings:
+            command += ["--timings=json", "-Zunstable-options"]
+        if collect_artifacts or timings:
+            command = with_json_message_format(command)
+
         safe_command = command[:]
         safe_env = env.copy()
         self.make_safe(safe_command, safe_env)
         self.logger.info("%s [env: %s]", safe_command, safe_env)
 
-        out_binaries = []
-        out_libraries = []
-        if self.target.get_or(None) in ("debug", "release"):
-            # Expose the output binaries that are produced by this task.
-            # We only expect a binary to be built if the target is debug or release.
-            manifest = CargoMetadata.read(self.project.directory)
-            target_dir = self.project.directory / os.getenv("CARGO_TARGET_DIR", "target") / self.target.get()
-            for artifact in manifest.artifacts:
-                # Rust binaries have an extensionless name whereas libraries are prefixed with "lib" and suffixed with
-                #
-                # - ".rlib" for Rust libraries
-                # - ".so" (Linux), ".dylib" (macOS) or ".dll" (Windows) for dynamic Rust and system libraries
-                # - ".a" (Linux, macOS) or ".lib" (Windows) for static system libraries
-                #
-                # We create all options for libraries and check for presence of at least one later.
-                if artifact.kind is ArtifactKind.BIN:
-                    out_binaries.append(CargoBinaryArtifact(artifact.name, target_dir / artifact.name))
-                elif artifact.kind is ArtifactKind.LIB:
-                    base_name = f"lib{artifact.name}"
-                    for file_extension in ["rlib", "so", "dylib", "dll", "a", "lib"]:
-                        filename = ".".join([base_name, file_extension]).replace("-", "_")
-                        out_libraries.append(CargoLibraryArtifact(base_name, target_dir / filename))
-
-        self.out_binaries.set(out_binaries)
-        self.out_libraries.set(out_libraries)
-
         total_attempts = self.retry_attempts.get() + 1
 
         while total_attempts > 0:
-            result = sp.call(command, cwd=self.project.directory, env={**os.environ, **env})
+            messages = CargoMessageCollector()
+            if collect_artifacts or timings:
+                result = self._run_and_collect_messages(command, env, messages)
+            else:
+                result = sp.call(command, cwd=self.project.directory, env={**os.environ, **env})
 
             if result == 0:
-                # Check that binaries which were due have been built.
-                for out_bin in out_binaries:
-                    assert out_bin.path.is_file(), out_bin
-                # Check that at least one library has been built if libraries were due.
-                assert not out_libraries or any(lib.path.is_file() for lib in out_libraries), out_libraries[0].name
+                if collect_artifacts:
+                    self.logger.info("%d unit(s) fresh, %d unit(s) rebuilt", messages.fresh, messages.rebuilt)
+                else:
+                    messages.binaries.clear()
+                    messages.libraries.clear()
+                out_binaries = [CargoBinaryArtifact(a.name, a.path) for a in messages.binaries]
+                out_libraries = [CargoLibraryArtifact(a.name, a.path) for a in messages.libraries]
+                self.out_crate_timings.set(messages.timings)
+                self.out_fresh_count.set(messages.fresh)
+                self.out_rebuilt_count.set(messages.rebuilt)
+                self.out_binaries.set(out_binaries)
+                self.out_libraries.set(out_libraries)
+                if self._input_fingerprint is not None:
+                    # Recompute the fingerprint because Cargo may have updated the inputs (e.g. the Cargo.lock).
+                    self._input_fingerprint = self.get_input_fingerprint()
+                    self._write_fingerprint_record(out_binaries, out_libraries)
                 break
             else:
                 total_attempts -= 1
                 self.logger.warn("%s failed with result %s", safe_command, result)
                 self.logger.warn("There are %s attempts remaining", total_attempts)
                 if total_attempts > 0:
-                    self.logger.info("Waiting for 10 seconds before retrying..")
-                    time.sleep(10)
+                    self.logger.info("Waiting for %s seconds before retrying..", self.retry_delay.get())
+                    time.sleep(self.retry_delay.get())
+
+        if result == 0 and timings:
+            regressions = self._update_timings_report(messages)
+            self.out_timing_regressions.set(regressions)
+            for regression in regressions:
+                self.logger.warning(
+                    "compile time of %s regressed from %.1fs to %.1fs (+%.0f%%)",
+                    regression.name,
+                    regression.previous,
+                    regression.current,
+                    (regression.ratio - 1) * 100,
+                )
+            if regressions and self.fail_on_timing_regression.get():
+                names = ", ".join(r.name for r in regressions)
+                return TaskStatus.failed(f"compile time of {len(regressions)} crate(s) regressed: {names}")
 
         return TaskStatus.from_exit_code(safe_command, result)
+
+    def _run_and_collect_messages(
+        self, command: List[str], env: Dict[str, str], messages: CargoMessageCollector
+    ) -> int:
+        """Run Cargo and feed the JSON messages that it writes to stdout into *messages* as they arrive. Any other
+        output is passed through."""
+
+        with sp.Popen(
+            command, cwd=self.project.directory, env={**os.environ, **env}, stdout=sp.PIPE, text=True
+        ) as proc:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                if not messages.feed(line):
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+        return proc.returncode
+
+
+def with_json_message_format(command: List[str]) -> List[str]:
+    """Returns *command* with a `--message-format` that makes Cargo write JSON messages to stdout. If the command
+    already asks for a JSON message format, it is returned unchanged. Otherwise, the `human` and `short` formats are
+    replaced with their JSON equivalents (`json-render-diagnostics` and `json-diagnostic-short`), which Cargo still
+    renders the same way for the user. Cargo rejects mixing them with a JSON format."""
+
+    result: List[str] = []
+    formats: List[str] = []
+    args = iter(command)
+    for arg in args:
+        if arg == "--message-format":
+            formats += next(args, "").split(",")
+        elif arg.startswith("--message-format="):
+            formats += arg.split("=", 1)[1].split(",")
+        else:
+            result.append(arg)
+
+    formats = [fmt.strip() for fmt in formats if fmt.strip()]
+    if any(fmt.startswith("json") for fmt in formats):
+        return command
+
+    json_formats = ["json-render-diagnostics"]
+    json_formats += ["json-diagnostic-short" if fmt == "short" else fmt for fmt in formats if fmt != "human"]
+    return result + ["--message-format=" + ",".join(json_formats)]
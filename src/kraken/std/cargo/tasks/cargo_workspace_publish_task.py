@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import subprocess as sp
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Collection, Dict, List, Mapping
+
+import httpx
+from kraken.core.api import Property, TaskStatus
+
+from ..config import CargoRegistry
+from ..manifest import CargoMetadata, WorkspaceMember
+from .cargo_publish_task import CargoPublishTask
+
+logger = logging.getLogger(__name__)
+
+
+class CargoWorkspacePublishTask(CargoPublishTask):
+    """Publish all crates of a Cargo workspace. Crates are published in the order given by their path dependencies,
+    and crates whose dependencies have all been published are published concurrently. A crate is only considered
+    published once it is visible in the registry index, so its dependants can resolve it."""
+
+    #: The maximum number of crates to publish concurrently.
+    max_workers: Property[int] = Property.default(4)
+
+    #: Names of workspace crates that should not be published.
+    exclude: Property[List[str]] = Property.default_factory(list)
+
+    #: The maximum number of seconds to wait for a published crate to appear in the registry index.
+    index_timeout: Property[float] = Property.default(300.0)
+
+    def get_description(self) -> str | None:
+        return f"Publish all crates of the Cargo workspace to the {self.registry.get().alias!r} registry."
+
+    def _publish_crate(self, member: WorkspaceMember, env: Dict[str, str]) -> bool:
+        command = self.get_cargo_command(env) + ["--package", member.name] + self.get_cargo_command_additional_flags()
+        safe_command = command[:]
+        self.make_safe(safe_command, env.copy())
+
+        total_attempts = self.retry_attempts.get() + 1
+        while True:
+            self.logger.info("%s", safe_command)
+            result = sp.call(command, cwd=self.project.directory, env={**os.environ, **env})
+            if result == 0:
+                break
+            total_attempts -= 1
+            self.logger.warning(
+                "%s failed with result %s (%s attempts remaining)", safe_command, result, total_attempts
+            )
+            if total_attempts <= 0:
+                return False
+            time.sleep(self.retry_delay.get())
+
+        registry = self.registry.get()
+        if not wait_for_crate_in_index(registry, member.name, member.version, self.index_timeout.get()):
+            self.logger.error(
+                "%s %s did not appear in the index of registry %r within %s seconds",
+                member.name,
+                member.version,
+                registry.alias,
+                self.index_timeout.get(),
+            )
+            return False
+        return True
+
+    # Task
+
+    def execute(self) -> TaskStatus:
+        env = self.env.get()
+        registry = self.registry.get()
+        metadata = CargoMetadata.read(self.project.directory, self.project.build_directory / "cargo-metadata.json")
+        members = {
+            member.name: member
+            for member in metadata.workspaceMembers
+            if member.name not in self.exclude.get() and (member.publish is None or registry.alias in member.publish)
+        }
+        graph = {name: [dep for dep in member.path_dependencies if dep in members] for name, member in members.items()}
+
+        self.out_binaries.set([])
+        self.out_libraries.set([])
+
+        try:
+            failed = publish_in_dependency_order(
+                graph, lambda name: self._publish_crate(members[name], env), self.max_workers.get()
+            )
+        except ValueError as exc:
+            return TaskStatus.failed(str(exc))
+        if failed:
+            return TaskStatus.failed(f"failed to publish {', '.join(sorted(failed))}")
+        return TaskStatus.succeeded(f"published {len(members)} crate(s)")
+
+
+def publish_in_dependency_order(
+    graph: Mapping[str, Collection[str]],
+    publish: Callable[[str], bool],
+    max_workers: int,
+) -> set[str]:
+    """Call *publish* for every node in *graph*, which maps each node to the nodes that it depends on. A node is only
+    published once all of its dependencies have been published successfully, and up to *max_workers* nodes are
+    published concurrently. Nodes whose dependencies failed to publish are skipped.
+
+    :return: The names of the nodes that failed to publish or that have been skipped.
+    :raise ValueError: If the graph contains a cycle.
+    """
+
+    cyclic = find_unordered_nodes(graph)
+    if cyclic:
+        raise ValueError(f"dependency cycle between crates: {', '.join(sorted(cyclic))}")
+
+    pending = {name: set(deps) for name, deps in graph.items()}
+    published: set[str] = set()
+    failed: set[str] = set()
+    running: dict[Future[bool], str] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while pending or running:
+            # Skip everything that depends on a failed crate.
+            for name in [name for name, deps in pending.items() if deps & failed]:
+                logger.warning(
+                    "skipping %s because its dependencies failed to publish: %s", name, pending[name] & failed
+                )
+                failed.add(name)
+                del pending[name]
+
+            for name in sorted(name for name, deps in pending.items() if deps <= published):
+                del pending[name]
+                running[executor.submit(publish, name)] = name
+
+            if not running:
+                assert not pending, pending
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    success = future.result()
+                except Exception:
+                    logger.exception("unhandled exception while publishing %s", name)
+                    success = False
+                (published if success else failed).add(name)
+
+    return failed
+
+
+def find_unordered_nodes(graph: Mapping[str, Collection[str]]) -> set[str]:
+    """Returns the nodes in *graph* that can not be put into a dependency order, i.e. the nodes that are part of a
+    cycle, depend on a cycle or depend on a node that is not in the graph. The result is empty if every node can be
+    published by :func:`publish_in_dependency_order`."""
+
+    pending = {name: set(deps) for name, deps in graph.items()}
+    ready = [name for name, deps in pending.items() if not deps]
+    while ready:
+        done = ready.pop()
+        del pending[done]
+        for name, deps in pending.items():
+            if done in deps:
+                deps.discard(done)
+                if not deps:
+                    ready.append(name)
+    return set(pending)
+
+
+def get_index_path(crate_name: str) -> str:
+    """Returns the path of the index file for the crate with the given name, relative to the index root."""
+
+    name = crate_name.lower()
+    if len(name) <= 2:
+        return f"{len(name)}/{name}"
+    if len(name) == 3:
+        return f"3/{name[0]}/{name}"
+    return f"{name[:2]}/{name[2:4]}/{name}"
+
+
+def wait_for_crate_in_index(registry: CargoRegistry, crate_name: str, version: str, timeout: float) -> bool:
+    """Wait until *version* of *crate_name* is listed in the index of *registry*. This can only be checked for sparse
+    (`sparse+http(s)://`) indexes. For Git indexes, `cargo publish` already waits until the crate is available in
+    the index before it returns (since Cargo 1.66), so this function returns immediately."""
+
+    if not registry.index.startswith("sparse+"):
+        return True
+
+    url = registry.index.replace("sparse+", "", 1).rstrip("/") + "/" + get_index_path(crate_name)
+    deadline = time.perf_counter() + timeout
+    delay = 0.5
+    with httpx.Client(auth=registry.read_credentials, timeout=30) as client:
+        while True:
+            try:
+                response = client.get(url, headers={"Cache-Control": "no-cache"})
+            except httpx.HTTPError as exc:
+                logger.debug("could not fetch %s (%s)", url, exc)
+            else:
+                if response.status_code == 200 and any(
+                    json.loads(line).get("vers") == version for line in response.text.splitlines() if line.strip()
+                ):
+                    return True
+            if time.perf_counter() + delay > deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 10.0)
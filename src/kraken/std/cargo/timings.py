@@ -0,0 +1,67 @@
+"""
+Per-crate compile time reports for Cargo builds and detection of compile time regressions between builds.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Mapping
+
+
+@dataclass
+class CrateTimingRegression:
+    name: str
+
+    #: The compile time of the crate in seconds in the previous build.
+    previous: float
+
+    #: The compile time of the crate in seconds in the current build.
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.previous if self.previous else float("inf")
+
+
+def compare_crate_timings(
+    previous: Mapping[str, float],
+    current: Mapping[str, float],
+    threshold: float,
+    min_seconds: float = 0.0,
+) -> list[CrateTimingRegression]:
+    """Compare the compile times of the crates that were built in both the *previous* and *current* builds.
+
+    :param threshold: The relative increase in compile time above which a crate is considered regressed (e.g.
+        `0.2` for 20%).
+    :param min_seconds: The absolute increase in seconds that a crate's compile time must exceed to be considered
+        regressed. This avoids flagging small crates whose compile times are dominated by noise.
+    :return: The regressed crates, the largest relative regression first.
+    """
+
+    regressions = [
+        CrateTimingRegression(name, previous[name], duration)
+        for name, duration in current.items()
+        if name in previous and duration > previous[name] * (1 + threshold) and duration - previous[name] > min_seconds
+    ]
+    return sorted(regressions, key=lambda r: (-r.ratio, r.name))
+
+
+def read_timings_report(path: Path) -> dict[str, Any] | None:
+    """Read a report written by :func:`write_timings_report`. Returns `None` if the file does not exist or is
+    invalid."""
+
+    try:
+        report: dict[str, Any] = json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return report
+
+
+def write_timings_report(path: Path, crates: Mapping[str, float], units: list[dict[str, Any]]) -> None:
+    """Write the compile time per crate and the raw `timing-info` messages per unit to *path*."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    report = {"crates": dict(sorted(crates.items(), key=lambda x: -x[1])), "units": units}
+    path.write_text(json.dumps(report, indent=2))
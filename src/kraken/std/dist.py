@@ -3,13 +3,29 @@
 from __future__ import annotations
 
 import abc
+import collections
+import functools
+import gzip
+import hashlib
+import io
+import json
 import logging
+import mmap
+import os
+import platform
+import shutil
+import stat
+import struct
+import sys
 import tarfile
+import tempfile
+import time
 import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from fnmatch import fnmatch
 from pathlib import Path
-from typing import Any, List, Mapping, Optional, Sequence, Union, cast
+from typing import IO, Any, BinaryIO, Deque, Iterator, List, Mapping, Optional, Sequence, Tuple, Union, cast
 
 import databind.json
 from kraken.common import flatten
@@ -18,15 +34,45 @@ from termcolor import colored
 from typing_extensions import Literal
 
 from .descriptors.resource import BinaryArtifact, Resource
+from .util.pathmatch import PathMatcher
 
 logger = logging.getLogger(__name__)
 
+#: Whether the archive writers may write the payload of members directly to the archive file (see
+#: :func:`write_raw_zip_member` and :meth:`TarArchiveWriter._addfile`). This relies on implementation details of
+#: :mod:`zipfile` and :mod:`tarfile` that are known to hold for these CPython versions. Otherwise, the writers fall
+#: back to the public APIs and zip members are neither compressed in parallel nor reused in incremental mode.
+_RAW_WRITE_SUPPORTED = platform.python_implementation() == "CPython" and (3, 7) <= sys.version_info[:2] <= (3, 13)
+
 
 @dataclass
 class IndividualDistOptions:
     arcname: Optional[str] = None
     exclude: Sequence[str] = ()
     include: Optional[Sequence[str]] = None
+    follow_symlinks: bool = True
+
+    #: Glob patterns for files to store in the archive without compressing them, matched against their arcname
+    #: (see :func:`add_to_archive`). Useful for files that are already compressed, see
+    #: :data:`COMPRESSED_FILE_PATTERNS`.
+    store: Sequence[str] = ()
+
+
+#: Glob patterns for common file types that are already compressed and are not worth compressing again.
+COMPRESSED_FILE_PATTERNS = (
+    "*.gz",
+    "*.tgz",
+    "*.bz2",
+    "*.xz",
+    "*.zst",
+    "*.lz4",
+    "*.zip",
+    "*.whl",
+    "*.jar",
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+)
 
 
 @dataclass
@@ -43,7 +89,7 @@ class DistributionTask(Task):
     #: the type of archive that is created.
     output_file: Property[Path]
 
-    #: The type of archive that will be created. Can be zip, tgz and tar.
+    #: The type of archive that will be created. Can be zip, tar, tar.gz, tar.bz2, tar.xz, tar.zst and tar.lz4.
     archive_type: Property[str]
 
     #: Prefix to add to all files added to the distribution.
@@ -52,6 +98,25 @@ class DistributionTask(Task):
     #: A list of resources to include.
     resources: Property[List[ConfiguredResource]] = Property.default_factory(list)
 
+    #: The compression level. Zip archives are stored uncompressed unless a level is specified.
+    compression_level: Property[Optional[int]] = Property.default(None)
+
+    #: The number of threads to compress the archive with. Only `zip`, `tar.gz` and `tar.zst` archives can be
+    #: compressed in parallel, and `tar.gz` archives only if they are not :attr:`reproducible`.
+    workers: Property[int] = Property.default(1)
+
+    #: Reuse the unchanged members of the archive from the previous run instead of compressing them again. Only
+    #: supported for `zip` archives. See :class:`ZipArchiveWriter`.
+    incremental: Property[bool] = Property.default(False)
+
+    #: Write a reproducible archive: Members are added in sorted order, and their modification time, owner and
+    #: permissions are normalized. The modification time is taken from the `SOURCE_DATE_EPOCH` environment
+    #: variable and defaults to 1980-01-01.
+    reproducible: Property[bool] = Property.default(False)
+
+    #: The SHA256 hex digest of the archive.
+    output_sha256: Property[str] = Property.output()
+
     #: A resource that describes the output file.
     _output_file_resource: Property[Resource] = Property.output()
 
@@ -65,13 +130,19 @@ class DistributionTask(Task):
         output_file = self.output_file.get()
         archive_type = self.archive_type.get_or(None)
         if archive_type is None:
-            archive_type = output_file.suffix.lstrip(".")
-            archive_type = {"tgz": "tar.gz", "txz": "tar.xz", "tbz2": "tar.bz2"}.get(archive_type, archive_type)
+            archive_type = get_archive_type(output_file)
         assert isinstance(archive_type, str)
 
         print("Writing archive", colored(str(output_file), "yellow"))
         output_file.parent.mkdir(parents=True, exist_ok=True)
-        with wopen_archive(output_file, archive_type) as archive:
+        with wopen_archive(
+            output_file,
+            archive_type,
+            self.compression_level.get(),
+            self.workers.get(),
+            self.incremental.get(),
+            self.reproducible.get(),
+        ) as archive:
             for resource in self.resources.get():
                 if resource.options.arcname is not None:
                     arcname = resource.options.arcname
@@ -91,19 +162,54 @@ class DistributionTask(Task):
                     resource.path,
                     resource.options.exclude,
                     resource.options.include,
+                    resource.options.follow_symlinks,
+                    resource.options.store,
                 )
 
+        self.output_sha256.set(_sha256_file(output_file))
 
-def wopen_archive(path: Path, type_: str) -> ArchiveWriter:
+
+#: Maps short archive suffixes to the archive type.
+ARCHIVE_SUFFIX_ALIASES = {"tgz": "tar.gz", "tbz2": "tar.bz2", "txz": "tar.xz", "tzst": "tar.zst", "tlz4": "tar.lz4"}
+
+
+def get_archive_type(path: Path) -> str:
+    """Derive the archive type from the suffix of *path*, e.g. `tar.gz` for `dist.tar.gz` and `dist.tgz`."""
+
+    suffixes = path.name.split(".")[1:]
+    if len(suffixes) >= 2 and suffixes[-2] == "tar":
+        return "tar." + suffixes[-1]
+    suffix = suffixes[-1] if suffixes else ""
+    return ARCHIVE_SUFFIX_ALIASES.get(suffix, suffix)
+
+
+def wopen_archive(
+    path: Path,
+    type_: str,
+    compression_level: int | None = None,
+    workers: int = 1,
+    incremental: bool = False,
+    reproducible: bool = False,
+) -> ArchiveWriter:
     """Open an archive at *path* for writing. The *type_* indicates what type of archive will be created.
-    Accepted values for *type_* are `zip`, `tar`, `tar.gz`, `tar.bz2` and `tar.xz`."""
+    Accepted values for *type_* are `zip`, `tar`, `tar.gz`, `tar.bz2`, `tar.xz`, `tar.zst` and `tar.lz4`. The
+    latter two require the `zstandard` and `lz4` packages, respectively.
+
+    :param compression_level: The compression level. Zip archives are only compressed if a level is specified.
+    :param workers: The number of threads to compress `zip`, `tar.gz` and `tar.zst` archives with.
+    :param incremental: Reuse unchanged members from the previous archive at *path*. Only supported for `zip`.
+    :param reproducible: Normalize the metadata of members, see :func:`get_reproducible_mtime` and
+        :func:`get_reproducible_mode`."""
+
+    if incremental and type_ != "zip":
+        raise ValueError(f"incremental mode is not supported for {type_!r} archives")
 
     if type_.startswith("tar."):
-        return TarArchiveWriter(path, cast(Any, type_.partition(".")[-1]))
+        return TarArchiveWriter(path, cast(Any, type_.partition(".")[-1]), compression_level, workers, reproducible)
     elif type_ == "tar":
-        return TarArchiveWriter(path, "")
+        return TarArchiveWriter(path, "", reproducible=reproducible)
     elif type_ == "zip":
-        return ZipArchiveWriter(path)
+        return ZipArchiveWriter(path, compression_level, workers, incremental, reproducible)
     else:
         raise ValueError(f"unsupported archive type: {type_!r}")
 
@@ -115,13 +221,16 @@ def add_to_archive(
     test_path: Path | None = None,
     exclude: Sequence[str] = (),
     include: Sequence[str] | None = None,
+    follow_symlinks: bool = True,
+    store: Sequence[str] = (),
 ) -> None:
     """Recursively adds *path* to the archive *writer* under consideration of the *exclude* and *include* glob
     patterns that are tested against *test_path*.
 
-    The glob patterns for the *exclude* and *include* arguments are tested against the full relative *test_path*
-    as well as the individual filename. (NOTE(niklas.rosenstein): To support full .gitignore like behaviour, we'd
-    need to test the entire range from name to full path).
+    The patterns have `.gitignore` semantics (see :class:`~kraken.std.util.pathmatch.PathMatcher`), i.e. they
+    support negation with `!`, anchoring with a leading `/` and `**`. Patterns that use none of these are tested
+    against the full relative *test_path* as well as the individual filename, like before. A directory that is
+    excluded, or that is not included, is skipped entirely.
 
     :param writer: The archive writer implementation.
     :param arcname: The name to give *path*. Sub-paths are appended to this name as normal.
@@ -131,42 +240,102 @@ def add_to_archive(
     :param exclude: A sequence of glob patterns that, if matching, cause an element (file or directory) to be excluded.
     :param include: If specified, must be a sequence of glob patterns that will cause a file or directory to only be
         added if any pattern matches, and no *exclude* pattern matches.
+    :param follow_symlinks: See :func:`walk_tree`.
+    :param store: Glob patterns for files that are stored without compression, if the archive format supports
+        compression per member (i.e. zip). The patterns are matched against the arcname of the files.
     """
 
-    test_path = test_path or path
-    s_test_path = str(test_path)
+    store_matcher = PathMatcher(store)
+    for member_arcname, member_path, member_stat in walk_tree(
+        arcname,
+        path,
+        (test_path or path).as_posix(),
+        PathMatcher(exclude),
+        None if include is None else PathMatcher(include),
+        follow_symlinks,
+    ):
+        writer.add_file(
+            member_arcname,
+            member_path,
+            member_stat,
+            store=bool(store_matcher) and store_matcher.match(member_arcname),
+        )
 
-    if any(fnmatch(s_test_path, x) or fnmatch(test_path.name, x) for x in exclude):
-        return
-    if include is not None and not any(fnmatch(s_test_path, x) or fnmatch(test_path.name, x) for x in include):
-        return
 
-    if path.is_dir():
-        for item in path.iterdir():
-            add_to_archive(writer, arcname + "/" + item.name, item, test_path / item.name, exclude, include)
-    else:
-        writer.add_file(arcname, path)
+def walk_tree(
+    arcname: str,
+    path: Path,
+    test_path: str | None = None,
+    exclude: PathMatcher | None = None,
+    include: PathMatcher | None = None,
+    follow_symlinks: bool = True,
+) -> Iterator[tuple[str, Path, os.stat_result]]:
+    """Iterate over all files under *path* (or *path* itself, if it is not a directory) in sorted order, without
+    recursion. The stat results of :func:`os.scandir` are reused and yielded along with the files.
+
+    :param arcname: The name of *path* in the archive. The names of sub-paths are appended to it.
+    :param test_path: The POSIX path to match the *exclude* and *include* patterns against. Defaults to *path*.
+    :param exclude: Files and directories that match are skipped.
+    :param include: If specified, files and directories that do not match are skipped.
+    :param follow_symlinks: If enabled, symlinks are resolved: The directories they point to are walked (each
+        directory only once, to avoid symlink loops) and files are yielded with the stat of the file they point to.
+        Broken symlinks, and all symlinks if this is disabled, are yielded as symlinks.
+    :return: An iterator of tuples of the arcname, path and stat result of each file.
+    """
+
+    try:
+        root_stat = os.stat(path) if follow_symlinks else os.lstat(path)
+    except FileNotFoundError:
+        root_stat = os.lstat(path)
+    stack = [(arcname, os.fspath(path), path.as_posix() if test_path is None else test_path, root_stat)]
+    visited: set[tuple[int, int]] = set()
+
+    while stack:
+        arcname, fspath, test_path, st = stack.pop()
+        is_dir = stat.S_ISDIR(st.st_mode)
+        if exclude and exclude.match(test_path, is_dir):
+            continue
+        if include is not None and not include.match(test_path, is_dir):
+            continue
+        if not is_dir:
+            yield arcname, Path(fspath), st
+            continue
+
+        if follow_symlinks:
+            if (st.st_dev, st.st_ino) in visited:
+                logger.warning("skipping %s, it is a symlink to a directory that has already been added", fspath)
+                continue
+            visited.add((st.st_dev, st.st_ino))
+
+        with os.scandir(fspath) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        prefix = "" if test_path == "." else test_path + "/"
+        for entry in reversed(entries):
+            try:
+                entry_stat = entry.stat(follow_symlinks=follow_symlinks)
+            except FileNotFoundError:
+                entry_stat = entry.stat(follow_symlinks=False)
+            stack.append((arcname + "/" + entry.name, entry.path, prefix + entry.name, entry_stat))
 
 
 class ArchiveWriter(abc.ABC):
     """Base class to write an archive file."""
 
     @abc.abstractmethod
-    def add_file(self, arcname: str, path: Path) -> None:
-        """Add a file to the archive."""
+    def add_file(self, arcname: str, path: Path, st: os.stat_result | None = None, store: bool = False) -> None:
+        """Add a file to the archive. If the stat result *st* of *path* is specified, the implementation uses it
+        instead of calling :func:`os.lstat` again. Regular files are added with their contents, symlinks as
+        symlinks. If *store* is enabled, the file is not compressed, if the archive format supports that."""
 
     @abc.abstractmethod
     def close(self) -> None:
         pass
 
-    def add_path(self, arcname: str, path: Path) -> None:
-        """Recursively add the contents of all files under *path*."""
+    def add_path(self, arcname: str, path: Path, follow_symlinks: bool = True) -> None:
+        """Recursively add the contents of all files under *path* (see :func:`walk_tree`)."""
 
-        if path.is_dir():
-            for item in path.iterdir():
-                self.add_path(arcname + "/" + item.name, item)
-        else:
-            self.add_file(arcname, path)
+        for member_arcname, member_path, member_stat in walk_tree(arcname, path, follow_symlinks=follow_symlinks):
+            self.add_file(member_arcname, member_path, member_stat)
 
     def __enter__(self) -> ArchiveWriter:
         return self
@@ -176,25 +345,685 @@ class ArchiveWriter(abc.ABC):
 
 
 class TarArchiveWriter(ArchiveWriter):
-    def __init__(self, path: Path, type_: Literal["", "gz", "bz2", "xz"]) -> None:
-        self._archive = tarfile.open(path, mode="w:" + type_)
+    """Writes a tar archive. If *workers* is larger than one and the archive is gzip compressed, the gzip stream is
+    compressed in parallel with :class:`ParallelGzipWriter`. Zstandard (`zst`) and LZ4 (`lz4`) compressed archives
+    are written as a stream through the compressor, and Zstandard uses *workers* threads for compression.
+
+    In *reproducible* mode, the modification time, owner and permissions of members are normalized (see
+    :func:`get_reproducible_mtime` and :func:`get_reproducible_mode`) and the gzip header contains no timestamp.
+    Gzip compressed archives are then always compressed with a single thread, because the block-wise output of
+    :class:`ParallelGzipWriter` differs from a sequential gzip stream."""
+
+    def __init__(
+        self,
+        path: Path,
+        type_: Literal["", "gz", "bz2", "xz", "zst", "lz4"],
+        compression_level: int | None = None,
+        workers: int = 1,
+        reproducible: bool = False,
+    ) -> None:
+        self._reproducible = reproducible
+        self._mtime = get_reproducible_mtime() if reproducible else 0
+        # The file objects to close after the archive, in order.
+        self._fileobjs: list[IO[bytes] | ParallelGzipWriter] = []
+        if type_ == "zst":
+            self._fileobjs.append(_open_zstd_writer(path, compression_level, workers))
+            self._archive = tarfile.open(fileobj=self._fileobjs[0], mode="w|")
+        elif type_ == "lz4":
+            self._fileobjs.append(_open_lz4_writer(path, compression_level))
+            self._archive = tarfile.open(fileobj=self._fileobjs[0], mode="w|")
+        elif type_ == "gz" and workers > 1 and not reproducible:
+            self._fileobjs.append(ParallelGzipWriter(path.open("wb"), compression_level or 9, workers))
+            self._archive = tarfile.open(fileobj=self._fileobjs[0], mode="w")
+        elif type_ == "gz" and reproducible:
+            # Unlike tarfile, this allows us to omit the file name and timestamp from the gzip header.
+            fileobj = path.open("wb")
+            gzip_file = gzip.GzipFile("", "wb", 9 if compression_level is None else compression_level, fileobj, 0)
+            self._fileobjs += [cast(IO[bytes], gzip_file), fileobj]
+            self._archive = tarfile.open(fileobj=gzip_file, mode="w")
+        elif type_ in ("gz", "bz2") and compression_level is not None:
+            self._archive = tarfile.open(path, mode="w:" + type_, compresslevel=compression_level)  # type: ignore
+        elif type_ == "xz" and compression_level is not None:
+            self._archive = tarfile.open(path, mode="w:xz", preset=compression_level)  # type: ignore
+        else:
+            self._archive = tarfile.open(path, mode="w:" + type_)
 
     def close(self) -> None:
         self._archive.close()
+        for fileobj in self._fileobjs:
+            fileobj.close()
+
+    def add_file(self, arcname: str, path: Path, st: os.stat_result | None = None, store: bool = False) -> None:
+        tarinfo = self._archive.gettarinfo(path, arcname) if st is None else self._get_tarinfo(arcname, path, st)
+        if self._reproducible:
+            tarinfo.mtime = self._mtime
+            tarinfo.mode = get_reproducible_mode(tarinfo.mode, tarinfo.isdir())
+            tarinfo.uid = tarinfo.gid = 0
+            tarinfo.uname = tarinfo.gname = ""
+        if tarinfo.isreg():
+            with path.open("rb") as fp:
+                self._addfile(tarinfo, fp)
+        else:
+            self._archive.addfile(tarinfo)
 
-    def add_file(self, arcname: str, path: Path) -> None:
-        self._archive.add(path, arcname, recursive=False)
+    def _addfile(self, tarinfo: tarfile.TarInfo, fileobj: BinaryIO) -> None:
+        """Like :meth:`tarfile.TarFile.addfile`, but copies the payload with :func:`copy_file_data`."""
+
+        archive = self._archive
+        if not _RAW_WRITE_SUPPORTED:
+            archive.addfile(tarinfo, fileobj)
+            return
+        header = tarinfo.tobuf(archive.format, archive.encoding, archive.errors)
+        archive.fileobj.write(header)
+        archive.offset += len(header)
+        copy_file_data(fileobj, cast(BinaryIO, archive.fileobj), tarinfo.size)
+        blocks, remainder = divmod(tarinfo.size, tarfile.BLOCKSIZE)
+        if remainder > 0:
+            archive.fileobj.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+            blocks += 1
+        archive.offset += blocks * tarfile.BLOCKSIZE
+        members: List[tarfile.TarInfo] = getattr(archive, "members")
+        members.append(tarinfo)
+
+    def _get_tarinfo(self, arcname: str, path: Path, st: os.stat_result) -> tarfile.TarInfo:
+        """Like :meth:`tarfile.TarFile.gettarinfo`, but uses the stat result *st* instead of calling :func:`os.lstat`
+        on *path*. If *st* is the result of :func:`os.stat` on a symlink, the symlink is dereferenced."""
+
+        inodes: dict[tuple[int, int], str] = getattr(self._archive, "inodes")
+        tarinfo = tarfile.TarInfo(arcname.replace(os.sep, "/").lstrip("/"))
+        if stat.S_ISREG(st.st_mode):
+            inode = (st.st_ino, st.st_dev)
+            if st.st_nlink > 1 and inode in inodes and tarinfo.name != inodes[inode]:
+                # Is a hard link to a file that was already added.
+                tarinfo.type = tarfile.LNKTYPE
+                tarinfo.linkname = inodes[inode]
+            else:
+                tarinfo.type = tarfile.REGTYPE
+                tarinfo.size = st.st_size
+                if inode[0]:
+                    inodes[inode] = tarinfo.name
+        elif stat.S_ISDIR(st.st_mode):
+            tarinfo.type = tarfile.DIRTYPE
+        elif stat.S_ISLNK(st.st_mode):
+            tarinfo.type = tarfile.SYMTYPE
+            tarinfo.linkname = os.readlink(path)
+        else:
+            # Devices, FIFOs and sockets are rare enough that we let tarfile handle them.
+            return self._archive.gettarinfo(path, arcname)
+
+        tarinfo.mode = stat.S_IMODE(st.st_mode)
+        tarinfo.uid = st.st_uid
+        tarinfo.gid = st.st_gid
+        tarinfo.mtime = st.st_mtime
+        tarinfo.uname = _get_user_name(st.st_uid)
+        tarinfo.gname = _get_group_name(st.st_gid)
+        return tarinfo
+
+
+@functools.lru_cache(maxsize=None)
+def _get_user_name(uid: int) -> str:
+    try:
+        import pwd
+
+        return pwd.getpwuid(uid)[0]
+    except (ImportError, KeyError):
+        return ""
+
+
+@functools.lru_cache(maxsize=None)
+def _get_group_name(gid: int) -> str:
+    try:
+        import grp
+
+        return grp.getgrgid(gid)[0]
+    except (ImportError, KeyError):
+        return ""
+
+
+#: The earliest timestamp that can be represented in a zip archive (1980-01-01).
+ZIP_EPOCH = 315532800
+
+
+def get_reproducible_mtime() -> int:
+    """Returns the modification time to give members of reproducible archives: The value of the `SOURCE_DATE_EPOCH`
+    environment variable (see https://reproducible-builds.org/specs/source-date-epoch/), or 1980-01-01."""
+
+    return int(os.getenv("SOURCE_DATE_EPOCH") or ZIP_EPOCH)
+
+
+def get_reproducible_mode(mode: int, is_dir: bool) -> int:
+    """Normalize the permission bits of a member of a reproducible archive to `0o755` for directories and
+    executable files, and `0o644` otherwise."""
+
+    return 0o755 if is_dir or mode & 0o111 else 0o644
+
+
+def _open_zstd_writer(path: Path, compression_level: int | None, workers: int) -> IO[bytes]:
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "writing tar.zst archives requires the `zstandard` package, install kraken-std with the `zstd` extra"
+        )
+
+    # Level 3 is the Zstandard default. A thread count of 0 compresses in the calling thread.
+    level = 3 if compression_level is None else compression_level
+    compressor = zstandard.ZstdCompressor(level=level, threads=workers if workers > 1 else 0)
+    return cast(IO[bytes], compressor.stream_writer(path.open("wb"), closefd=True))
+
+
+def _open_lz4_writer(path: Path, compression_level: int | None) -> IO[bytes]:
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ImportError(
+            "writing tar.lz4 archives requires the `lz4` package, install kraken-std with the `lz4` extra"
+        )
+
+    return cast(IO[bytes], lz4.frame.open(path, "wb", compression_level=compression_level or 0))
 
 
 class ZipArchiveWriter(ArchiveWriter):
-    def __init__(self, path: Path) -> None:
-        self._archive = zipfile.ZipFile(path, "w")
+    """Writes a zip archive. Members are stored uncompressed unless a *compression_level* is specified, in which case
+    they are compressed with DEFLATE. With more than one of *workers*, members are compressed concurrently in a
+    thread pool and written in the order they were added. The resulting archive is byte-identical to the one written
+    with a single worker.
 
-    def close(self) -> None:
-        self._archive.close()
+    In *incremental* mode, a manifest with the size, modification time and SHA256 of every member is written next to
+    the archive (see :meth:`get_manifest_file`). The next time the archive is written, members whose file is
+    unchanged according to the manifest are copied from the previous archive without recompressing them. A file
+    whose modification time changed is hashed to check if its contents changed.
+
+    In *reproducible* mode, the modification time and permissions of members are normalized (see
+    :func:`get_reproducible_mtime` and :func:`get_reproducible_mode`)."""
+
+    #: The chunk size that :meth:`zipfile.ZipFile.write` uses to feed the compressor. We must use the same size to
+    #: produce identical output.
+    _CHUNK_SIZE = 1024 * 8
+
+    #: The size of the fixed part of a local file header (see :data:`zipfile.sizeFileHeader`).
+    _FILE_HEADER_SIZE = 30
+
+    def __init__(
+        self,
+        path: Path,
+        compression_level: int | None = None,
+        workers: int = 1,
+        incremental: bool = False,
+        reproducible: bool = False,
+    ) -> None:
+        compression = zipfile.ZIP_STORED if compression_level is None else zipfile.ZIP_DEFLATED
+        self._path = path
+        self._settings = {"compression": compression, "compression_level": compression_level}
+        self._manifest: dict[str, dict[str, Any]] | None = {} if incremental else None
+        self._previous: zipfile.ZipFile | None = None
+        self._previous_manifest: dict[str, dict[str, Any]] = {}
+        self._reused = 0
+        self._reproducible = reproducible
+        self._date_time = time.gmtime(max(get_reproducible_mtime(), ZIP_EPOCH))[:6]
+        if incremental and _RAW_WRITE_SUPPORTED:
+            self._open_previous()
+        self._write_path = path.with_name(path.name + ".tmp") if self._previous else path
+        self._archive = zipfile.ZipFile(self._write_path, "w", compression=compression, compresslevel=compression_level)
+        self._workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+        # The members that are held back to write them in order, with the future of their compressed data or the
+        # member of the previous archive to copy the compressed data from.
+        self._pending: Deque[tuple[zipfile.ZipInfo, Future[_CompressedMember] | zipfile.ZipInfo, dict[str, Any] | None]]
+        self._pending = collections.deque()
+        if workers > 1 and compression != zipfile.ZIP_STORED and _RAW_WRITE_SUPPORTED:
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    @staticmethod
+    def get_manifest_file(path: Path) -> Path:
+        """Returns the path of the manifest file for the zip archive at *path* in incremental mode."""
+
+        return path.with_name(path.name + ".manifest.json")
+
+    def _open_previous(self) -> None:
+        manifest_file = self.get_manifest_file(self._path)
+        try:
+            manifest = json.loads(manifest_file.read_text())
+            previous = zipfile.ZipFile(self._path, "r")
+        except (OSError, ValueError, zipfile.BadZipFile) as exc:
+            logger.debug("not reusing members from %s (%s)", self._path, exc)
+            return
+        if manifest.get("settings") != self._settings:
+            logger.debug("not reusing members from %s, the compression settings changed", self._path)
+            previous.close()
+            return
+        self._previous = previous
+        self._previous_manifest = manifest["members"]
 
-    def add_file(self, arcname: str, path: Path) -> None:
-        self._archive.write(path, arcname)
+    def __exit__(self, exc_type: type[BaseException] | None, *a: Any) -> None:
+        self.close(failed=exc_type is not None)
+
+    def close(self, failed: bool = False) -> None:
+        """Finish writing the archive. If *failed*, e.g. because adding a member raised an exception, the archive
+        is incomplete: The previous archive is kept in incremental mode, and the manifest is not updated."""
+
+        try:
+            while self._pending and not failed:
+                self._write_next()
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._archive.close()
+            if self._previous is not None:
+                self._previous.close()
+            if not failed and self._write_path != self._path:
+                os.replace(self._write_path, self._path)
+            elif failed:
+                # Don't leave behind a temporary archive, or a manifest that does not match the archive.
+                _unlink(self._write_path if self._write_path != self._path else self.get_manifest_file(self._path))
+        if self._manifest is not None and not failed:
+            manifest = {"settings": self._settings, "members": self._manifest}
+            self.get_manifest_file(self._path).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+            logger.info("reused %d of %d members in %s", self._reused, len(self._manifest), self._path)
+
+    def add_file(self, arcname: str, path: Path, st: os.stat_result | None = None, store: bool = False) -> None:
+        if st is None and not store and self._executor is None and self._manifest is None and not self._reproducible:
+            self._archive.write(path, arcname)
+            return
+
+        if st is None:
+            st = path.stat()
+        zinfo = _get_zipinfo(arcname, st)
+        if self._reproducible:
+            mode = zinfo.external_attr >> 16
+            zinfo.date_time = cast(Any, self._date_time)
+            zinfo.create_system = 3  # Unix, otherwise the permissions are ignored.
+            zinfo.external_attr = (stat.S_IFMT(mode) | get_reproducible_mode(mode, zinfo.is_dir())) << 16 | (
+                zinfo.external_attr & 0xFFFF
+            )
+        if not stat.S_ISREG(st.st_mode):
+            # Write all members that we held back first to retain the order.
+            while self._pending:
+                self._write_next()
+            # Directories are written as empty members, like ZipFile.write() does.
+            self._archive.writestr(zinfo, os.readlink(path) if stat.S_ISLNK(st.st_mode) else b"")
+            return
+        zinfo.compress_type = zipfile.ZIP_STORED if store else self._archive.compression
+        setattr(zinfo, "_compresslevel", self._archive.compresslevel)
+
+        if not _RAW_WRITE_SUPPORTED:
+            if self._manifest is not None:
+                self._manifest[zinfo.filename] = {"size": st.st_size, "mtime": st.st_mtime_ns, "sha256": None}
+            self._write_member(path, zinfo)
+            return
+
+        if zinfo.compress_type == zipfile.ZIP_STORED and self._manifest is None:
+            # Stored members are copied without passing through Python buffers (see copy_file_data()).
+            while self._pending:
+                self._write_next()
+            crc, size = _crc32_file(path)
+            with path.open("rb") as src:
+                write_raw_zip_member(self._archive, zinfo, crc, size, src)
+            return
+
+        entry: dict[str, Any] | None = None
+        future: Future[_CompressedMember] | zipfile.ZipInfo
+        if self._manifest is not None:
+            entry = {"size": st.st_size, "mtime": st.st_mtime_ns, "sha256": None}
+            self._manifest[zinfo.filename] = entry
+            previous_zinfo = self._get_reusable_member(zinfo, path, entry)
+            if previous_zinfo is not None:
+                self._reused += 1
+                future = previous_zinfo
+            elif self._executor is None:
+                future = Future()
+                future.set_result(self._compress(path, zinfo, True))
+            else:
+                future = self._executor.submit(self._compress, path, zinfo, True)
+        elif self._executor is None:
+            self._write_member(path, zinfo)
+            return
+        else:
+            future = self._executor.submit(self._compress, path, zinfo)
+
+        self._pending.append((zinfo, future, entry))
+        # Limit the number of compressed members that are held back to write them in order.
+        while len(self._pending) > self._workers * 2:
+            self._write_next()
+
+    def _write_member(self, path: Path, zinfo: zipfile.ZipInfo) -> None:
+        """Same as :meth:`zipfile.ZipFile.write`, but with the *zinfo* that we created from the stat result."""
+
+        with path.open("rb") as src, self._archive.open(zinfo, "w") as dest:
+            shutil.copyfileobj(src, dest, self._CHUNK_SIZE)
+
+    def _get_reusable_member(self, zinfo: zipfile.ZipInfo, path: Path, entry: dict[str, Any]) -> zipfile.ZipInfo | None:
+        """Returns the member of the previous archive that can be reused for *path*, if any. Sets the `sha256` of
+        the *entry* if the file had to be hashed or is reused."""
+
+        assert self._manifest is not None
+        arcname = zinfo.filename
+        previous_entry = self._previous_manifest.get(arcname)
+        if self._previous is None or previous_entry is None or previous_entry["size"] != entry["size"]:
+            return None
+        if previous_entry["mtime"] != entry["mtime"]:
+            entry["sha256"] = _sha256_file(path)
+            if entry["sha256"] != previous_entry["sha256"]:
+                return None
+        try:
+            previous_zinfo = self._previous.getinfo(arcname)
+        except KeyError:
+            return None
+        if previous_zinfo.file_size != entry["size"] or previous_zinfo.compress_type != zinfo.compress_type:
+            return None
+        entry["sha256"] = previous_entry["sha256"]
+        return previous_zinfo
+
+    def _copy_raw_member(self, zinfo: zipfile.ZipInfo, previous_zinfo: zipfile.ZipInfo) -> None:
+        """Copy the compressed data of a member of the previous archive straight into the new archive."""
+
+        assert self._previous is not None and self._previous.fp is not None
+        fp = self._previous.fp
+        fp.seek(previous_zinfo.header_offset)
+        header = fp.read(self._FILE_HEADER_SIZE)
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        fp.seek(previous_zinfo.header_offset + self._FILE_HEADER_SIZE + name_length + extra_length)
+        try:
+            write_raw_zip_member(
+                self._archive, zinfo, previous_zinfo.CRC, previous_zinfo.file_size, fp, previous_zinfo.compress_size
+            )
+        except EOFError as exc:
+            raise zipfile.BadZipFile(f"truncated member {zinfo.filename!r} in {self._path}") from exc
+
+    def _compress(self, path: Path, zinfo: zipfile.ZipInfo, sha256: bool = False) -> _CompressedMember:
+        """Compress the file at *path* like :meth:`zipfile.ZipFile.write` does. Returns the CRC, the uncompressed
+        size, the compressed data and, if *sha256* is enabled, the SHA256 hex digest of the uncompressed data."""
+
+        compressor = None
+        if zinfo.compress_type == zipfile.ZIP_DEFLATED:
+            # The same compressor that zipfile uses for DEFLATE, the only compression method of the writer.
+            level = getattr(zinfo, "_compresslevel")
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+        hasher = hashlib.sha256() if sha256 else None
+        crc = 0
+        size = 0
+        buffer: IO[bytes] = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+        with path.open("rb") as fp:
+            for chunk in iter(lambda: fp.read(self._CHUNK_SIZE), b""):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                if hasher:
+                    hasher.update(chunk)
+                buffer.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            buffer.write(compressor.flush())
+        buffer.seek(0)
+        return crc, size, buffer, hasher.hexdigest() if hasher else None
+
+    def _write_next(self) -> None:
+        zinfo, future, entry = self._pending.popleft()
+        if isinstance(future, zipfile.ZipInfo):
+            self._copy_raw_member(zinfo, future)
+            return
+        crc, size, buffer, sha256 = future.result()
+        if entry is not None and sha256 is not None:
+            entry["sha256"] = sha256
+        with buffer:
+            write_raw_zip_member(self._archive, zinfo, crc, size, buffer)
+
+
+def _get_zipinfo(arcname: str, st: os.stat_result) -> zipfile.ZipInfo:
+    """Like :meth:`zipfile.ZipInfo.from_file`, but uses the stat result *st*. Symlinks get the permissions of the
+    symlink in the external attributes, like Info-ZIP does, such that they are extracted as symlinks."""
+
+    arcname = os.path.normpath(os.path.splitdrive(arcname)[1]).replace(os.sep, "/").lstrip("/")
+    is_dir = stat.S_ISDIR(st.st_mode)
+    zinfo = zipfile.ZipInfo(arcname + "/" if is_dir else arcname, time.localtime(st.st_mtime)[:6])
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    if is_dir:
+        zinfo.file_size = 0
+        zinfo.external_attr |= 0x10  # MS-DOS directory flag
+    else:
+        zinfo.file_size = st.st_size
+    return zinfo
+
+
+#: The CRC, uncompressed size, compressed data and optionally the SHA256 of a zip member.
+_CompressedMember = Tuple[int, int, IO[bytes], Optional[str]]
+
+
+def _sha256_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with path.open("rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _unlink(path: Path) -> None:
+    # Polyfill for Path.unlink(missing_ok=True) on Python 3.7.
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _crc32_file(path: Path) -> tuple[int, int]:
+    """Returns the CRC32 and the size of the contents of the file at *path*."""
+
+    with path.open("rb") as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size < ZERO_COPY_THRESHOLD:
+            data = fp.read()
+            return zlib.crc32(data), len(data)
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return zlib.crc32(mapped), len(mapped)
+
+
+#: The minimum number of bytes for which :func:`copy_file_data` uses the kernel or memory maps to copy data.
+ZERO_COPY_THRESHOLD = 256 * 1024
+
+
+def copy_file_data(src: IO[bytes], dest: IO[bytes], length: int) -> None:
+    """Copy *length* bytes from the current position in *src* to *dest*. If both are regular files, the data is
+    copied in the kernel with :func:`os.copy_file_range` or :func:`os.sendfile` where available. If only *src* is a
+    regular file, it is memory-mapped and written to *dest* (e.g. a compressor) in slices. Otherwise, this falls back
+    to copying through a buffer. Afterwards, both files are positioned after the copied data.
+
+    :raise EOFError: If *src* ends before *length* bytes were copied.
+    """
+
+    src_fd = _get_regular_file_descriptor(src)
+    dest_fd = _get_regular_file_descriptor(dest)
+
+    if src_fd is not None and dest_fd is not None and length >= ZERO_COPY_THRESHOLD:
+        dest.flush()
+        src_pos, dest_pos = src.tell(), dest.tell()
+        copied = _kernel_copy(src_fd, dest_fd, src_pos, dest_pos, length)
+        src.seek(src_pos + copied)
+        dest.seek(dest_pos + copied)
+        length -= copied
+
+    if src_fd is not None and length >= ZERO_COPY_THRESHOLD:
+        src_pos = src.tell()
+        end = src_pos + length
+        with mmap.mmap(src_fd, 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            if len(view) < end:
+                raise EOFError(f"unexpected end of file {src.name!r}")
+            for offset in range(src_pos, end, 1024 * 1024):
+                stop = min(offset + 1024 * 1024, end)
+                with view[offset:stop] as chunk:
+                    dest.write(chunk)
+        src.seek(end)
+        return
+
+    while length > 0:
+        data = src.read(min(length, 1024 * 1024))
+        if not data:
+            raise EOFError("unexpected end of file")
+        dest.write(data)
+        length -= len(data)
+
+
+def _get_regular_file_descriptor(fp: IO[bytes]) -> int | None:
+    # Do not call fileno() on other file objects, e.g. GzipFile returns the descriptor of the underlying file and
+    # SpooledTemporaryFile would roll over to disk.
+    if not isinstance(fp, (io.FileIO, io.BufferedReader, io.BufferedWriter, io.BufferedRandom)):
+        return None
+    fd = fp.fileno()
+    return fd if stat.S_ISREG(os.fstat(fd).st_mode) else None
+
+
+def _kernel_copy(src_fd: int, dest_fd: int, src_pos: int, dest_pos: int, length: int) -> int:
+    """Copy up to *length* bytes between the file descriptors in the kernel. Returns the number of bytes copied, which
+    is less than *length* if the platform does not support copying between the files."""
+
+    copy_file_range = getattr(os, "copy_file_range", None)
+    sendfile = getattr(os, "sendfile", None)
+    copied = 0
+    while copied < length:
+        try:
+            if copy_file_range is not None:
+                count = copy_file_range(src_fd, dest_fd, length - copied, src_pos + copied, dest_pos + copied)
+            elif sendfile is not None:
+                os.lseek(dest_fd, dest_pos + copied, os.SEEK_SET)
+                count = sendfile(dest_fd, src_fd, src_pos + copied, length - copied)
+            else:
+                break
+        except OSError as exc:
+            # E.g. copy_file_range() is not supported across file systems on older kernels, and sendfile() can only
+            # write to sockets on some platforms.
+            logger.debug("kernel copy failed (%s)", exc)
+            if copy_file_range is not None:
+                copy_file_range = None
+                continue
+            break
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def write_raw_zip_member(
+    archive: zipfile.ZipFile,
+    zinfo: zipfile.ZipInfo,
+    crc: int,
+    size: int,
+    data: IO[bytes],
+    compress_size: int | None = None,
+) -> None:
+    """Write a member with already compressed *data* to the *archive*, the same way that :meth:`zipfile.ZipFile.write`
+    would write it to a seekable file. The *zinfo* must have the `compress_type` set that *data* is compressed with,
+    *crc* and *size* are the CRC and size of the uncompressed data. The compressed data is read from the current
+    position of *data*, up to *compress_size* bytes or the end of *data*.
+
+    :raise EOFError: If *data* ends before *compress_size* bytes were read.
+    :raise NotImplementedError: If the Python implementation does not support writing raw members (see
+        :data:`_RAW_WRITE_SUPPORTED`).
+    """
+
+    if not _RAW_WRITE_SUPPORTED:
+        raise NotImplementedError(
+            f"writing raw zip members is not supported on {platform.python_implementation()} "
+            f"{platform.python_version()}"
+        )
+    assert archive.fp is not None, "archive is closed"
+    if compress_size is None:
+        start = data.tell()
+        data.seek(0, os.SEEK_END)
+        compress_size = data.tell() - start
+        data.seek(start)
+
+    zinfo.flag_bits = 0x00
+    if zinfo.compress_type == zipfile.ZIP_LZMA:
+        zinfo.flag_bits |= 0x02  # The compressed data includes an end-of-stream marker
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16
+    # The same condition that ZipFile uses to decide whether the header needs the ZIP64 extension.
+    zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+    zinfo.compress_size = compress_size
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    if not zip64 and (size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT):
+        raise RuntimeError(f"file size too large for {zinfo.filename!r}")
+
+    fp = archive.fp
+    fp.seek(archive.start_dir)
+    zinfo.header_offset = fp.tell()
+    archive._writecheck(zinfo)  # type: ignore[attr-defined]
+    archive._didModify = True  # type: ignore[attr-defined]
+    fp.write(zinfo.FileHeader(zip64))
+    copy_file_data(data, fp, compress_size)
+    archive.start_dir = fp.tell()
+    archive.filelist.append(zinfo)
+    archive.NameToInfo[zinfo.filename] = zinfo
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """A writable file object that gzip compresses the data written to it in blocks that are compressed in
+    parallel, similar to `pigz`. Every block is primed with the last 32 KiB of the previous block to retain most of
+    the compression ratio. The output only depends on the data and the compression level, not on the number of
+    *workers*, and the gzip header does not contain a timestamp or file name."""
+
+    BLOCK_SIZE = 128 * 1024
+
+    def __init__(self, fileobj: BinaryIO, compression_level: int = 9, workers: int = 1) -> None:
+        self._fileobj = fileobj
+        self._level = compression_level
+        self._workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        self._pending: Deque[Future[bytes]] = collections.deque()
+        self._buffer = bytearray()
+        self._zdict = b""
+        self._crc = 0
+        self._size = 0
+        xfl = 2 if compression_level == 9 else 4 if compression_level == 1 else 0
+        self._fileobj.write(b"\x1f\x8b\x08\x00\x00\x00\x00\x00" + bytes([xfl]) + b"\xff")
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._size
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.BLOCK_SIZE:
+            self._submit(bytes(self._buffer[: self.BLOCK_SIZE]))
+            del self._buffer[: self.BLOCK_SIZE]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._executor.submit(self._compress, block, self._zdict))
+        self._zdict = block[-32768:]  # The size of the deflate window.
+        while len(self._pending) > self._workers * 2:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def _compress(self, block: bytes, zdict: bytes) -> bytes:
+        if zdict:
+            compressor = zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+        else:
+            compressor = zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        # A sync flush ends the block on a byte boundary without marking it as the last block of the stream.
+        return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._fileobj.write(self._pending.popleft().result())
+            # An empty final block terminates the deflate stream.
+            self._fileobj.write(zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS).flush())
+            self._fileobj.write(struct.pack("<II", self._crc, self._size & 0xFFFFFFFF))
+        finally:
+            self._executor.shutdown()
+            self._fileobj.close()
+            super().close()
 
 
 def dist(
@@ -204,6 +1033,10 @@ def dist(
     output_file: str | Path,
     archive_type: str | None = None,
     prefix: str | None = None,
+    compression_level: int | None = None,
+    workers: int = 1,
+    incremental: bool = False,
+    reproducible: bool = False,
     project: Project | None = None,
 ) -> DistributionTask:
     """Create a task that produces a distribution from the resources provided by the tasks specified with *include*.
@@ -214,8 +1047,12 @@ def dist(
         map each dependency to a dictionary of settings that can be deserialized into :class:`IndividualDistOptions`.
     :param output_file: The output filename to write to. If a string is specified, it will be treated relative to the
         project build directory. If a path object is specified, it will be treated relative to the project directory.
-    :param archive_type: The type of archive to create (e.g. `zip`, `tar`, `tar.gz`, `tar.bz2` or `tar.xz`). If left
-        empty, the archive type is derived from the *output_filename* suffix.
+    :param archive_type: The type of archive to create (e.g. `zip`, `tar`, `tar.gz`, `tar.bz2`, `tar.xz`, `tar.zst`
+        or `tar.lz4`). If left empty, the archive type is derived from the *output_filename* suffix.
+    :param compression_level: The compression level. Zip archives are stored uncompressed unless a level is specified.
+    :param workers: The number of threads to compress `zip`, `tar.gz` and `tar.zst` archives with.
+    :param incremental: Reuse unchanged members from the previous archive. Only supported for `zip` archives.
+    :param reproducible: Write a reproducible archive, see :attr:`DistributionTask.reproducible`.
     :param project: The project to create the task for.
     """
 
@@ -263,4 +1100,8 @@ def dist(
         output_file=output_file,
         archive_type=archive_type,
         prefix=prefix,
+        compression_level=compression_level,
+        workers=workers,
+        incremental=incremental,
+        reproducible=reproducible,
     )
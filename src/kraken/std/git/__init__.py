@@ -6,10 +6,11 @@ from typing import Optional, Sequence, cast
 
 from kraken.core.api import Project
 
+from .diff import git_changed_files, git_merge_base
 from .tasks.gitignore_sync_task import GitignoreSyncTask
 from .version import GitVersion, git_describe
 
-__all__ = ["git_describe", "GitVersion", "GitignoreSyncTask", "gitignore"]
+__all__ = ["git_changed_files", "git_describe", "git_merge_base", "GitVersion", "GitignoreSyncTask", "gitignore"]
 
 GITIGNORE_TASK_NAME = "gitignore"
 
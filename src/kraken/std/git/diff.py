@@ -0,0 +1,58 @@
+""" Determine the files that changed in a Git repository relative to a base ref, e.g. for pull request builds. """
+
+from __future__ import annotations
+
+import subprocess as sp
+from pathlib import Path
+
+
+def git_toplevel(path: Path) -> Path:
+    """Returns the root directory of the Git repository that contains *path*.
+
+    :raise ValueError: If *path* is not inside a Git repository.
+    """
+
+    try:
+        command = ["git", "rev-parse", "--show-toplevel"]
+        return Path(sp.check_output(command, cwd=path, stderr=sp.DEVNULL).decode().strip())
+    except sp.CalledProcessError:
+        raise ValueError(f"not a Git repository: {path}")
+
+
+def git_merge_base(path: Path, base_ref: str, ref: str = "HEAD") -> str:
+    """Returns the commit SHA of the best common ancestor of *base_ref* and *ref*.
+
+    :raise ValueError: If the merge base could not be determined, e.g. because *base_ref* does not exist or the
+        repository is a shallow clone that does not contain the common ancestor.
+    """
+
+    try:
+        command = ["git", "merge-base", base_ref, ref]
+        return sp.check_output(command, cwd=path, stderr=sp.DEVNULL).decode().strip()
+    except sp.CalledProcessError:
+        raise ValueError(f"could not determine the merge base of {base_ref!r} and {ref!r}")
+
+
+def git_changed_files(path: Path, base_ref: str, untracked: bool = True) -> list[Path]:
+    """Returns the absolute paths of the files that changed between the merge base of *base_ref* and `HEAD`, and the
+    working tree. This includes uncommitted changes and, with *untracked* enabled, untracked files that are not
+    ignored. Deleted and renamed files are included with the path they had before, so the returned files may not
+    exist.
+
+    :raise ValueError: If the directory is not a Git repository or the merge base could not be determined.
+    """
+
+    toplevel = git_toplevel(path)
+    merge_base = git_merge_base(path, base_ref)
+    commands = [["git", "diff", "--name-only", "--no-renames", "-z", merge_base]]
+    if untracked:
+        commands.append(["git", "ls-files", "--others", "--exclude-standard", "--full-name", "-z"])
+
+    files: set[Path] = set()
+    for command in commands:
+        try:
+            output = sp.check_output(command, cwd=toplevel).decode()
+        except sp.CalledProcessError:
+            raise ValueError(f"command failed: {command}")
+        files.update(toplevel / name for name in output.split("\0") if name)
+    return sorted(files)
@@ -5,6 +5,7 @@ from __future__ import annotations
 import dataclasses
 import urllib.parse
 from pathlib import Path
+from typing import Iterator
 
 import httpx
 from kraken.core.api import Project, Property, Task, TaskStatus
@@ -40,6 +41,11 @@ def helm_settings(project: Project | None = None) -> HelmSettings:
     return settings
 
 
+def _read_chunks(path: Path, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    with path.open("rb") as fp:
+        yield from iter(lambda: fp.read(chunk_size), b"")
+
+
 class HelmPackageTask(Task):
     """Packages a Helm chart."""
 
@@ -110,6 +116,7 @@ class HelmPushTask(Task):
                 credentials = settings.auth[oci_login_host]
                 break
         else:
+            credentials = None
             oci_login_host = None
 
         if url.scheme == "oci" and credentials:
@@ -138,7 +145,15 @@ class HelmPushTask(Task):
                 self.registry.get(),
             )
             self.chart_url.set(urllib.parse.urljoin(self.registry.get() + "/", self.chart_name.get()))
-            response = httpx.put(self.chart_url.get(), content=self.chart_tarball.get().read_bytes(), auth=credentials)
+            # Stream the chart instead of reading it into memory. With an explicit Content-Length, httpx does not
+            # fall back to a chunked upload, which not all registries support.
+            chart_tarball = self.chart_tarball.get()
+            response = httpx.put(
+                self.chart_url.get(),
+                content=_read_chunks(chart_tarball),
+                headers={"Content-Length": str(chart_tarball.stat().st_size)},
+                auth=credentials,
+            )
             response.raise_for_status()
             self.logger.info("chart url = %s", self.chart_url.get())
         else:
@@ -4,8 +4,13 @@
 from __future__ import annotations
 
 import abc
+import hashlib
+import json
+import os
+import shutil
+import sys
 from pathlib import Path
-from typing import TYPE_CHECKING, ClassVar
+from typing import TYPE_CHECKING, ClassVar, Sequence
 
 from kraken.core import TaskStatus
 
@@ -79,8 +84,105 @@ class ManagedEnvironment(abc.ABC):
         """Install the managed environment. This should be a no-op if the environment already exists."""
 
 
-def detect_build_system(project_directory: Path) -> PythonBuildSystem | None:
-    """Detect the Python build system used in *project_directory*."""
+def is_valid_venv(path: Path) -> bool:
+    """Returns `True` if *path* is a virtual environment whose Python interpreter still exists."""
+
+    try:
+        config = (path / "pyvenv.cfg").read_text()
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+    for line in config.splitlines():
+        key, sep, value = line.partition("=")
+        if sep and key.strip() == "home" and not Path(value.strip()).is_dir():
+            return False
+    # On POSIX systems, this follows the symlink to the base interpreter.
+    return (path / ("Scripts/python.exe" if os.name == "nt" else "bin/python")).exists()
+
+
+class ManagedEnvironmentCache:
+    """Persists the path of a managed environment in the build directory, so that the build system, whose CLI may be
+    slow to start, only needs to be asked for it once. The path is invalidated if the contents of the *key_files* in
+    the project directory or of the *global_key_files* change, if an environment variable that starts with one of the
+    *key_environment_prefixes* or the Python interpreter changes, or if it is no longer a valid virtual environment."""
+
+    def __init__(
+        self,
+        cache_file: Path,
+        project_directory: Path,
+        key_files: Sequence[str],
+        global_key_files: Sequence[Path] = (),
+        key_environment_prefixes: Sequence[str] = (),
+    ) -> None:
+        self.cache_file = cache_file
+        self.project_directory = project_directory
+        self.key_files = key_files
+        self.global_key_files = global_key_files
+        self.key_environment_prefixes = key_environment_prefixes
+
+    def get_key(self) -> str:
+        hasher = hashlib.sha256()
+        for path in [*(self.project_directory / name for name in self.key_files), *self.global_key_files]:
+            hasher.update(str(path).encode() + b"\0")
+            if path.is_file():
+                hasher.update(hashlib.sha256(path.read_bytes()).digest())
+        for name, value in sorted(os.environ.items()):
+            if name.startswith(tuple(self.key_environment_prefixes)):
+                hasher.update(f"{name}={value}".encode() + b"\0")
+        # Not resolved, because the `python` of a virtual environment is a symlink to the base interpreter, and
+        # activating another environment must invalidate the cache.
+        python = shutil.which("python3") or shutil.which("python") or sys.executable
+        hasher.update(python.encode())
+        return hasher.hexdigest()
+
+    def get(self) -> Path | None:
+        """Returns the cached path of the environment, or `None` if it is not cached or no longer valid."""
+
+        try:
+            data = json.loads(self.cache_file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not isinstance(data, dict) or data.get("key") != self.get_key():
+            return None
+        path = Path(data["path"])
+        return path if is_valid_venv(path) else None
+
+    def set(self, path: Path) -> None:
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_file.write_text(json.dumps({"key": self.get_key(), "path": str(path)}))
+
+    def clear(self) -> None:
+        try:
+            self.cache_file.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def get_managed_environment_cache(
+    build_directory: Path | None,
+    project_directory: Path,
+    key_files: Sequence[str],
+    global_key_files: Sequence[Path] = (),
+    key_environment_prefixes: Sequence[str] = (),
+) -> ManagedEnvironmentCache | None:
+    """Returns the cache for the managed environment of a project, or `None` if no *build_directory* is known."""
+
+    if build_directory is None:
+        return None
+    return ManagedEnvironmentCache(
+        build_directory / "python" / "managed-env.json",
+        project_directory,
+        key_files,
+        global_key_files,
+        key_environment_prefixes,
+    )
+
+
+def detect_build_system(project_directory: Path, build_directory: Path | None = None) -> PythonBuildSystem | None:
+    """Detect the Python build system used in *project_directory*.
+
+    :param build_directory: The build directory of the project, in which the build system can cache the path of its
+        managed environment.
+    """
 
     pyproject_toml = project_directory / "pyproject.toml"
     if not pyproject_toml.is_file():
@@ -91,16 +193,16 @@ def detect_build_system(project_directory: Path) -> PythonBuildSystem | None:
     if "[tool.slap]" in pyproject_content:
         from .slap import SlapPythonBuildSystem
 
-        return SlapPythonBuildSystem(project_directory)
+        return SlapPythonBuildSystem(project_directory, build_directory)
 
     if "poetry-core" in pyproject_content:
         from .poetry import PoetryPythonBuildSystem
 
-        return PoetryPythonBuildSystem(project_directory)
+        return PoetryPythonBuildSystem(project_directory, build_directory)
 
     if "maturin" in pyproject_content:
         from .maturin import MaturinPythonBuildSystem
 
-        return MaturinPythonBuildSystem(project_directory)
+        return MaturinPythonBuildSystem(project_directory, build_directory)
 
     return None
@@ -34,7 +34,7 @@ class MaturinPythonBuildSystem(PoetryPythonBuildSystem):
     name = "Maturin"
 
     def get_managed_environment(self) -> ManagedEnvironment:
-        return MaturinManagedEnvironment(self.project_directory)
+        return MaturinManagedEnvironment(self.project_directory, self.build_directory)
 
     def update_pyproject(self, settings: PythonSettings, pyproject: Pyproject) -> None:
         super().update_pyproject(settings, pyproject)
@@ -50,7 +50,8 @@ class MaturinPythonBuildSystem(PoetryPythonBuildSystem):
             old_project_version = pyproject.set_core_metadata_version(as_version)
             pyproject.save()
 
-        metadata = CargoMetadata.read(self.project_directory)
+        cache_file = self.build_directory / "cargo-metadata.json" if self.build_directory else None
+        metadata = CargoMetadata.read(self.project_directory, cache_file)
         dist_dir = metadata.target_directory / "wheels"
         if dist_dir.exists():
             shutil.rmtree(dist_dir)
@@ -6,9 +6,12 @@ import logging
 import os
 import shutil
 import subprocess as sp
+import sys
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Mapping
 
+import tomli
 from kraken.common import NotSet
 from kraken.common.path import is_relative_to
 from kraken.common.pyenv import get_current_venv
@@ -17,7 +20,7 @@ from kraken.core import TaskStatus
 from kraken.std.python.pyproject import Pyproject
 from kraken.std.python.settings import PythonSettings
 
-from . import ManagedEnvironment, PythonBuildSystem
+from . import ManagedEnvironment, PythonBuildSystem, get_managed_environment_cache
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +28,15 @@ logger = logging.getLogger(__name__)
 class PoetryPythonBuildSystem(PythonBuildSystem):
     name = "Poetry"
 
-    def __init__(self, project_directory: Path) -> None:
+    def __init__(self, project_directory: Path, build_directory: Path | None = None) -> None:
         self.project_directory = project_directory
+        self.build_directory = build_directory
 
     def supports_managed_environments(self) -> bool:
         return True
 
     def get_managed_environment(self) -> ManagedEnvironment:
-        return PoetryManagedEnvironment(self.project_directory)
+        return PoetryManagedEnvironment(self.project_directory, self.build_directory)
 
     def update_pyproject(self, settings: PythonSettings, pyproject: Pyproject) -> None:
         for source in pyproject.get_poetry_sources():
@@ -94,10 +98,52 @@ class PoetryPythonBuildSystem(PythonBuildSystem):
         return dst_files
 
 
+def get_poetry_global_files(environ: Mapping[str, str] = os.environ) -> list[Path]:
+    """Returns Poetry's global configuration file, which may set `virtualenvs.in-project` or `virtualenvs.path`, and
+    the `envs.toml` file in which `poetry env use` records the environment that was chosen for a project."""
+
+    if sys.platform == "win32":
+        config_dir = Path(environ.get("APPDATA", "~/AppData/Roaming")) / "pypoetry"
+        cache_dir = Path(environ.get("LOCALAPPDATA", "~/AppData/Local")) / "pypoetry" / "Cache"
+    elif sys.platform == "darwin":
+        config_dir = Path("~/Library/Application Support/pypoetry")
+        cache_dir = Path("~/Library/Caches/pypoetry")
+    else:
+        config_dir = Path(environ.get("XDG_CONFIG_HOME", "~/.config")) / "pypoetry"
+        cache_dir = Path(environ.get("XDG_CACHE_HOME", "~/.cache")) / "pypoetry"
+    config_file = (Path(environ["POETRY_CONFIG_DIR"]) if "POETRY_CONFIG_DIR" in environ else config_dir).expanduser()
+    config_file = config_file / "config.toml"
+
+    try:
+        config = tomli.loads(config_file.read_text())
+    except (FileNotFoundError, tomli.TOMLDecodeError):
+        config = {}
+    cache_dir = Path(environ.get("POETRY_CACHE_DIR") or config.get("cache-dir") or cache_dir).expanduser()
+    virtualenvs_path = environ.get("POETRY_VIRTUALENVS_PATH") or config.get("virtualenvs", {}).get("path")
+    if virtualenvs_path:
+        virtualenvs_dir = Path(virtualenvs_path.replace("{cache-dir}", str(cache_dir))).expanduser()
+    else:
+        virtualenvs_dir = cache_dir / "virtualenvs"
+    return [config_file, virtualenvs_dir / "envs.toml"]
+
+
 class PoetryManagedEnvironment(ManagedEnvironment):
-    def __init__(self, project_directory: Path) -> None:
+    #: Files in the project directory that affect which environment Poetry uses.
+    CACHE_KEY_FILES = ("pyproject.toml", "poetry.lock", "poetry.toml")
+
+    #: Environment variables that override the Poetry settings that affect which environment Poetry uses.
+    CACHE_KEY_ENVIRONMENT_PREFIXES = ("POETRY_VIRTUALENVS_",)
+
+    def __init__(self, project_directory: Path, build_directory: Path | None = None) -> None:
         self.project_directory = project_directory
         self._env_path: Path | None | NotSet = NotSet.Value
+        self._cache = get_managed_environment_cache(
+            build_directory,
+            project_directory,
+            self.CACHE_KEY_FILES,
+            get_poetry_global_files(),
+            self.CACHE_KEY_ENVIRONMENT_PREFIXES,
+        )
 
     def _get_current_poetry_environment_path(self) -> Path | None:
         """Uses `poetry env info -p`. This will not work if Poetry has to fall back to a compatible Python
@@ -162,7 +208,11 @@ class PoetryManagedEnvironment(ManagedEnvironment):
 
     def get_path(self) -> Path:
         if self._env_path is NotSet.Value:
-            self._env_path = self._get_poetry_environment_path()
+            self._env_path = self._cache.get() if self._cache else None
+            if self._env_path is None:
+                self._env_path = self._get_poetry_environment_path()
+                if self._env_path is not None and self._cache:
+                    self._cache.set(self._env_path)
         if self._env_path is None:
             raise RuntimeError("managed environment does not exist")
         return self._env_path
@@ -171,3 +221,7 @@ class PoetryManagedEnvironment(ManagedEnvironment):
         command = ["poetry", "install", "--no-interaction"]
         logger.info("%s", command)
         sp.check_call(command, cwd=self.project_directory)
+        # Poetry may have created the environment, or recreated it in another place.
+        self._env_path = NotSet.Value
+        if self._cache:
+            self._cache.clear()
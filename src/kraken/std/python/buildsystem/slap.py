@@ -18,7 +18,7 @@ from kraken.core import TaskStatus
 from kraken.std.python.buildsystem.poetry import PoetryPythonBuildSystem
 from kraken.std.python.pyproject import Pyproject
 
-from . import ManagedEnvironment, PythonBuildSystem
+from . import ManagedEnvironment, PythonBuildSystem, get_managed_environment_cache
 
 if TYPE_CHECKING:
     from ..settings import PythonSettings
@@ -29,14 +29,15 @@ logger = logging.getLogger(__name__)
 class SlapPythonBuildSystem(PythonBuildSystem):
     name = "Slap"
 
-    def __init__(self, project_directory: Path) -> None:
+    def __init__(self, project_directory: Path, build_directory: Path | None = None) -> None:
         self.project_directory = project_directory
+        self.build_directory = build_directory
 
     def supports_managed_environments(self) -> bool:
         return True
 
     def get_managed_environment(self) -> ManagedEnvironment:
-        return SlapManagedEnvironment(self.project_directory)
+        return SlapManagedEnvironment(self.project_directory, self.build_directory)
 
     def update_pyproject(self, settings: PythonSettings, pyproject: Pyproject) -> None:
         if "poetry" in pyproject.get("tool", {}):
@@ -67,9 +68,13 @@ class SlapPythonBuildSystem(PythonBuildSystem):
 
 
 class SlapManagedEnvironment(ManagedEnvironment):
-    def __init__(self, project_directory: Path) -> None:
+    #: Files in the project directory that affect which environment Slap uses.
+    CACHE_KEY_FILES = ("pyproject.toml", "slap.toml")
+
+    def __init__(self, project_directory: Path, build_directory: Path | None = None) -> None:
         self.project_directory = project_directory
         self._env_path: Path | None | NotSet = NotSet.Value
+        self._cache = get_managed_environment_cache(build_directory, project_directory, self.CACHE_KEY_FILES)
 
     def exists(self) -> bool:
         try:
@@ -78,17 +83,22 @@ class SlapManagedEnvironment(ManagedEnvironment):
         except RuntimeError:
             return False
 
+    def _get_slap_environment_path(self) -> Path | None:
+        command = ["slap", "venv", "-p"]
+        try:
+            return Path(sp.check_output(command, cwd=self.project_directory, stderr=sp.DEVNULL).decode().strip())
+        except sp.CalledProcessError as exc:
+            if exc.returncode != 1:
+                raise
+            return None
+
     def get_path(self) -> Path:
         if self._env_path is NotSet.Value:
-            command = ["slap", "venv", "-p"]
-            try:
-                self._env_path = Path(
-                    sp.check_output(command, cwd=self.project_directory, stderr=sp.DEVNULL).decode().strip()
-                )
-            except sp.CalledProcessError as exc:
-                if exc.returncode != 1:
-                    raise
-                self._env_path = None
+            self._env_path = self._cache.get() if self._cache else None
+            if self._env_path is None:
+                self._env_path = self._get_slap_environment_path()
+                if self._env_path is not None and self._cache:
+                    self._cache.set(self._env_path)
         if self._env_path is None:
             raise RuntimeError("managed environment does not exist")
         return self._env_path
@@ -99,6 +109,7 @@ class SlapManagedEnvironment(ManagedEnvironment):
             command = ["slap", "venv", "-ac"]
             logger.info("%s", command)
             sp.check_call(command, cwd=self.project_directory)
+            self._env_path = NotSet.Value
 
         # Install into the environment.
         command = ["slap", "install", "--ignore-active-venv", "--link"]
@@ -115,3 +126,7 @@ class SlapManagedEnvironment(ManagedEnvironment):
 
         logger.info("%s", safe_command)
         sp.check_call(command, cwd=self.project_directory)
+        # Slap may have created the environment, or recreated it in another place.
+        self._env_path = NotSet.Value
+        if self._cache:
+            self._cache.clear()
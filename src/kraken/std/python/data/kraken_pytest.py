@@ -0,0 +1,136 @@
+"""
+A Pytest plugin that is loaded into the Pytest processes started by :class:`kraken.std.python.PytestTask` with
+`-p kraken_pytest`. It runs in the environment of the project under test, so it must only depend on Pytest and the
+standard library (and Coverage.py, which is imported only when it is needed). It is controlled with environment
+variables:
+
+* `KRAKEN_PYTEST_COLLECT_FILE`: Write the IDs of the collected tests to this file as a JSON list.
+* `KRAKEN_PYTEST_SELECT_FILE`: Deselect all tests whose IDs are not in the JSON list in this file.
+* `KRAKEN_PYTEST_DESELECT_FILE`: Deselect all tests whose IDs are in the JSON list in this file.
+* `KRAKEN_PYTEST_DURATIONS_FILE`: Write the duration of every test in seconds (including setup and teardown) to
+  this file as a JSON object.
+* `KRAKEN_PYTEST_IMPACT_FILE`: Record the files that every test depends on with Coverage.py and write them to this
+  file as a JSON object that maps test IDs to paths relative to the current directory. A test depends on the files
+  that are executed while it runs and while its module is collected (i.e. imported).
+* `KRAKEN_PYTEST_COVERAGE_FILE`: Measure the code coverage with Coverage.py and save the data to this file. The
+  configuration of the project applies, and `KRAKEN_PYTEST_COVERAGE_SOURCE` overrides its source setting with a
+  list of paths separated by :data:`os.pathsep`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import warnings
+from typing import Any, Dict, Generator, List, Optional, Set
+
+import pytest
+
+_durations: Dict[str, float] = {}
+_coverage: Optional[Any] = None
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_load_initial_conftests() -> None:
+    # Start measuring before the conftest files are loaded, as they may import the code under test.
+    global _coverage
+    data_file = os.getenv("KRAKEN_PYTEST_COVERAGE_FILE")
+    if not data_file and not os.getenv("KRAKEN_PYTEST_IMPACT_FILE"):
+        return
+    try:
+        import coverage
+    except ImportError:
+        warnings.warn("coverage is not installed, cannot measure the coverage of the tests")
+        return
+    if data_file:
+        source = os.getenv("KRAKEN_PYTEST_COVERAGE_SOURCE")
+        _coverage = coverage.Coverage(
+            data_file=data_file, data_suffix=False, source=source.split(os.pathsep) if source else None
+        )
+    else:
+        _coverage = coverage.Coverage(data_file=None, config_file=False, omit=["*/site-packages/*"])
+    _coverage.start()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_make_collect_report(collector: pytest.Collector) -> Generator[None, None, None]:
+    if _coverage is None or not isinstance(collector, pytest.File):
+        yield
+        return
+    _coverage.switch_context(collector.nodeid)
+    yield
+    _coverage.switch_context("")
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item: pytest.Item) -> Generator[None, None, None]:
+    if _coverage is None:
+        yield
+        return
+    _coverage.switch_context(item.nodeid)
+    yield
+    _coverage.switch_context("")
+
+
+def _read_test_ids(env_var: str) -> Optional[Set[str]]:
+    filename = os.getenv(env_var)
+    if not filename:
+        return None
+    with open(filename) as fp:
+        return set(json.load(fp))
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: List[pytest.Item]) -> None:
+    selected = _read_test_ids("KRAKEN_PYTEST_SELECT_FILE")
+    unselected = _read_test_ids("KRAKEN_PYTEST_DESELECT_FILE") or set()
+    deselected = [
+        item for item in items if (selected is not None and item.nodeid not in selected) or item.nodeid in unselected
+    ]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        deselected_ids = {item.nodeid for item in deselected}
+        items[:] = [item for item in items if item.nodeid not in deselected_ids]
+
+
+def pytest_collection_finish(session: pytest.Session) -> None:
+    collect_file = os.getenv("KRAKEN_PYTEST_COLLECT_FILE")
+    if collect_file:
+        with open(collect_file, "w") as fp:
+            json.dump([item.nodeid for item in session.items], fp)
+
+
+def pytest_runtest_logreport(report: pytest.TestReport) -> None:
+    _durations[report.nodeid] = _durations.get(report.nodeid, 0.0) + report.duration
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    durations_file = os.getenv("KRAKEN_PYTEST_DURATIONS_FILE")
+    if durations_file:
+        with open(durations_file, "w") as fp:
+            json.dump(_durations, fp)
+
+    if _coverage is not None:
+        _coverage.stop()
+        impact_file = os.getenv("KRAKEN_PYTEST_IMPACT_FILE")
+        if impact_file:
+            with open(impact_file, "w") as fp:
+                json.dump(_get_test_dependencies(session.items), fp)
+        if os.getenv("KRAKEN_PYTEST_COVERAGE_FILE"):
+            _coverage.save()
+
+
+def _get_test_dependencies(items: List[pytest.Item]) -> Dict[str, List[str]]:
+    assert _coverage is not None
+    data = _coverage.get_data()
+    files_by_context: Dict[str, Set[str]] = {}
+    for filename in data.measured_files():
+        relpath = os.path.relpath(filename)
+        for contexts in data.contexts_by_lineno(filename).values():
+            for context in contexts:
+                files_by_context.setdefault(context, set()).add(relpath)
+    return {
+        item.nodeid: sorted(
+            files_by_context.get(item.nodeid, set()) | files_by_context.get(item.nodeid.split("::")[0], set())
+        )
+        for item in items
+    }
@@ -0,0 +1,108 @@
+"""
+Test-impact analysis: a map of the files that every test depends on, recorded with Coverage.py contexts by the
+`kraken_pytest` plugin, is used to select only the tests that are affected by the files that changed.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Collection, Dict, Iterable, List, Mapping
+
+#: Files that declare the dependencies of a project. If any of them change, all tests need to run.
+DEPENDENCY_FILES = (
+    "pyproject.toml",
+    "poetry.lock",
+    "pdm.lock",
+    "setup.py",
+    "setup.cfg",
+    "requirements.txt",
+    "requirements-dev.txt",
+    "Pipfile.lock",
+)
+
+
+def hash_dependency_files(project_directory: Path) -> str:
+    """Hash the contents of the :data:`DEPENDENCY_FILES` that exist in *project_directory*."""
+
+    hasher = hashlib.sha256()
+    for name in DEPENDENCY_FILES:
+        path = project_directory / name
+        if path.is_file():
+            hasher.update(name.encode() + b"\0" + hashlib.sha256(path.read_bytes()).digest())
+    return hasher.hexdigest()
+
+
+def hash_conftest_files(project_directory: Path, directories: Iterable[Path]) -> dict[str, str]:
+    """Hash the contents of the `conftest.py` file in *project_directory* and of those in the *directories*. Returns
+    a mapping of their paths relative to *project_directory* to their hashes."""
+
+    files = {project_directory / "conftest.py"}
+    for directory in directories:
+        files.update((project_directory / directory).rglob("conftest.py"))
+    return {
+        path.relative_to(project_directory).as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+        for path in sorted(files)
+        if path.is_file()
+    }
+
+
+def get_changed_conftest_files(old: Mapping[str, str], new: Mapping[str, str]) -> list[str]:
+    """Returns the paths of the `conftest.py` files that were added, removed or changed between the hashes *old* and
+    *new* (see :func:`hash_conftest_files`)."""
+
+    return sorted(path for path in old.keys() | new.keys() if old.get(path) != new.get(path))
+
+
+@dataclasses.dataclass
+class ImpactMap:
+    #: The hash of the dependency files when the map was recorded (see :func:`hash_dependency_files`).
+    dependencies_hash: str
+
+    #: The hashes of the `conftest.py` files when the map was recorded (see :func:`hash_conftest_files`). Changes to
+    #: these files cannot be attributed to individual tests.
+    conftest_hashes: Dict[str, str]
+
+    #: The number of runs that only ran the affected tests since the map was recorded.
+    runs_since_full_run: int
+
+    #: Maps the ID of every test to the files that were executed while the test ran or while its module was
+    #: collected, relative to the project directory.
+    tests: Dict[str, List[str]]
+
+    @staticmethod
+    def read(path: Path) -> ImpactMap | None:
+        """Read the map from *path*. Returns `None` if the file does not exist or is invalid."""
+
+        try:
+            data = json.loads(path.read_text())
+            return ImpactMap(
+                data["dependencies_hash"], data["conftest_hashes"], data["runs_since_full_run"], data["tests"]
+            )
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            return None
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(dataclasses.asdict(self)))
+
+    def get_unaffected_tests(self, project_directory: Path, changed_files: Collection[Path]) -> set[str]:
+        """Returns the IDs of the recorded tests that do not depend on any of the *changed_files*. A test always
+        depends on the file that contains it. Tests that are not in the map are unknown and thus not returned."""
+
+        changed = {os.path.normcase(str(f.resolve())) for f in changed_files}
+        resolved: dict[str, bool] = {}
+
+        def is_changed(file: str) -> bool:
+            if file not in resolved:
+                resolved[file] = os.path.normcase(str((project_directory / file).resolve())) in changed
+            return resolved[file]
+
+        return {
+            test
+            for test, files in self.tests.items()
+            if not is_changed(test.split("::")[0]) and not any(is_changed(f) for f in files)
+        }
@@ -0,0 +1,246 @@
+"""
+Manages a bounded pool of Mypy daemons (`dmypy`) that is shared by all projects of a build and survives across
+Kraken invocations. Daemons are keyed by the Python interpreter, the Mypy configuration file, the target Python
+version and the other Mypy options, so projects that share these settings also share a warm daemon. The pool's state
+is stored in a JSON file in the build directory, which is guarded by a file lock. Daemons are only stopped after the
+lock is released, so that slow `dmypy stop` calls do not block other processes.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import subprocess as sp
+import time
+from pathlib import Path
+from typing import Any, Iterator, List, Mapping, Tuple
+
+from ..util.file_lock import file_lock
+from ..util.process import is_process_alive
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class MypyDaemonKey:
+    #: The path of the Python interpreter in whose environment Mypy is installed.
+    interpreter: str
+
+    #: The absolute path of the Mypy configuration file, if any.
+    config_file: str | None
+
+    python_version: str | None
+
+    #: The options that Mypy is run with. `dmypy run` restarts the daemon if they change, so runs with different
+    #: options must not share a daemon.
+    flags: Tuple[str, ...] = ()
+
+    def digest(self) -> str:
+        return hashlib.sha256(json.dumps(dataclasses.astuple(self)).encode()).hexdigest()[:16]
+
+    def get_config_hash(self) -> str | None:
+        """Returns the hash of the configuration file's contents, to detect when the daemon needs a restart."""
+
+        if self.config_file is None:
+            return None
+        try:
+            return hashlib.sha256(Path(self.config_file).read_bytes()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+
+class MypyDaemonPool:
+    """A pool of at most *max_daemons* Mypy daemons with their status files in *directory*.
+
+    :meth:`acquire` returns the status file of the daemon for a key, to be passed to `dmypy --status-file`, and
+    leases the daemon to the current process until :meth:`release` is called or the process exits. Before a daemon
+    is reused, it is restarted if its configuration file changed or if it does not respond to `dmypy status` within
+    *status_timeout* seconds, unless another process leases it. Daemons that were not used for *idle_ttl* seconds
+    are stopped, and the least recently used daemon is stopped if the pool is full. Leased daemons are never
+    stopped, so the pool may temporarily hold more than *max_daemons* daemons."""
+
+    def __init__(
+        self,
+        directory: Path,
+        max_daemons: int = 4,
+        idle_ttl: float = 3600.0,
+        status_timeout: float = 10.0,
+    ) -> None:
+        self.directory = directory
+        self.max_daemons = max_daemons
+        self.idle_ttl = idle_ttl
+        self.status_timeout = status_timeout
+
+    @property
+    def state_file(self) -> Path:
+        return self.directory / "pool.json"
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        # The pool is shared by concurrent Kraken processes, so a lock within this process is not enough.
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.directory / "pool.lock"):
+            yield
+
+    def get_status_file(self, key: MypyDaemonKey) -> Path:
+        return self.directory / f"{key.digest()}.json"
+
+    def _read_state(self) -> dict[str, dict[str, Any]]:
+        """Read the state of the pool. The leases of processes that have exited are removed."""
+
+        try:
+            state: dict[str, dict[str, Any]] = json.loads(self.state_file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        for entry in state.values():
+            entry["leases"] = [pid for pid in entry.get("leases", []) if is_process_alive(pid)]
+        return state
+
+    def _write_state(self, state: dict[str, dict[str, Any]]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, indent=2))
+        os.replace(tmp, self.state_file)
+
+    def _dmypy(self, status_file: Path, *args: str, env: Mapping[str, str] | None = None) -> int | None:
+        """Run a `dmypy` command. Returns `None` if the command did not complete within :attr:`status_timeout`."""
+
+        command = ["dmypy", "--status-file", str(status_file), *args]
+        try:
+            return sp.call(command, env=env, stdout=sp.DEVNULL, stderr=sp.DEVNULL, timeout=self.status_timeout)
+        except sp.TimeoutExpired:
+            return None
+
+    def _retire(self, status_file: Path) -> Path | None:
+        """Move the *status_file* of a daemon that is to be stopped out of the way, so that a new daemon can be started
+        with the same status file while the old one is stopped. Must be called while holding the lock. Returns the
+        new path of the status file, or `None` if the daemon is not running."""
+
+        retired = status_file.with_name(f"{status_file.stem}.{os.getpid()}.{time.monotonic_ns()}.stopping")
+        try:
+            os.replace(status_file, retired)
+        except FileNotFoundError:
+            return None
+        return retired
+
+    def _stop(self, retired: List[Tuple[Path, bool]], env: Mapping[str, str] | None) -> None:
+        """Stop (or kill) the daemons with the status files returned by :meth:`_retire`. Must be called without
+        holding the lock."""
+
+        for status_file, kill in retired:
+            if kill or self._dmypy(status_file, "stop", env=env) != 0:
+                self._dmypy(status_file, "kill", env=env)
+            _unlink(status_file)
+
+    def acquire(self, key: MypyDaemonKey, env: Mapping[str, str] | None = None) -> Path:
+        """Returns the status file of a healthy daemon for *key* and leases it to the current process. The daemon is
+        started by the next `dmypy run` if it is not running."""
+
+        retired: list[tuple[Path, bool]] = []
+
+        def retire(status_file: Path, kill: bool) -> None:
+            path = self._retire(status_file)
+            if path is not None:
+                retired.append((path, kill))
+
+        with self._locked():
+            state = self._read_state()
+            now = time.time()
+            digest = key.digest()
+            status_file = self.get_status_file(key)
+
+            for other_digest, other in list(state.items()):
+                if other_digest != digest and not other["leases"] and now - other["last_used"] > self.idle_ttl:
+                    logger.info("Stopping idle Mypy daemon (%s)", other["key"])
+                    retire(self.directory / other["status_file"], False)
+                    del state[other_digest]
+
+            config_hash = key.get_config_hash()
+            entry = state.get(digest)
+            if entry is not None and entry["leases"]:
+                # Another process is using the daemon, which may also be why it does not respond in time.
+                pass
+            elif entry is not None and entry["config_hash"] != config_hash:
+                logger.info("Restarting Mypy daemon because its configuration changed (%s)", key)
+                retire(status_file, True)
+            elif entry is not None and status_file.exists() and self._dmypy(status_file, "status", env=env) != 0:
+                logger.warning("Restarting Mypy daemon because it is not responding (%s)", key)
+                retire(status_file, True)
+
+            if entry is None:
+                while len(state) >= self.max_daemons:
+                    idle = [d for d in state if not state[d]["leases"]]
+                    if not idle:
+                        logger.info("All %d Mypy daemons are in use, starting another one", len(state))
+                        break
+                    lru_digest = min(idle, key=lambda d: state[d]["last_used"])
+                    logger.info("Stopping least recently used Mypy daemon (%s)", state[lru_digest]["key"])
+                    retire(self.directory / state.pop(lru_digest)["status_file"], False)
+
+            state[digest] = {
+                "key": dataclasses.asdict(key),
+                "status_file": status_file.name,
+                "config_hash": config_hash,
+                "last_used": now,
+                "leases": (entry["leases"] if entry else []) + [os.getpid()],
+            }
+            self._write_state(state)
+
+        self._stop(retired, env)
+        return status_file
+
+    def release(self, key: MypyDaemonKey) -> None:
+        """Release a lease on the daemon for *key* that the current process acquired with :meth:`acquire`."""
+
+        with self._locked():
+            state = self._read_state()
+            entry = state.get(key.digest())
+            if entry is not None and os.getpid() in entry["leases"]:
+                entry["leases"].remove(os.getpid())
+                entry["last_used"] = time.time()
+                self._write_state(state)
+
+    def discard(self, key: MypyDaemonKey, env: Mapping[str, str] | None = None) -> None:
+        """Kill the daemon for *key*, e.g. after it crashed, so that the next run starts a fresh one. The daemon is
+        kept if another process leases it. Releases the current process's lease."""
+
+        retired: list[tuple[Path, bool]] = []
+        with self._locked():
+            state = self._read_state()
+            entry = state.get(key.digest())
+            if entry is not None and os.getpid() in entry["leases"]:
+                entry["leases"].remove(os.getpid())
+            if entry is not None and entry["leases"]:
+                logger.info("Not restarting Mypy daemon because it is used by another process (%s)", key)
+                self._write_state(state)
+            else:
+                path = self._retire(self.get_status_file(key))
+                if path is not None:
+                    retired.append((path, True))
+                if state.pop(key.digest(), None) is not None:
+                    self._write_state(state)
+        self._stop(retired, env)
+
+    def stop_all(self, env: Mapping[str, str] | None = None) -> None:
+        """Stop all daemons in the pool, including the ones that are in use."""
+
+        retired: list[tuple[Path, bool]] = []
+        with self._locked():
+            for entry in self._read_state().values():
+                path = self._retire(self.directory / entry["status_file"])
+                if path is not None:
+                    retired.append((path, False))
+            self._write_state({})
+        self._stop(retired, env)
+
+
+def _unlink(path: Path) -> None:
+    # Polyfill for Path.unlink(missing_ok=True) on Python 3.7.
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
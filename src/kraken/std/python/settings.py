@@ -137,7 +137,7 @@ def python_settings(
 
     if build_system is None and settings.build_system is None:
         # Autodetect the environment handler.
-        build_system = detect_build_system(project.directory)
+        build_system = detect_build_system(project.directory, project.build_directory)
         if build_system:
             logger.info("Detected Python build system %r for %s", type(build_system).__name__, project)
 
@@ -5,11 +5,13 @@ import logging
 import os
 import shutil
 import subprocess as sp
-from typing import Iterable, List, MutableMapping
+from pathlib import Path
+from typing import Iterable, List, Mapping, MutableMapping
 
 from kraken.common.pyenv import VirtualEnvInfo, get_current_venv
-from kraken.core.api import Project, Task, TaskRelationship, TaskStatus
+from kraken.core.api import Project, Property, Task, TaskRelationship, TaskStatus
 
+from kraken.std.git.diff import git_changed_files
 from kraken.std.python.buildsystem import ManagedEnvironment
 
 from ..settings import python_settings
@@ -24,9 +26,26 @@ class EnvironmentAwareDispatchTask(Task):
     python_dependencies: List[str] = []
     """Packages that should be installed for this task to run."""
 
+    tool_config_files: List[str] = ["pyproject.toml", "setup.cfg", "tox.ini", "poetry.lock"]
+    """Names of files that configure the tool. If any of them changed, :attr:`changed_files_only` runs the tool on
+    all files."""
+
+    #: If enabled, only the Python files that changed relative to :attr:`changed_files_base_ref` are passed to the
+    #: tool, instead of the source and tests directories. The task runs on all files if a configuration file of the
+    #: tool changed (see :attr:`tool_config_files`) or if the changed files cannot be determined with Git.
+    #:
+    #: This is only exact for tools that check every file on its own, like Black, isort or Flake8. Tools that analyze
+    #: across files, like Mypy and Pylint, also read the unchanged files that a changed file imports, but they do not
+    #: report errors in unchanged files that import a changed file. For example, if the signature of a function
+    #: changes, calls in unchanged files that no longer match it go unnoticed. Run these tools on all files before
+    #: merging, e.g. in the CI of the base branch.
+    changed_files_only: Property[bool] = Property.config(default=False)
+    changed_files_base_ref: Property[str] = Property.config(default="origin/main")
+
     def __init__(self, name: str, project: Project) -> None:
         super().__init__(name, project)
         self.settings = python_settings(project)
+        self._changed_files: list[Path] | None = None
 
     def get_relationships(self) -> Iterable[TaskRelationship]:
         from .install_task import InstallTask
@@ -56,20 +75,77 @@ class EnvironmentAwareDispatchTask(Task):
         elif active_venv:
             logger.info("An active virtual environment was found, not activating managed environment")
 
-    def execute(self) -> TaskStatus:
-        command = self.get_execute_command()
-        if isinstance(command, TaskStatus):
-            return command
+    def get_source_paths(self) -> list[Path]:
+        """Returns the files and directories that the tool is run on. Defaults to the source and tests directory."""
+
+        tests_dir = self.settings.get_tests_directory()
+        return [self.settings.source_directory] + ([tests_dir] if tests_dir else [])
+
+    def get_source_args(self) -> list[str]:
+        """Returns the arguments for :meth:`get_source_paths` to pass to the tool. In :attr:`changed_files_only`
+        mode, these are the changed Python files inside these paths instead."""
+
+        paths = self.get_source_paths()
+        if self._changed_files is None:
+            return [str(p) for p in paths]
+        resolved = [(self.project.directory / p).resolve() for p in paths]
+        return [
+            str(f)
+            for f in self._changed_files
+            if any(f == p or p in f.parents for p in resolved) and f.suffix in (".py", ".pyi") and f.is_file()
+        ]
+
+    def get_changed_files(self) -> list[Path] | None:
+        """Returns the files that changed relative to :attr:`changed_files_base_ref`, or `None` if the tool should
+        run on all files because a configuration file changed or the changed files could not be determined."""
+
+        try:
+            changed_files = git_changed_files(self.project.directory, self.changed_files_base_ref.get())
+        except ValueError as exc:
+            logger.warning("Could not determine changed files (%s), checking all files", exc)
+            return None
+        config_files = [f for f in changed_files if f.name in self.tool_config_files]
+        config_file = getattr(self, "config_file", None)
+        if isinstance(config_file, Property) and config_file.is_filled():
+            config_files += [f for f in changed_files if f == (self.project.directory / config_file.get()).resolve()]
+        if config_files:
+            logger.info("Configuration files changed (%s), checking all files", ", ".join(map(str, config_files)))
+            return None
+        return [f.resolve() for f in changed_files]
+
+    def get_execute_environment(self) -> dict[str, str]:
+        """Returns the environment variables to run the command with, with the managed environment of the project's
+        build system activated."""
+
         env = os.environ.copy()
         if self.settings.build_system and self.settings.build_system.supports_managed_environments():
             self.activate_managed_environment(self.settings.build_system.get_managed_environment(), env)
-        if self.python_dependencies and shutil.which(command[0], path=env.get("PATH")) is None:
+        return env
+
+    def check_python_dependencies(self, program: str, env: Mapping[str, str]) -> TaskStatus | None:
+        """Returns a failed status if the *program* of the command cannot be found in the *env*."""
+
+        if self.python_dependencies and shutil.which(program, path=env.get("PATH")) is None:
             logger.warning("Some Python dependencies of %s are not installed.", self.name)
             logger.warning("To run this task successfully you should add to the `pyproject.toml` file:")
             logger.warning("[tool.poetry.dev-dependencies]")
             for dep in self.python_dependencies:
                 logger.warning('%s = "*"', dep)
             return TaskStatus.failed("The %s dependencies are missing" % self.python_dependencies)
+        return None
+
+    def execute(self) -> TaskStatus:
+        if self.changed_files_only.get():
+            self._changed_files = self.get_changed_files()
+            if self._changed_files is not None and not self.get_source_args():
+                return TaskStatus.skipped(f"no Python files changed relative to {self.changed_files_base_ref.get()}")
+        command = self.get_execute_command()
+        if isinstance(command, TaskStatus):
+            return command
+        env = self.get_execute_environment()
+        status = self.check_python_dependencies(command[0], env)
+        if status is not None:
+            return status
         logger.info("%s", command)
         result = sp.call(command, cwd=self.project.directory, env=env)
         return self.handle_exit_code(result)
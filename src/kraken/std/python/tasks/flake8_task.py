@@ -11,6 +11,7 @@ from .base_task import EnvironmentAwareDispatchTask
 class Flake8Task(EnvironmentAwareDispatchTask):
     description = "Lint Python source files with Flake8."
     python_dependencies = ["flake8"]
+    tool_config_files = [*EnvironmentAwareDispatchTask.tool_config_files, ".flake8"]
 
     config_file: Property[Path]
     additional_args: Property[List[str]] = Property.config(default_factory=list)
@@ -18,7 +19,7 @@ class Flake8Task(EnvironmentAwareDispatchTask):
     # EnvironmentAwareDispatchTask
 
     def get_execute_command(self) -> list[str]:
-        command = ["flake8", str(self.settings.source_directory)] + self.settings.get_tests_directory_as_args()
+        command = ["flake8", *self.get_source_args()]
         if self.config_file.is_filled():
             command += ["--config", str(self.config_file.get().absolute())]
         command += self.additional_args.get()
@@ -11,6 +11,7 @@ from .base_task import EnvironmentAwareDispatchTask
 
 class IsortTask(EnvironmentAwareDispatchTask):
     python_dependencies = ["isort"]
+    tool_config_files = [*EnvironmentAwareDispatchTask.tool_config_files, ".isort.cfg", ".editorconfig"]
 
     check_only: Property[bool] = Property.config(default=False)
     config_file: Property[Path]
@@ -18,9 +19,11 @@ class IsortTask(EnvironmentAwareDispatchTask):
 
     # EnvironmentAwareDispatchTask
 
+    def get_source_paths(self) -> list[Path]:
+        return super().get_source_paths() + self.additional_files.get()
+
     def get_execute_command(self) -> list[str]:
-        command = ["isort", str(self.settings.source_directory)] + self.settings.get_tests_directory_as_args()
-        command += [str(p) for p in self.additional_files.get()]
+        command = ["isort", *self.get_source_args()]
         if self.check_only.get():
             command += ["--check-only", "--diff"]
         if self.config_file.is_filled():
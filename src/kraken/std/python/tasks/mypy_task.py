@@ -1,16 +1,23 @@
 from __future__ import annotations
 
+import shutil
+import sys
 from pathlib import Path
 from typing import Any, List
 
-from kraken.core.api import Project, Property
+from kraken.core.api import Project, Property, TaskStatus
 
+from ..mypy_daemon import MypyDaemonKey, MypyDaemonPool
 from .base_task import EnvironmentAwareDispatchTask
 
 
 class MypyTask(EnvironmentAwareDispatchTask):
+    """Type checks the Python sources of the project with Mypy. With :attr:`changed_files_only`, errors in unchanged
+    files that import a changed file are not reported (see :attr:`EnvironmentAwareDispatchTask.changed_files_only`)."""
+
     description = "Static type checking for Python code using Mypy."
     python_dependencies = ["mypy"]
+    tool_config_files = [*EnvironmentAwareDispatchTask.tool_config_files, "mypy.ini", ".mypy.ini"]
 
     config_file: Property[Path]
     additional_args: Property[List[str]] = Property.config(default_factory=list)
@@ -18,22 +25,68 @@ class MypyTask(EnvironmentAwareDispatchTask):
     use_daemon: Property[bool] = Property.config(default=True)
     python_version: Property[str]
 
-    # EnvironmentAwareDispatchTask
+    #: Use a daemon from a pool that is shared by all projects in the build instead of one daemon per project
+    #: directory (see :class:`MypyDaemonPool`). Only has an effect if :attr:`use_daemon` is enabled. Projects share
+    #: a daemon if they use the same Python interpreter, :attr:`config_file`, :attr:`python_version` and
+    #: :attr:`additional_args`.
+    use_daemon_pool: Property[bool] = Property.config(default=False)
+    daemon_pool_size: Property[int] = Property.config(default=4)
+    daemon_idle_ttl: Property[float] = Property.config(default=3600.0)
 
-    def get_execute_command(self) -> list[str]:
-        # TODO (@NiklasRosenstein): Should we somewhere add a task that ensures `.dmypy.json` is in `.gitignore`?
-        #       Having it in the project directory makes it easier to just stop the daemon if it malfunctions (which
-        #       happens regularly but is hard to detect automatically).
-        status_file = (self.project.directory / ".dmypy.json").absolute()
-        command = ["dmypy", "--status-file", str(status_file), "run", "--"] if self.use_daemon.get() else ["mypy"]
+    def __init__(self, name: str, project: Project) -> None:
+        super().__init__(name, project)
+        self._daemon_key: MypyDaemonKey | None = None
+
+    def get_daemon_pool(self) -> MypyDaemonPool:
+        return MypyDaemonPool(
+            self.project.context.build_directory / "dmypy",
+            max_daemons=self.daemon_pool_size.get(),
+            idle_ttl=self.daemon_idle_ttl.get(),
+        )
+
+    def get_daemon_config_file(self) -> Path | None:
+        """Returns the configuration file to pass to a pooled daemon. Because the daemon may have been started from
+        another project directory, we can't rely on Mypy finding the configuration file in the current directory."""
+
+        if self.config_file.is_filled():
+            return self.config_file.get().absolute()
+        for name in ("mypy.ini", ".mypy.ini", "pyproject.toml", "setup.cfg"):
+            path = self.project.directory / name
+            if path.is_file():
+                return path.absolute()
+        return None
+
+    def get_daemon_key(self) -> MypyDaemonKey:
+        interpreter = shutil.which("python", path=self.get_execute_environment().get("PATH")) or sys.executable
+        config_file = self.get_daemon_config_file()
+        return MypyDaemonKey(
+            interpreter=str(Path(interpreter).absolute()),
+            config_file=str(config_file) if config_file else None,
+            python_version=self.python_version.get_or(None),
+            flags=tuple(self.get_mypy_flags(config_file)),
+        )
+
+    def get_mypy_flags(self, config_file: Path | None = None) -> list[str]:
+        """Returns the options to run Mypy with, i.e. the command-line arguments without the source paths. The
+        *config_file* is passed to Mypy if no :attr:`config_file` is set."""
+
+        flags = []
         if self.config_file.is_filled():
-            command += ["--config-file", str(self.config_file.get().absolute())]
+            flags += ["--config-file", str(self.config_file.get().absolute())]
         else:
-            command += ["--show-error-codes", "--namespace-packages"]  # Sane defaults. 🙏
+            if config_file is not None:
+                flags += ["--config-file", str(config_file)]
+            flags += ["--show-error-codes", "--namespace-packages"]  # Sane defaults. 🙏
         if self.python_version.is_filled():
-            command += ["--python-version", self.python_version.get()]
+            flags += ["--python-version", self.python_version.get()]
+        flags += self.additional_args.get()
+        return flags
+
+    # EnvironmentAwareDispatchTask
+
+    def get_source_paths(self) -> list[Path]:
         source_dir = self.settings.source_directory
-        command += [str(source_dir)]
+        paths = [source_dir]
         if self.check_tests.get():
             # We only want to add the tests directory if it is not already in the source directory. Otherwise
             # Mypy will find the test files twice and error.
@@ -42,10 +95,46 @@ class MypyTask(EnvironmentAwareDispatchTask):
                 try:
                     tests_dir.relative_to(source_dir)
                 except ValueError:
-                    command += [str(tests_dir)]
-        command += self.additional_args.get()
+                    paths.append(tests_dir)
+        return paths
+
+    def get_execute_command(self) -> list[str]:
+        # TODO (@NiklasRosenstein): Should we somewhere add a task that ensures `.dmypy.json` is in `.gitignore`?
+        #       Having it in the project directory makes it easier to just stop the daemon if it malfunctions (which
+        #       happens regularly but is hard to detect automatically).
+        pooled = self.use_daemon.get() and self.use_daemon_pool.get()
+        if pooled:
+            self._daemon_key = self.get_daemon_key()
+            status_file = self.get_daemon_pool().acquire(self._daemon_key, self.get_execute_environment())
+            flags = list(self._daemon_key.flags)
+        else:
+            status_file = (self.project.directory / ".dmypy.json").absolute()
+            flags = self.get_mypy_flags()
+        command = ["dmypy", "--status-file", str(status_file), "run", "--"] if self.use_daemon.get() else ["mypy"]
+        command += flags
+        if pooled:
+            # The daemon may have been started from another project directory.
+            command += [str((self.project.directory / p).absolute()) for p in self.get_source_args()]
+        else:
+            command += self.get_source_args()
         return command
 
+    def handle_exit_code(self, code: int) -> TaskStatus:
+        # Mypy exits with 2 on crashes, in which case we don't want to reuse the daemon.
+        if code == 2 and self._daemon_key is not None:
+            self.get_daemon_pool().discard(self._daemon_key, self.get_execute_environment())
+            self._daemon_key = None
+        return super().handle_exit_code(code)
+
+    def execute(self) -> TaskStatus:
+        # Release the lease on the pooled daemon, if any, so that it can be stopped or evicted again.
+        try:
+            return super().execute()
+        finally:
+            if self._daemon_key is not None:
+                self.get_daemon_pool().release(self._daemon_key)
+                self._daemon_key = None
+
 
 def mypy(*, name: str = "python.mypy", project: Project | None = None, **kwargs: Any) -> MypyTask:
     project = project or Project.current()
@@ -21,10 +21,11 @@ class PyclnTask(EnvironmentAwareDispatchTask):
 
     # EnvironmentAwareDispatchTask
 
+    def get_source_paths(self) -> list[Path]:
+        return super().get_source_paths() + self.additional_files.get()
+
     def get_execute_command(self) -> list[str]:
-        command = ["pycln", str(self.settings.source_directory)]
-        command += self.settings.get_tests_directory_as_args()
-        command += [str(p) for p in self.additional_files.get()]
+        command = ["pycln", *self.get_source_args()]
         if self.check_only.get():
             command += ["--check", "--diff"]
         if self.config_file.is_filled():
@@ -9,8 +9,12 @@ from .base_task import EnvironmentAwareDispatchTask
 
 
 class PylintTask(EnvironmentAwareDispatchTask):
+    """Lints the Python sources of the project with Pylint. With :attr:`changed_files_only`, errors in unchanged files
+    that import a changed file are not reported (see :attr:`EnvironmentAwareDispatchTask.changed_files_only`)."""
+
     description = "Lint Python source files with Pylint"
     python_dependencies = ["pylint"]
+    tool_config_files = [*EnvironmentAwareDispatchTask.tool_config_files, ".pylintrc", "pylintrc"]
 
     config_file: Property[Path]
     additional_args: Property[List[str]] = Property.config(default_factory=list)
@@ -18,7 +22,7 @@ class PylintTask(EnvironmentAwareDispatchTask):
     # EnvironmentAwareDispatchTask
 
     def get_execute_command(self) -> list[str]:
-        command = ["pylint", str(self.settings.source_directory)] + self.settings.get_tests_directory_as_args()
+        command = ["pylint", *self.get_source_args()]
         if self.config_file.is_filled():
             command += ["--rcfile", str(self.config_file.get())]
         command += self.additional_args.get()
@@ -1,16 +1,33 @@
 from __future__ import annotations
 
+import heapq
+import json
+import logging
 import os
 import shlex
+import subprocess as sp
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, List
+from typing import Any, List, Mapping, Optional, Sequence
 
 from kraken.common import flatten
 from kraken.core.api import Project, Property, TaskStatus
 
+from kraken.std.descriptors.resource import Resource
+from kraken.std.git.diff import git_changed_files
+
+from ..impact import ImpactMap, get_changed_conftest_files, hash_conftest_files, hash_dependency_files
 from .base_task import EnvironmentAwareDispatchTask
 
-# TODO (@NiklasRosenstein): Pytest coverage support
+logger = logging.getLogger(__name__)
+
+#: The directory that contains the `kraken_pytest` plugin, which is added to the `PYTHONPATH` if it is used.
+PLUGIN_DIRECTORY = Path(__file__).parent.parent / "data"
+
+#: The coverage report formats supported by :attr:`PytestTask.coverage_reports`.
+COVERAGE_REPORT_FORMATS = ("xml", "json", "lcov")
 
 
 class PytestTask(EnvironmentAwareDispatchTask):
@@ -22,6 +39,79 @@ class PytestTask(EnvironmentAwareDispatchTask):
     allow_no_tests: Property[bool] = Property.config(default=False)
     doctest_modules: Property[bool] = Property.config(default=True)
     marker: Property[str]
+    additional_args: Property[List[str]] = Property.config(default_factory=list)
+
+    #: The number of Pytest processes to split the tests into, or `0` to use the number of CPUs. The tests are
+    #: collected once and then distributed across the processes such that they take about the same time, based on
+    #: the durations of the tests in previous runs. This does not require `pytest-xdist` to be installed.
+    shards: Property[int] = Property.config(default=1)
+
+    #: The file to write the JUnit XML report to. If the tests are sharded, the reports of all shards are merged
+    #: into this file, which defaults to a file in the build directory.
+    junit_xml: Property[Optional[Path]] = Property.config(default=None)
+
+    #: Only run the tests that are affected by the files that changed relative to :attr:`impact_base_ref`. This
+    #: requires `coverage` to be installed in the environment of the project. The files that every test depends on
+    #: are recorded when all tests run, which happens if no such record exists yet, after
+    #: :attr:`impact_full_run_interval` runs, and if a `conftest.py` file or the project's dependencies changed since
+    #: the last time all tests ran. Tests that were added after the record was made always run. Changes to files
+    #: other than Python modules are not attributed to the tests.
+    impact_analysis: Property[bool] = Property.config(default=False)
+    impact_base_ref: Property[str] = Property.config(default="origin/main")
+    impact_full_run_interval: Property[int] = Property.config(default=10)
+
+    #: Measure the code coverage of the tests with Coverage.py, which needs to be installed in the environment of
+    #: the project. The configuration of the project (e.g. `[tool.coverage]` in `pyproject.toml`) applies. Every
+    #: shard writes its own data file, which are combined after the tests ran. If :attr:`impact_analysis` only runs
+    #: the affected tests, the coverage is not measured and the reports of the last full run are kept, so that they
+    #: (and the `fail_under` setting of the project) always cover all tests.
+    coverage: Property[bool] = Property.config(default=False)
+
+    #: The packages or directories to measure. Defaults to the source directory.
+    coverage_source: Property[List[str]] = Property.config(default_factory=list)
+
+    #: The formats of the coverage reports to write to the build directory (see :data:`COVERAGE_REPORT_FORMATS`).
+    coverage_reports: Property[List[str]] = Property.config(default_factory=lambda: ["xml"])
+
+    #: Use the low-overhead tracer of Coverage.py that is based on :mod:`sys.monitoring` (`COVERAGE_CORE=sysmon`).
+    #: Coverage.py falls back to its default tracer on Python versions older than 3.12.
+    coverage_sysmon: Property[bool] = Property.config(default=False)
+
+    #: The coverage reports, to be consumed by other tasks such as :func:`kraken.std.dist.dist`.
+    out_coverage_reports: Property[List[Resource]] = Property.output()
+
+    def __init__(self, name: str, project: Project) -> None:
+        super().__init__(name, project)
+        self._plugin_env: dict[str, str] = {}
+        self._impact_selective = False
+        self._coverage_omit: list[str] = []
+        self.out_coverage_reports.set(self.coverage_reports.map(self._get_coverage_resources))
+
+    def get_output_directory(self) -> Path:
+        return self.project.build_directory / "pytest" / self.name
+
+    def get_durations_file(self) -> Path:
+        return self.project.build_directory / "pytest" / f"{self.name}.durations.json"
+
+    def get_impact_file(self) -> Path:
+        return self.project.build_directory / "pytest" / f"{self.name}.impact.json"
+
+    def get_coverage_report_file(self, format: str) -> Path:
+        return self.project.build_directory / "pytest" / f"{self.name}.coverage.{format}"
+
+    def _get_coverage_resources(self, formats: List[str]) -> List[Resource]:
+        if not self.coverage.get():
+            return []
+        for format in formats:
+            if format not in COVERAGE_REPORT_FORMATS:
+                raise ValueError(f"unsupported coverage report format: {format!r}")
+        return [Resource(f"coverage-{format}", self.get_coverage_report_file(format)) for format in formats]
+
+    def get_num_shards(self) -> int:
+        return self.shards.get() or os.cpu_count() or 1
+
+    def uses_plugin(self) -> bool:
+        return self.get_num_shards() > 1 or self.impact_analysis.get() or self.coverage.get()
 
     # EnvironmentAwareDispatchTask
 
@@ -46,15 +136,329 @@ class PytestTask(EnvironmentAwareDispatchTask):
             command += ["-m", self.marker.get()]
         if self.doctest_modules.get():
             command += ["--doctest-modules"]
+        if self.uses_plugin():
+            command += ["-p", "kraken_pytest"]
+        junit_xml = self.junit_xml.get()
+        if junit_xml is not None and self.get_num_shards() == 1:
+            command += ["--junitxml", str(self.project.directory / junit_xml)]
+        command += self.additional_args.get()
         command += shlex.split(os.getenv("PYTEST_FLAGS", ""))
         return command
 
+    def get_execute_environment(self) -> dict[str, str]:
+        env = super().get_execute_environment()
+        if self.uses_plugin():
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PLUGIN_DIRECTORY), env.get("PYTHONPATH")]))
+            env.update(self._plugin_env)
+        return env
+
     def handle_exit_code(self, code: int) -> TaskStatus:
-        if code == 5 and self.allow_no_tests.get():
+        if code == 5 and (self.allow_no_tests.get() or self._impact_selective):
             # Pytest returns exit code 5 if no tests were run.
             return TaskStatus.succeeded()
         return TaskStatus.from_exit_code(None, code)
 
+    def execute(self) -> TaskStatus:
+        self._plugin_env = {}
+        self._impact_selective = False
+        impact_map = self._prepare_impact_analysis() if self.impact_analysis.get() else None
+        # The coverage of a run that skips the unaffected tests is incomplete, so only full runs are measured.
+        report_coverage = self.coverage.get() and not self._impact_selective
+        if report_coverage:
+            self._prepare_coverage()
+        elif self.coverage.get():
+            logger.info(
+                "Not measuring the coverage because not all tests run, keeping the reports of the last full run"
+            )
+        status = self._execute_shards() if self.get_num_shards() > 1 else super().execute()
+        if self.impact_analysis.get():
+            self._update_impact_map(impact_map)
+        if report_coverage:
+            coverage_status = self._report_coverage()
+            if coverage_status is not None and not status.is_failed():
+                return coverage_status
+        return status
+
+    def _prepare_coverage(self) -> None:
+        output_dir = self.get_output_directory()
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for path in output_dir.glob(".coverage*"):
+            path.unlink()
+        for resource in self.out_coverage_reports.get():
+            if resource.path.exists():
+                resource.path.unlink()
+
+        source = self.coverage_source.get() or [str(self.project.directory / self.settings.source_directory)]
+        self._coverage_omit = []
+        tests_dir = self.tests_dir.get_or(None) or self.settings.get_tests_directory()
+        if self.impact_analysis.get() and tests_dir:
+            # The impact map is recorded with the same measurement, which must include the test helpers. They are
+            # omitted from the reports again.
+            tests_dir = (self.project.directory / tests_dir).absolute()
+            if not any(_is_relative_to(tests_dir, Path(path).absolute()) for path in source):
+                source = [*source, str(tests_dir)]
+                self._coverage_omit = [str(tests_dir / "*")]
+        self._plugin_env["KRAKEN_PYTEST_COVERAGE_FILE"] = str(output_dir / ".coverage")
+        self._plugin_env["KRAKEN_PYTEST_COVERAGE_SOURCE"] = os.pathsep.join(source)
+        if self.coverage_sysmon.get():
+            self._plugin_env["COVERAGE_CORE"] = "sysmon"
+
+    def _report_coverage(self) -> TaskStatus | None:
+        """Combine the coverage data of the shards and write the coverage reports. Returns a failed status if that
+        fails, e.g. because the coverage is below the `fail_under` setting of the project."""
+
+        output_dir = self.get_output_directory()
+        data_file = output_dir / ".coverage"
+        env = {**self.get_execute_environment(), "COVERAGE_FILE": str(data_file)}
+        shard_files = sorted(output_dir.glob(".coverage.shard-*"))
+        if len(shard_files) == 1:
+            os.replace(shard_files[0], data_file)
+        elif shard_files:
+            command = ["python", "-m", "coverage", "combine", "-q", *map(str, shard_files)]
+            logger.info("%s", command)
+            if sp.call(command, cwd=self.project.directory, env=env) != 0:
+                return TaskStatus.failed("could not combine the coverage data")
+        if not data_file.exists():
+            logger.warning("No coverage data was recorded, is `coverage` installed?")
+            return None
+
+        # The reports only read the data file, so we can write them in parallel.
+        omit = [f"--omit={','.join(self._coverage_omit)}"] if self._coverage_omit else []
+        commands = [
+            ["python", "-m", "coverage", format, "-q", "-o", str(self.get_coverage_report_file(format)), *omit]
+            for format in self.coverage_reports.get()
+        ]
+        logger.info("%s", commands)
+        with ThreadPoolExecutor(max(len(commands), 1)) as executor:
+            exit_codes = list(executor.map(lambda c: sp.call(c, cwd=self.project.directory, env=env), commands))
+        if any(exit_codes):
+            return TaskStatus.failed("could not write the coverage reports")
+        return None
+
+    def _get_full_run_reason(self, impact_map: ImpactMap | None) -> tuple[str | None, list[Path]]:
+        """Returns the reason why all tests need to run, or the files that changed if only the affected tests need
+        to run."""
+
+        if impact_map is None:
+            return "the files that the tests depend on were not recorded yet", []
+        # Compare against the state of the last full run rather than the base ref, so that a change on the branch
+        # only causes one full run.
+        if impact_map.dependencies_hash != hash_dependency_files(self.project.directory):
+            return "the dependencies changed", []
+        changed_conftest_files = get_changed_conftest_files(impact_map.conftest_hashes, self._hash_conftest_files())
+        if changed_conftest_files:
+            return f"{', '.join(changed_conftest_files)} changed", []
+        if any(not resource.path.exists() for resource in self.out_coverage_reports.get()):
+            return "the coverage reports of the last full run are missing", []
+        interval = self.impact_full_run_interval.get()
+        if interval and impact_map.runs_since_full_run >= interval:
+            return f"all tests run every {interval} runs", []
+        try:
+            changed_files = git_changed_files(self.project.directory, self.impact_base_ref.get())
+        except ValueError as exc:
+            return f"the changed files could not be determined ({exc})", []
+        return None, changed_files
+
+    def _hash_conftest_files(self) -> dict[str, str]:
+        tests_dir = self.tests_dir.get_or(None) or self.settings.get_tests_directory()
+        directories = [self.settings.source_directory, *([tests_dir] if tests_dir else [])]
+        return hash_conftest_files(self.project.directory, directories)
+
+    def _prepare_impact_analysis(self) -> ImpactMap | None:
+        """Instructs the plugin to either deselect the tests that are not affected by the changed files, or to record
+        the files that the tests depend on. Returns the impact map in the former case."""
+
+        output_dir = self.get_output_directory()
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for path in output_dir.glob("*impact.json"):
+            path.unlink()
+
+        impact_map = ImpactMap.read(self.get_impact_file())
+        reason, changed_files = self._get_full_run_reason(impact_map)
+        if impact_map is None or reason is not None:
+            logger.info("Running all tests and recording the files that they depend on, because %s", reason)
+            self._plugin_env["KRAKEN_PYTEST_IMPACT_FILE"] = str(output_dir / "impact.json")
+            return None
+
+        unaffected = impact_map.get_unaffected_tests(self.project.directory, changed_files)
+        logger.info(
+            "Skipping %d of %d known test(s) that are not affected by %d changed file(s)",
+            len(unaffected),
+            len(impact_map.tests),
+            len(changed_files),
+        )
+        deselect_file = output_dir / "deselect.json"
+        deselect_file.write_text(json.dumps(sorted(unaffected)))
+        self._plugin_env["KRAKEN_PYTEST_DESELECT_FILE"] = str(deselect_file)
+        self._impact_selective = True
+        return impact_map
+
+    def _update_impact_map(self, impact_map: ImpactMap | None) -> None:
+        if impact_map is not None:
+            impact_map.runs_since_full_run += 1
+            impact_map.write(self.get_impact_file())
+            return
+
+        tests: dict[str, list[str]] = {}
+        for path in sorted(self.get_output_directory().glob("*impact.json")):
+            tests.update(json.loads(path.read_text()))
+        if not tests:
+            logger.warning("The files that the tests depend on were not recorded, is `coverage` installed?")
+            return
+        impact_map = ImpactMap(hash_dependency_files(self.project.directory), self._hash_conftest_files(), 0, tests)
+        impact_map.write(self.get_impact_file())
+
+    def _execute_shards(self) -> TaskStatus:
+        command = self.get_execute_command()
+        if isinstance(command, TaskStatus):
+            return command
+        env = self.get_execute_environment()
+        status = self.check_python_dependencies(command[0], env)
+        if status is not None:
+            return status
+
+        shards_dir = self.get_output_directory()
+        shards_dir.mkdir(parents=True, exist_ok=True)
+        for path in shards_dir.glob("shard-*"):
+            path.unlink()
+
+        # Collect the tests once, in the same way that the shards will collect them. Every shard records the files
+        # that its tests depend on and its coverage data separately.
+        record_impact = env.pop("KRAKEN_PYTEST_IMPACT_FILE", None) is not None
+        record_coverage = env.pop("KRAKEN_PYTEST_COVERAGE_FILE", None) is not None
+        collect_file = shards_dir / "collected.json"
+        logger.info("%s", command + ["--collect-only", "-q"])
+        result = sp.run(
+            command + ["--collect-only", "-q"],
+            cwd=self.project.directory,
+            env={**env, "KRAKEN_PYTEST_COLLECT_FILE": str(collect_file)},
+            stdout=sp.PIPE,
+            stderr=sp.STDOUT,
+        )
+        if result.returncode != 0:
+            print(result.stdout.decode(errors="replace"), end="")
+            return self.handle_exit_code(result.returncode)
+        tests: list[str] = json.loads(collect_file.read_text())
+        if not tests:
+            return self.handle_exit_code(5)
+
+        durations_file = self.get_durations_file()
+        durations = read_test_durations(durations_file)
+        shards = [shard for shard in split_tests(tests, durations, self.get_num_shards()) if shard]
+        logger.info("Running %d test(s) in %d shard(s)", len(tests), len(shards))
+
+        lock = threading.Lock()
+
+        def run_shard(index: int) -> int:
+            select_file = shards_dir / f"shard-{index}.select.json"
+            select_file.write_text(json.dumps(shards[index]))
+            shard_env = {
+                **env,
+                "KRAKEN_PYTEST_SELECT_FILE": str(select_file),
+                "KRAKEN_PYTEST_DURATIONS_FILE": str(shards_dir / f"shard-{index}.durations.json"),
+                "KRAKEN_PYTEST_SHARD": str(index),
+            }
+            if record_impact:
+                shard_env["KRAKEN_PYTEST_IMPACT_FILE"] = str(shards_dir / f"shard-{index}.impact.json")
+            if record_coverage:
+                shard_env["KRAKEN_PYTEST_COVERAGE_FILE"] = str(shards_dir / f".coverage.shard-{index}")
+            shard_command = command + ["--junitxml", str(shards_dir / f"shard-{index}.xml")]
+            result = sp.run(shard_command, cwd=self.project.directory, env=shard_env, stdout=sp.PIPE, stderr=sp.STDOUT)
+            with lock:
+                print(f"--- shard {index + 1}/{len(shards)} ({len(shards[index])} test(s)) ---")
+                print(result.stdout.decode(errors="replace"), end="", flush=True)
+            return result.returncode
+
+        with ThreadPoolExecutor(len(shards)) as executor:
+            exit_codes = list(executor.map(run_shard, range(len(shards))))
+
+        for index in range(len(shards)):
+            shard_durations = read_test_durations(shards_dir / f"shard-{index}.durations.json")
+            durations.update(shard_durations)
+        write_test_durations(durations_file, durations)
+
+        junit_files = [shards_dir / f"shard-{index}.xml" for index in range(len(shards))]
+        junit_xml = self.junit_xml.get() or self.project.build_directory / "pytest" / f"{self.name}.junit.xml"
+        merge_junit_xml([f for f in junit_files if f.is_file()], self.project.directory / junit_xml)
+
+        return self.handle_exit_code(merge_exit_codes(exit_codes))
+
+
+def _is_relative_to(path: Path, other: Path) -> bool:
+    # Polyfill for Path.is_relative_to() on Python < 3.9.
+    try:
+        path.relative_to(other)
+        return True
+    except ValueError:
+        return False
+
+
+def merge_exit_codes(exit_codes: Sequence[int]) -> int:
+    """Returns the exit code of a sharded Pytest run: The first exit code of a shard that failed (i.e. neither `0`
+    nor `5`), otherwise `5` ("no tests were collected") only if it is the exit code of all shards."""
+
+    for code in exit_codes:
+        if code not in (0, 5):
+            return code
+    return 5 if exit_codes and all(code == 5 for code in exit_codes) else 0
+
+
+def read_test_durations(path: Path) -> dict[str, float]:
+    """Read a JSON file that maps test IDs to their duration in seconds. Returns an empty dictionary if the file
+    does not exist or is invalid."""
+
+    try:
+        durations: dict[str, float] = json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return durations
+
+
+def write_test_durations(path: Path, durations: Mapping[str, float]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(dict(sorted(durations.items())), indent=2))
+
+
+def split_tests(tests: Sequence[str], durations: Mapping[str, float], num_shards: int) -> list[list[str]]:
+    """Split the *tests* into *num_shards* shards with about the same total duration, using the longest-processing-
+    time-first heuristic. Tests without a known duration are assumed to take the average duration of the known tests.
+    The tests in every shard keep the order of *tests*."""
+
+    known = [durations[t] for t in tests if t in durations]
+    default = sum(known) / len(known) if known else 1.0
+    order = {test: index for index, test in enumerate(tests)}
+
+    heap = [(0.0, index) for index in range(num_shards)]
+    shards: list[list[str]] = [[] for _ in range(num_shards)]
+    for test in sorted(tests, key=lambda t: (-durations.get(t, default), order[t])):
+        total, index = heapq.heappop(heap)
+        shards[index].append(test)
+        heapq.heappush(heap, (total + durations.get(test, default), index))
+    return [sorted(shard, key=order.__getitem__) for shard in shards]
+
+
+def merge_junit_xml(files: Sequence[Path], output: Path) -> None:
+    """Merge the test cases of the JUnit XML *files* written by Pytest into a single test suite in *output*."""
+
+    merged = ET.Element("testsuite", name="pytest")
+    counters = {"errors": 0, "failures": 0, "skipped": 0, "tests": 0}
+    time = 0.0
+    for file in files:
+        root = ET.parse(file).getroot()
+        for suite in [root] if root.tag == "testsuite" else root.iter("testsuite"):
+            for key in counters:
+                counters[key] += int(suite.get(key, "0"))
+            time += float(suite.get("time", "0"))
+            merged.extend(suite)
+    for key, value in counters.items():
+        merged.set(key, str(value))
+    merged.set("time", f"{time:.3f}")
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    root = ET.Element("testsuites")
+    root.append(merged)
+    ET.ElementTree(root).write(output, encoding="utf-8", xml_declaration=True)
+
 
 def pytest(*, name: str = "pytest", group: str = "test", project: Project | None = None, **kwargs: Any) -> PytestTask:
     project = project or Project.current()
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
 import dataclasses
+import hashlib
+import json
+import logging
+import math
+import os
+import subprocess as sp
+from concurrent.futures import ThreadPoolExecutor
 from difflib import unified_diff
 from pathlib import Path
 from sys import stdout
 from tempfile import TemporaryDirectory
-from typing import Any, Collection, Iterable, List
+from typing import Any, Collection, Iterable, List, Optional
 
 from kraken.core import TaskStatus
 from kraken.core.api import Project, Property
@@ -13,19 +20,48 @@ from kraken.core.api import Project, Property
 from .. import python_settings
 from .base_task import EnvironmentAwareDispatchTask
 
+logger = logging.getLogger(__name__)
+
 
 class PyUpgradeTask(EnvironmentAwareDispatchTask):
     description = "Upgrades to newer Python syntax sugars with pyupgrade."
     python_dependencies = ["pyupgrade"]
 
     keep_runtime_typing: Property[bool] = Property.config(default=False)
+    #: Files and directories to run pyupgrade on. Directories are searched for `*.py` files when the task executes.
     additional_files: Property[List[Path]] = Property.config(default_factory=list)
+    exclude: Property[List[Path]] = Property.config(default_factory=list)
+    exclude_patterns: Property[List[str]] = Property.config(default_factory=list)
     python_version: Property[str]
 
+    def get_files(self) -> List[Path]:
+        """Resolve the files to run pyupgrade on from :attr:`additional_files`, minus the excluded files. In
+        :attr:`changed_files_only` mode, only the files that changed are returned."""
+
+        files: set[Path] = set()
+        for path in self.additional_files.get():
+            path = self.project.directory / path
+            if path.is_dir():
+                files.update(f.resolve() for f in path.glob("**/*.py"))
+            elif path.is_file():
+                files.add(path.resolve())
+        exclude = [(self.project.directory / e).resolve() for e in self.exclude.get()]
+        exclude_patterns = self.exclude_patterns.get()
+        if self._changed_files is not None:
+            files.intersection_update(self._changed_files)
+        return sorted(
+            f
+            for f in files
+            if not any(_is_relative_to(f, e) for e in exclude) and not any(f.match(p) for p in exclude_patterns)
+        )
+
     # EnvironmentAwareDispatchTask
 
+    def get_source_args(self) -> list[str]:
+        return [str(f) for f in self.get_files()]
+
     def get_execute_command(self) -> List[str]:
-        return self.run_pyupgrade(self.additional_files.get(), ("--exit-zero-even-if-changed",))
+        return self.run_pyupgrade(self.get_files(), ("--exit-zero-even-if-changed",))
 
     def run_pyupgrade(self, files: Iterable[Path], extra: Iterable[str]) -> List[str]:
         command = ["pyupgrade", f"--py{self.python_version.get_or('3').replace('.', '')}-plus", *extra]
@@ -36,47 +72,111 @@ class PyUpgradeTask(EnvironmentAwareDispatchTask):
 
 
 class PyUpgradeCheckTask(PyUpgradeTask):
+    """Checks the files with pyupgrade without modifying them. The files are copied to a temporary directory and
+    sharded across multiple pyupgrade processes. Files that pyupgrade did not change are remembered by the hash of
+    their contents in the build directory and are skipped on the next run with the same settings."""
+
     description = "Check Python source files syntax sugars with pyupgrade."
     python_dependencies = ["pyupgrade"]
 
-    keep_runtime_typing: Property[bool] = Property.config(default=False)
-    additional_files: Property[List[Path]] = Property.config(default_factory=list)
-    python_version: Property[str]
+    #: The number of pyupgrade processes to run in parallel. Defaults to the number of CPUs.
+    workers: Property[Optional[int]] = Property.config(default=None)
 
-    def execute(self) -> TaskStatus:
-        # We copy the file because there is no way to make pyupgrade not edit the files
-        old_dir = self.settings.project.directory.resolve()
-        new_file_for_old_file = {}
-        with TemporaryDirectory() as new_dir:
-            for file in self.additional_files.get():
-                new_file = new_dir / file.resolve().relative_to(old_dir)
-                new_file.parent.mkdir(parents=True, exist_ok=True)
-                new_file.write_bytes(file.read_bytes())
-                new_file_for_old_file[file] = new_file
-            self._files = new_file_for_old_file.values()
-
-            result = super().execute()
-            if not result.is_failed():
-                return result  # nothing more to do
-
-            # We print a diff
-            for old_file, new_file in new_file_for_old_file.items():
-                old_content = old_file.read_text()
-                new_content = new_file.read_text()
-                if old_content != new_content:
-                    stdout.writelines(
-                        unified_diff(
-                            old_content.splitlines(keepends=True),
-                            new_content.splitlines(keepends=True),
-                            fromfile=str(old_file),
-                            tofile=str(old_file),
-                            n=5,
-                        )
-                    )
-            return result
+    #: The minimum number of files per pyupgrade process, to not spawn a process for every few files.
+    MIN_FILES_PER_SHARD = 20
 
-    def get_execute_command(self) -> List[str]:
-        return self.run_pyupgrade(self._files, ())
+    def get_cache_file(self) -> Path:
+        return self.project.build_directory / "pyupgrade" / f"{self.name}.json"
+
+    def _get_cache_settings(self) -> dict[str, Any]:
+        return {
+            "python_version": self.python_version.get_or("3"),
+            "keep_runtime_typing": self.keep_runtime_typing.get(),
+        }
+
+    def _read_cache(self) -> set[str]:
+        """Returns the hashes of the files that were clean in the previous run with the same settings."""
+
+        try:
+            cache = json.loads(self.get_cache_file().read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return set()
+        if cache.get("settings") != self._get_cache_settings():
+            return set()
+        return set(cache.get("clean", []))
+
+    def _write_cache(self, clean: set[str]) -> None:
+        cache_file = self.get_cache_file()
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(json.dumps({"settings": self._get_cache_settings(), "clean": sorted(clean)}))
+
+    def execute(self) -> TaskStatus:
+        if self.changed_files_only.get():
+            self._changed_files = self.get_changed_files()
+        files = self.get_files()
+        if self._changed_files is not None and not files:
+            return TaskStatus.skipped(f"no Python files changed relative to {self.changed_files_base_ref.get()}")
+
+        env = self.get_execute_environment()
+        status = self.check_python_dependencies("pyupgrade", env)
+        if status is not None:
+            return status
+
+        cached = self._read_cache()
+        contents = {}
+        for file in files:
+            data = file.read_bytes()
+            contents[file] = (data, hashlib.sha256(data).hexdigest())
+        pending = [file for file, (_, digest) in contents.items() if digest not in cached]
+        clean = {digest for _, digest in contents.values()} - {contents[file][1] for file in pending}
+        logger.info("Checking %d file(s) with pyupgrade, %d file(s) are unchanged", len(pending), len(clean))
+
+        changed = []
+        failed = False
+        if pending:
+            # We copy the files because there is no way to make pyupgrade not edit the files.
+            with TemporaryDirectory() as tempdir:
+                copies = {file: Path(tempdir) / f"{index}.py" for index, file in enumerate(pending)}
+                for file, copy in copies.items():
+                    copy.write_bytes(contents[file][0])
+
+                workers = self.workers.get() or os.cpu_count() or 1
+                num_shards = min(workers, math.ceil(len(pending) / self.MIN_FILES_PER_SHARD))
+                shards = [pending[index::num_shards] for index in range(num_shards)]
+                with ThreadPoolExecutor(num_shards) as executor:
+                    commands = [self.run_pyupgrade((copies[f] for f in shard), ()) for shard in shards]
+                    exit_codes = list(executor.map(lambda c: sp.call(c, cwd=self.project.directory, env=env), commands))
+
+                # pyupgrade exits with 1 if it changed any files, which we detect by comparing the contents instead.
+                for shard, exit_code in zip(shards, exit_codes):
+                    if exit_code not in (0, 1):
+                        failed = True
+                        continue
+                    for file in shard:
+                        data, digest = contents[file]
+                        new_data = copies[file].read_bytes()
+                        if new_data == data:
+                            clean.add(digest)
+                        else:
+                            changed.append((file, new_data.decode()))
+
+        for file, new_content in sorted(changed):
+            stdout.writelines(
+                unified_diff(
+                    contents[file][0].decode().splitlines(keepends=True),
+                    new_content.splitlines(keepends=True),
+                    fromfile=str(file),
+                    tofile=str(file),
+                    n=5,
+                )
+            )
+
+        self._write_cache(clean)
+        if failed:
+            return TaskStatus.failed("pyupgrade failed")
+        if changed:
+            return TaskStatus.failed(f"pyupgrade would change {len(changed)} file(s)")
+        return TaskStatus.succeeded()
 
 
 @dataclasses.dataclass
@@ -96,23 +196,16 @@ def pyupgrade(
     project = project or Project.current()
     settings = python_settings(project)
 
-    directories = [
-        p
+    # The files are only resolved when the tasks execute.
+    additional_files = [
+        Path(p)
         for p in (*kwargs.pop("additional_files", ()), settings.source_directory, settings.get_tests_directory())
         if p is not None
     ]
-    files = {f.resolve() for p in directories for f in Path(p).glob("**/*.py")}
-    exclude = [e.resolve() for e in exclude]
-    filtered_files = [
-        f
-        for f in files
-        if not any(_is_relative_to(f, i) for i in exclude) and not any(f.match(p) for p in exclude_patterns)
-    ]
+    kwargs.update(additional_files=additional_files, exclude=list(exclude), exclude_patterns=list(exclude_patterns))
 
-    check_task = project.do(
-        f"{name}.check", PyUpgradeCheckTask, group="lint", **kwargs, additional_files=filtered_files
-    )
-    format_task = project.do(name, PyUpgradeTask, group="fmt", default=False, **kwargs, additional_files=filtered_files)
+    check_task = project.do(f"{name}.check", PyUpgradeCheckTask, group="lint", **kwargs)
+    format_task = project.do(name, PyUpgradeTask, group="fmt", default=False, **kwargs)
     return PyUpgradeTasks(check_task, format_task)
 
 
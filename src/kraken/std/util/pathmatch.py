@@ -0,0 +1,154 @@
+"""
+Match paths against a list of glob patterns with `.gitignore` semantics. All patterns are compiled into regular
+expressions up front, which is much faster than testing every pattern with :func:`fnmatch.fnmatch` for every path.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Pattern, Sequence
+
+# fnmatch() is case-insensitive where the file system is (i.e. on Windows), so we do the same.
+_FLAGS = re.DOTALL | (re.IGNORECASE if os.path.normcase("A") == "a" else 0)
+
+
+@dataclass(frozen=True)
+class CompiledPattern:
+    pattern: str
+
+    #: Whether the pattern was prefixed with `!`, causing paths that match it to not match the pattern list.
+    negate: bool
+
+    #: Matches files and directories, respectively. Patterns with a trailing slash only match directories, but
+    #: also the files inside them.
+    file_regex: Pattern[str]
+    dir_regex: Pattern[str]
+
+
+def is_gitignore_pattern(pattern: str) -> bool:
+    """Returns `True` if the *pattern* uses syntax that is specific to `.gitignore` files, i.e. a leading `!`, `/` or
+    `\\` (to escape a leading `!`), a trailing `/` or `**`. Other patterns are matched like :func:`fnmatch.fnmatch`
+    against both the full path and the name of a path for backwards compatibility (i.e. `*` also matches slashes)."""
+
+    return pattern.startswith(("!", "/", "\\")) or pattern.endswith("/") or "**" in pattern
+
+
+def compile_pattern(pattern: str) -> CompiledPattern:
+    """Compile a single glob *pattern* (see :class:`PathMatcher`)."""
+
+    negate = pattern.startswith("!")
+    body = pattern[1:] if negate else pattern
+    if not is_gitignore_pattern(pattern):
+        # Equivalent to `fnmatch(path, body) or fnmatch(name, body)`.
+        regex = f"(?:{_translate(body, '.*', '.')})$|(?:.*/)?(?:{_translate(body, '[^/]*', '[^/]')})$"
+        compiled = re.compile(regex, _FLAGS)
+        return CompiledPattern(pattern, negate, compiled, compiled)
+
+    dir_only = body.endswith("/")
+    body = body.rstrip("/")
+    # Patterns with a slash at the beginning or in the middle are relative to the root, others match at any level.
+    anchored = "/" in body
+    body = body.lstrip("/")
+
+    parts = body.split("/")
+    regex = "" if anchored else "(?:.*/)?"
+    for index, part in enumerate(parts):
+        last = index == len(parts) - 1
+        if part == "**":
+            # Leading and inner `**/` match zero or more directories, a trailing `/**` matches everything inside.
+            regex += ".*" if last else "(?:.*/)?"
+        else:
+            regex += _translate(part, "[^/]*", "[^/]", escapes=True) + ("" if last else "/")
+
+    # A pattern that matches a directory also matches everything inside it.
+    return CompiledPattern(
+        pattern,
+        negate,
+        re.compile(regex + ("/.*$" if dir_only else "(?:/.*)?$"), _FLAGS),
+        re.compile(regex + "(?:/.*)?$", _FLAGS),
+    )
+
+
+def _translate(pattern: str, star: str, question_mark: str, escapes: bool = False) -> str:
+    """Translate a glob *pattern* to a regular expression, like :func:`fnmatch.translate` but with the regular
+    expressions to use for `*` and `?` specified by the caller. With *escapes* enabled, a backslash escapes the
+    next character."""
+
+    result = []
+    index, length = 0, len(pattern)
+    while index < length:
+        char = pattern[index]
+        index += 1
+        if char == "*":
+            while index < length and pattern[index] == "*":
+                index += 1
+            result.append(star)
+        elif char == "?":
+            result.append(question_mark)
+        elif char == "\\" and escapes and index < length:
+            result.append(re.escape(pattern[index]))
+            index += 1
+        elif char == "[":
+            end = index
+            if end < length and pattern[end] in "!^":
+                end += 1
+            if end < length and pattern[end] == "]":
+                end += 1
+            while end < length and pattern[end] != "]":
+                end += 1
+            if end >= length:
+                result.append("\\[")
+            else:
+                chars = pattern[index:end].replace("\\", "\\\\")
+                index = end + 1
+                if chars.startswith("!"):
+                    chars = "^" + chars[1:]
+                elif chars.startswith("^"):
+                    chars = "\\" + chars
+                result.append(f"[{chars}]")
+        else:
+            result.append(re.escape(char))
+    return "".join(result)
+
+
+class PathMatcher:
+    """Matches POSIX paths against a list of glob patterns with `.gitignore` semantics:
+
+    * A pattern without a slash matches a file or directory name at any level; a pattern with a leading or inner
+      slash is anchored to the start of the path.
+    * `*` and `?` do not match slashes. A leading `**/` matches in all directories, a trailing `/**` matches
+      everything inside a directory and `/**/` matches zero or more directories.
+    * A trailing slash matches only directories. A pattern that matches a directory also matches its contents.
+    * A leading `!` negates the pattern. The last matching pattern decides whether a path matches.
+
+    Patterns that use none of the syntax specific to `.gitignore` (see :func:`is_gitignore_pattern`) keep the
+    semantics of :func:`fnmatch.fnmatch` applied to both the full path and the name of a path.
+
+    Without negated patterns, all patterns are combined into a single regular expression."""
+
+    def __init__(self, patterns: Sequence[str]) -> None:
+        self.patterns = [compile_pattern(p) for p in patterns]
+        self._combined: tuple[Pattern[str], Pattern[str]] | None = None
+        if not any(p.negate for p in self.patterns):
+            self._combined = (
+                re.compile("|".join(f"(?:{p.file_regex.pattern})" for p in self.patterns) or "(?!)", _FLAGS),
+                re.compile("|".join(f"(?:{p.dir_regex.pattern})" for p in self.patterns) or "(?!)", _FLAGS),
+            )
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def __repr__(self) -> str:
+        return f"PathMatcher({[p.pattern for p in self.patterns]!r})"
+
+    def match(self, path: str, is_dir: bool = False) -> bool:
+        """Returns `True` if the POSIX *path* matches the patterns."""
+
+        if self._combined is not None:
+            return self._combined[is_dir].match(path) is not None
+        for pattern in reversed(self.patterns):
+            if (pattern.dir_regex if is_dir else pattern.file_regex).match(path):
+                return not pattern.negate
+        return False
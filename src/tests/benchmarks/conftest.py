@@ -0,0 +1,87 @@
+"""
+Fixtures for the benchmarks, which generate large synthetic inputs. The size of the inputs can be scaled with the
+`KRAKEN_BENCHMARK_SCALE` environment variable (e.g. `0.1` for a quick run); baselines should only be compared
+between runs with the same scale.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+SCALE = float(os.getenv("KRAKEN_BENCHMARK_SCALE", "1"))
+
+
+def scaled(count: int) -> int:
+    return max(1, int(count * SCALE))
+
+
+@pytest.fixture(scope="session")
+def file_tree(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A tree of 100k small files, 100 files per directory, with a mix of source and build artifacts."""
+
+    root = tmp_path_factory.mktemp("tree")
+    suffixes = [".py", ".pyc", ".txt", ".json", ".so"]
+    num_files = scaled(100_000)
+    for index in range(num_files):
+        directory = root / f"pkg{index // 10_000}" / f"mod{index // 100 % 100}"
+        if index % 100 == 0:
+            (directory / "__pycache__").mkdir(parents=True)
+        name = f"file{index}{suffixes[index % len(suffixes)]}"
+        (directory / ("__pycache__" if name.endswith(".pyc") else "") / name).write_bytes(b"x" * (index % 512))
+    return root
+
+
+@pytest.fixture(scope="session")
+def gitignore_content() -> str:
+    """A `.gitignore` file with 50k lines of comments, blanks and paths in groups of 25 lines."""
+
+    lines = []
+    for index in range(scaled(50_000)):
+        if index % 25 == 0:
+            lines.append(f"# Group {index // 25}")
+        elif index % 25 == 24:
+            lines.append("")
+        else:
+            lines.append(f"/build/{(index * 7919) % 50_000}/*.o")
+    return "\n".join(lines) + "\n"
+
+
+@pytest.fixture(scope="session")
+def dockerfile_content() -> str:
+    """A Dockerfile with 5k lines, a mix of single and multi-line `RUN` commands and other instructions."""
+
+    lines = ["FROM python:3.10"]
+    while len(lines) < scaled(5_000):
+        index = len(lines)
+        if index % 3 == 0:
+            lines += [
+                f"RUN apt-get install -y package{index} \\",
+                "    && rm -rf /var/lib/apt/lists/* \\",
+                "    && echo done",
+            ]
+        elif index % 3 == 1:
+            lines.append(f"RUN pip install package{index}")
+        else:
+            lines.append(f"ENV VAR{index}=value{index}")
+    return "\n".join(lines)
+
+
+@pytest.fixture(scope="session")
+def workspace_manifest() -> dict[str, Any]:
+    """The data of a `Cargo.toml` of a workspace with 500 members and workspace dependencies."""
+
+    num_members = scaled(500)
+    return {
+        "workspace": {
+            "members": [f"crates/crate{index}" for index in range(num_members)],
+            "package": {"version": "0.1.0", "edition": "2021", "license": "MIT"},
+            "dependencies": {
+                f"crate{index}": {"path": f"crates/crate{index}", "version": "0.1.0"} for index in range(num_members)
+            },
+        },
+        "dependencies": {"serde": {"version": "1", "features": ["derive"]}, "tokio": "1"},
+    }
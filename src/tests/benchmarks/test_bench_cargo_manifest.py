@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from kraken.std.cargo.manifest import CargoManifest
+
+
+def test__CargoManifest__of(benchmark: BenchmarkFixture, workspace_manifest: dict[str, Any]) -> None:
+    manifest = benchmark(CargoManifest.of, Path("Cargo.toml"), workspace_manifest)
+    assert manifest.workspace is not None
+
+
+def test__CargoManifest__to_toml_string(benchmark: BenchmarkFixture, workspace_manifest: dict[str, Any]) -> None:
+    manifest = CargoManifest.of(Path("Cargo.toml"), workspace_manifest)
+    benchmark(manifest.to_toml_string)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from kraken.std.dist import ArchiveWriter, add_to_archive, wopen_archive
+
+
+class CollectingArchiveWriter(ArchiveWriter):
+    """Collects the arcnames instead of writing an archive, to measure the tree walk and pattern matching alone."""
+
+    def __init__(self) -> None:
+        self.arcnames: list[str] = []
+
+    def add_file(self, arcname: str, path: Path, st: os.stat_result | None = None, store: bool = False) -> None:
+        self.arcnames.append(arcname)
+
+    def close(self) -> None:
+        pass
+
+
+def test__add_to_archive__walk(benchmark: BenchmarkFixture, file_tree: Path) -> None:
+    def run() -> int:
+        writer = CollectingArchiveWriter()
+        add_to_archive(writer, "dist", file_tree, Path("dist"))
+        return len(writer.arcnames)
+
+    assert benchmark(run) > 0
+
+
+def test__add_to_archive__walk_with_patterns(benchmark: BenchmarkFixture, file_tree: Path) -> None:
+    exclude = ["__pycache__/", "*.so", "/dist/pkg1/**", "*.tmp", "*~", ".git", "node_modules/"]
+    # Directories must match the include patterns, too.
+    include = ["dist", "pkg*", "mod*", "*.py", "*.txt", "*.json"]
+
+    def run() -> int:
+        writer = CollectingArchiveWriter()
+        add_to_archive(writer, "dist", file_tree, Path("dist"), exclude, include)
+        return len(writer.arcnames)
+
+    assert benchmark(run) > 0
+
+
+def test__add_to_archive__zip(benchmark: BenchmarkFixture, file_tree: Path, tmp_path: Path) -> None:
+    # Writing 100k members takes a while, so we only write one of the packages.
+    def run() -> None:
+        with wopen_archive(tmp_path / "dist.zip", "zip", compression_level=6, workers=4) as writer:
+            add_to_archive(writer, "dist", file_tree / "pkg0")
+
+    benchmark.pedantic(run, rounds=3)  # type: ignore[no-untyped-call]
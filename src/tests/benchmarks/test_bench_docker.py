@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from kraken.std.docker.util import update_run_commands
+
+
+def test__update_run_commands(benchmark: BenchmarkFixture, dockerfile_content: str) -> None:
+    result = benchmark(update_run_commands, dockerfile_content, "set -e; ", "; rm -rf /tmp/*")
+    assert result.count("RUN set -e; ") == dockerfile_content.count("RUN ")
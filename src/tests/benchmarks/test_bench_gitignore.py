@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from kraken.std.git.gitignore import parse_gitignore, sort_gitignore
+
+
+def test__parse_gitignore(benchmark: BenchmarkFixture, gitignore_content: str) -> None:
+    result = benchmark(parse_gitignore, gitignore_content)
+    assert len(result.entries) == gitignore_content.count("\n")
+
+
+def test__sort_gitignore(benchmark: BenchmarkFixture, gitignore_content: str) -> None:
+    gitignore = parse_gitignore(gitignore_content)
+    benchmark(sort_gitignore, gitignore)
+
+
+def test__sort_gitignore__render(benchmark: BenchmarkFixture, gitignore_content: str) -> None:
+    benchmark(lambda: sort_gitignore(parse_gitignore(gitignore_content), sort_groups=True).render())
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import subprocess
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from kraken.core.api import Context, Project
+
+from kraken.std.cargo.fingerprint import hash_source_files
+from kraken.std.cargo.tasks import cargo_build_task
+from kraken.std.cargo.tasks.cargo_build_task import CargoBuildTask
+
+
+def test__hash_source_files__matches_patterns_and_skips_directories(tempdir: Path) -> None:
+    for path in ["Cargo.toml", "src/main.rs", "crates/a/Cargo.toml", "crates/a/src/lib.rs", "target/debug/x.rs"]:
+        (tempdir / path).parent.mkdir(parents=True, exist_ok=True)
+        (tempdir / path).write_text(path)
+    (tempdir / "README.md").write_text("")
+
+    hashes = hash_source_files(tempdir, ["*.rs", "Cargo.toml", "*/Cargo.toml"], {"target"})
+    assert sorted(hashes) == ["Cargo.toml", "crates/a/Cargo.toml", "crates/a/src/lib.rs", "src/main.rs"]
+
+
+def test__CargoBuildTask__is_up_to_date_if_fingerprint_is_unchanged(
+    tempdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls: List[Any] = []
+    monkeypatch.setattr(cargo_build_task, "get_toolchain_version", lambda *a: "rustc 1.70.0")
+
+    def call(*args: Any, **kwargs: Any) -> int:
+        calls.append(args)
+        return 0
+
+    monkeypatch.setattr(subprocess, "call", call)
+
+    (tempdir / "src").mkdir()
+    (tempdir / "src" / "main.rs").write_text("fn main() {}")
+    context = Context(tempdir / "build")
+    project = Project("test", tempdir, None, context)
+    task = project.do("cargoBuild", CargoBuildTask, target="check", fingerprint=True)
+
+    # The first build has no fingerprint to compare against.
+    assert task.prepare().is_pending()  # type: ignore[union-attr]
+    assert task.execute().is_succeeded()
+    assert len(calls) == 1
+    assert task.get_fingerprint_file().is_file()
+
+    assert task.prepare().is_up_to_date()  # type: ignore[union-attr]
+    assert task.out_binaries.get() == []
+
+    (tempdir / "src" / "main.rs").write_text("fn main() { println!(); }")
+    assert task.prepare().is_pending()  # type: ignore[union-attr]
+
+    task.env.set({"RUSTFLAGS": "-Copt-level=1"})
+    assert task.prepare().is_pending()  # type: ignore[union-attr]
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+from kraken.std.cargo.messages import CargoArtifact, CargoMessageCollector, get_package_name, is_local_package
+from kraken.std.cargo.tasks.cargo_build_task import with_json_message_format
+
+
+def _artifact(package_id: str, name: str, kind: list[str], filenames: list[str], **kwargs: Any) -> str:
+    message = {
+        "reason": "compiler-artifact",
+        "package_id": package_id,
+        "target": {"kind": kind, "crate_types": kind, "name": name, "src_path": "src/main.rs"},
+        "profile": {"test": False},
+        "filenames": filenames,
+        "executable": None,
+        "fresh": False,
+    }
+    message.update(kwargs)
+    return json.dumps(message)
+
+
+def test__CargoMessageCollector__collects_artifacts_of_local_packages() -> None:
+    collector = CargoMessageCollector()
+    lines = [
+        _artifact(
+            "serde 1.0.0 (registry+https://github.com/rust-lang/crates.io-index)",
+            "serde",
+            ["lib"],
+            ["/t/debug/deps/libserde.rlib"],
+            fresh=True,
+        ),
+        _artifact(
+            "path+file:///w/mylib#0.1.0",
+            "my-lib",
+            ["lib", "cdylib"],
+            ["/t/debug/libmy_lib.rlib", "/t/debug/libmy_lib.so", "/t/debug/libmy_lib.rmeta"],
+        ),
+        _artifact("app 0.1.0 (path+file:///w/app)", "app", ["bin"], ["/t/debug/app"], executable="/t/debug/app"),
+        _artifact(
+            "app 0.1.0 (path+file:///w/app)",
+            "app",
+            ["bin"],
+            ["/t/debug/deps/app-123"],
+            executable="/t/debug/deps/app-123",
+            profile={"test": True},
+        ),
+        json.dumps({"reason": "timing-info", "package_id": "path+file:///w/app#0.1.0", "target": {}, "duration": 1.0}),
+        json.dumps({"reason": "timing-info", "package_id": "path+file:///w/app#0.1.0", "target": {}, "duration": 0.5}),
+        json.dumps({"reason": "build-finished", "success": True}),
+    ]
+    assert all(collector.feed(line) for line in lines)
+    assert not collector.feed("   Compiling app v0.1.0")
+
+    assert collector.binaries == [CargoArtifact("app", Path("/t/debug/app"))]
+    assert collector.libraries == [
+        CargoArtifact("libmy-lib", Path("/t/debug/libmy_lib.rlib")),
+        CargoArtifact("libmy-lib", Path("/t/debug/libmy_lib.so")),
+    ]
+    assert (collector.fresh, collector.rebuilt) == (1, 3)
+    assert collector.timings == {"app": 1.5}
+    assert collector.success is True
+
+
+def test__is_local_package() -> None:
+    assert is_local_package("path+file:///w/app#0.1.0")
+    assert is_local_package("app 0.1.0 (path+file:///w/app)")
+    assert not is_local_package("registry+https://github.com/rust-lang/crates.io-index#serde@1.0.0")
+    assert not is_local_package("serde 1.0.0 (registry+https://github.com/rust-lang/crates.io-index)")
+
+
+def test__get_package_name() -> None:
+    assert get_package_name("path+file:///w/app#0.1.0") == "app"
+    assert get_package_name("path+file:///w/app#my-app@0.1.0") == "my-app"
+    assert get_package_name("registry+https://github.com/rust-lang/crates.io-index#serde@1.0.0") == "serde"
+    assert get_package_name("serde 1.0.0 (registry+https://github.com/rust-lang/crates.io-index)") == "serde"
+
+
+def test__with_json_message_format__combines_with_the_users_message_format() -> None:
+    assert with_json_message_format(["cargo", "build"]) == [
+        "cargo",
+        "build",
+        "--message-format=json-render-diagnostics",
+    ]
+    assert with_json_message_format(["cargo", "build", "--message-format", "short", "--release"]) == [
+        "cargo",
+        "build",
+        "--release",
+        "--message-format=json-render-diagnostics,json-diagnostic-short",
+    ]
+    assert with_json_message_format(["cargo", "build", "--message-format=human"]) == [
+        "cargo",
+        "build",
+        "--message-format=json-render-diagnostics",
+    ]
+    command = ["cargo", "build", "--message-format=json-diagnostic-short"]
+    assert with_json_message_format(command) == command
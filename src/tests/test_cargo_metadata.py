@@ -1,6 +1,11 @@
+from __future__ import annotations
+
 from pathlib import Path
+from typing import Any
+
+import pytest
 
-from kraken.std.cargo.manifest import CargoMetadata
+from kraken.std.cargo.manifest import CargoMetadata, get_workspace_fingerprint
 
 
 def test_cargo_metadata_parses_correctly() -> None:
@@ -145,3 +150,52 @@ def test_cargo_metadata_parses_correctly() -> None:
     members.sort()
     assert members == ["some-bin", "some-lib"]
     assert len(metadata.artifacts) == 5
+
+
+def test_cargo_metadata_read_is_cached_until_the_workspace_changes(
+    tempdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls: list[Path] = []
+
+    def _run_cargo_metadata(project_dir: Path) -> dict[str, Any]:
+        calls.append(project_dir)
+        return {"packages": [], "workspace_members": [], "target_directory": str(project_dir / "target")}
+
+    monkeypatch.setattr(CargoMetadata, "_run_cargo_metadata", staticmethod(_run_cargo_metadata))
+    manifest = tempdir / "Cargo.toml"
+    manifest.write_text('[package]\nname = "foo"\nversion = "0.1.0"\n')
+    cache_file = tempdir / "build" / "cargo-metadata.json"
+
+    CargoMetadata.read(tempdir, cache_file)
+    CargoMetadata.read(tempdir, cache_file)
+    assert len(calls) == 1
+    assert cache_file.is_file()
+
+    # A fresh process only has the on-disk cache to go by.
+    monkeypatch.setattr("kraken.std.cargo.manifest._metadata_cache", {})
+    CargoMetadata.read(tempdir, cache_file)
+    assert len(calls) == 1
+
+    # Changing a manifest or adding a lockfile invalidates the cache.
+    manifest.write_text('[package]\nname = "foo"\nversion = "0.2.0"\n')
+    CargoMetadata.read(tempdir, cache_file)
+    assert len(calls) == 2
+    (tempdir / "Cargo.lock").write_text("version = 3\n")
+    CargoMetadata.read(tempdir, cache_file)
+    assert len(calls) == 3
+
+
+def test_get_workspace_fingerprint_includes_workspace_root(tempdir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("kraken.std.cargo.manifest._fingerprint_files", {})
+    (tempdir / "Cargo.toml").write_text('[workspace]\nmembers = ["member"]\n')
+    (tempdir / "member").mkdir()
+    (tempdir / "member" / "Cargo.toml").write_text('[package]\nname = "member"\nversion = "0.1.0"\n')
+
+    fingerprint = get_workspace_fingerprint(tempdir / "member")
+    assert get_workspace_fingerprint(tempdir / "member") == fingerprint
+
+    (tempdir / "Cargo.lock").write_text("version = 3\n")
+    assert get_workspace_fingerprint(tempdir / "member") != fingerprint
+    fingerprint = get_workspace_fingerprint(tempdir / "member")
+    (tempdir / "Cargo.toml").write_text('[workspace]\nmembers = ["member", "other"]\n')
+    assert get_workspace_fingerprint(tempdir / "member") != fingerprint
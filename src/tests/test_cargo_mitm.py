@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import datetime
+import socket
+import ssl
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Iterator
+from urllib.parse import urlparse
+
+import httpx
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from kraken.common import not_none
+from kraken.core.api import Context, Project
+
+from kraken.std.cargo.mitm import mitm_auth_proxy
+from kraken.std.cargo.mitm_impl import AuthProxyServer, AuthProxyThread, CertificateAuthority
+from kraken.std.cargo.tasks.cargo_auth_proxy_task import CargoAuthProxyTask
+
+
+class EchoAuthHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        body = (self.headers.get("Authorization") or "").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def ca(tempdir: Path) -> CertificateAuthority:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test-ca")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    (tempdir / "ca.pem").write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    (tempdir / "ca.key").write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()
+        )
+    )
+    (tempdir / "certs").mkdir()
+    return CertificateAuthority(tempdir / "ca.pem", tempdir / "ca.key", tempdir / "certs")
+
+
+def _serve(server: HTTPServer) -> Iterator[HTTPServer]:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def upstream() -> Iterator[HTTPServer]:
+    yield from _serve(HTTPServer(("127.0.0.1", 0), EchoAuthHandler))
+
+
+def test__AuthProxyServer__injects_auth_into_plain_http_requests(
+    ca: CertificateAuthority, upstream: HTTPServer
+) -> None:
+    thread = AuthProxyThread(AuthProxyServer({"127.0.0.1": ("user", "pass")}, ca, port=0))
+    thread.start()
+    try:
+        with httpx.Client(proxies=f"http://127.0.0.1:{thread.server.port}") as client:
+            url = f"http://127.0.0.1:{upstream.server_port}/"
+            assert client.get(url).text == "Basic dXNlcjpwYXNz"
+            assert client.get(url, headers={"Authorization": "Bearer foo"}).text == "Bearer foo"
+    finally:
+        thread.stop()
+
+
+def test__AuthProxyServer__intercepts_tls_and_reuses_upstream_connections(
+    tempdir: Path, ca: CertificateAuthority
+) -> None:
+    connections: list[object] = []
+
+    class Server(HTTPServer):
+        def get_request(self):  # type: ignore[no-untyped-def]
+            sock, addr = super().get_request()
+            connections.append(addr)
+            return ca.get_server_context("localhost").wrap_socket(sock, server_side=True), addr
+
+    upstream_context = ssl.create_default_context(cafile=str(tempdir / "ca.pem"))
+    server = AuthProxyServer({"localhost": ("user", "pass")}, ca, port=0, upstream_ssl_context=upstream_context)
+    thread = AuthProxyThread(server)
+
+    for upstream in _serve(Server(("127.0.0.1", 0), EchoAuthHandler)):
+        thread.start()
+        try:
+            for _ in range(2):
+                # Use a new client each time to make sure that the connection to the upstream server is reused.
+                with httpx.Client(proxies=f"http://127.0.0.1:{server.port}", verify=str(tempdir / "ca.pem")) as client:
+                    response = client.get(f"https://localhost:{upstream.server_port}/")
+                    assert response.text == "Basic dXNlcjpwYXNz"
+        finally:
+            thread.stop()
+
+    assert len(connections) == 1
+    assert server.active_requests == 0
+
+
+def test__AuthProxyThread__raises_if_port_is_in_use(ca: CertificateAuthority, upstream: HTTPServer) -> None:
+    with pytest.raises(OSError):
+        AuthProxyThread(AuthProxyServer({}, ca, host="127.0.0.1", port=upstream.server_port)).start()
+
+
+def test__AuthProxyServer__tunnels_other_hosts(ca: CertificateAuthority, upstream: HTTPServer) -> None:
+    async def main() -> bytes:
+        server = AuthProxyServer({"example.org": ("user", "pass")}, ca, port=0)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(f"CONNECT 127.0.0.1:{upstream.server_port} HTTP/1.1\r\n\r\n".encode())
+            assert await reader.readuntil(b"\r\n\r\n") == b"HTTP/1.1 200 Connection established\r\n\r\n"
+            writer.write(b"GET / HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            await server.stop()
+
+    response = asyncio.run(main())
+    assert response.startswith(b"HTTP/1.1 200")
+    assert response.endswith(b"\r\n\r\n")
+
+
+def test__mitm_auth_proxy__accepts_connections_once_entered() -> None:
+    with mitm_auth_proxy({}, port=0) as (proxy_url, _cert_file):
+        url = urlparse(proxy_url)
+        with socket.create_connection((not_none(url.hostname), not_none(url.port)), timeout=1):
+            pass
+
+
+def test__CargoAuthProxyTask__warns_about_deprecated_properties(tempdir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def _mitm_auth_proxy(*args: object, **kwargs: object) -> None:
+        raise OSError("test")
+
+    monkeypatch.setattr("kraken.std.cargo.mitm.mitm_auth_proxy", _mitm_auth_proxy)
+    context = Context(tempdir / "build")
+    project = Project("test", tempdir, None, context)
+    task = project.do("cargoAuthProxy", CargoAuthProxyTask, registries=[], startup_wait_time=1.0, min_lifetime=2.0)
+
+    with pytest.warns(DeprecationWarning) as record, contextlib.ExitStack() as exit_stack:
+        assert task.start_background_task(exit_stack).is_failed()
+    assert sorted(str(w.message).split("`")[1] for w in record) == ["min_lifetime", "startup_wait_time"]
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from kraken.std.cargo.timings import (
+    CrateTimingRegression,
+    compare_crate_timings,
+    read_timings_report,
+    write_timings_report,
+)
+
+
+def test__compare_crate_timings__reports_regressions_beyond_threshold() -> None:
+    previous = {"a": 10.0, "b": 10.0, "c": 0.5, "d": 10.0}
+    current = {"a": 11.0, "b": 15.0, "c": 1.0, "e": 100.0}
+    assert compare_crate_timings(previous, current, threshold=0.2, min_seconds=1.0) == [
+        CrateTimingRegression("b", 10.0, 15.0)
+    ]
+    assert compare_crate_timings(previous, current, threshold=0.2) == [
+        CrateTimingRegression("c", 0.5, 1.0),
+        CrateTimingRegression("b", 10.0, 15.0),
+    ]
+
+
+def test__write_timings_report__can_be_read_back(tempdir: Path) -> None:
+    path = tempdir / "cargo" / "build.timings.json"
+    assert read_timings_report(path) is None
+    write_timings_report(path, {"a": 1.0, "b": 2.0}, [])
+    report = read_timings_report(path)
+    assert report is not None
+    assert list(report["crates"]) == ["b", "a"]
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from kraken.std.cargo.tasks.cargo_workspace_publish_task import get_index_path, publish_in_dependency_order
+
+
+def test_publish_in_dependency_order_publishes_dependencies_first_and_independent_crates_concurrently() -> None:
+    graph = {"core": [], "macros": [], "api": ["core", "macros"], "cli": ["api"], "server": ["api", "core"]}
+    lock = threading.Lock()
+    published: list[str] = []
+    running = 0
+    max_running = 0
+
+    def publish(name: str) -> bool:
+        nonlocal running, max_running
+        with lock:
+            assert all(dep in published for dep in graph[name]), name
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+            published.append(name)
+        return True
+
+    assert publish_in_dependency_order(graph, publish, max_workers=4) == set()
+    assert sorted(published) == sorted(graph)
+    assert max_running >= 2
+
+
+def test_publish_in_dependency_order_skips_dependants_of_failed_crates() -> None:
+    graph = {"core": [], "api": ["core"], "cli": ["api"], "other": []}
+    published: list[str] = []
+
+    def publish(name: str) -> bool:
+        published.append(name)
+        return name != "core"
+
+    assert publish_in_dependency_order(graph, publish, max_workers=2) == {"core", "api", "cli"}
+    assert sorted(published) == ["core", "other"]
+
+
+def test_publish_in_dependency_order_detects_cycles_before_publishing_anything() -> None:
+    published: list[str] = []
+
+    def publish(name: str) -> bool:
+        published.append(name)
+        return True
+
+    graph = {"core": [], "a": ["b", "core"], "b": ["a"], "c": ["a"]}
+    with pytest.raises(ValueError, match="a, b, c"):
+        publish_in_dependency_order(graph, publish, max_workers=1)
+    assert published == []
+
+
+def test_get_index_path() -> None:
+    assert get_index_path("a") == "1/a"
+    assert get_index_path("ab") == "2/ab"
+    assert get_index_path("abc") == "3/a/abc"
+    assert get_index_path("Serde_JSON") == "se/rd/serde_json"
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import os
+import random
+import stat
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+from kraken.core.api import Context, Project
+
+from kraken.std.dist import (
+    ConfiguredResource,
+    DistributionTask,
+    IndividualDistOptions,
+    ParallelGzipWriter,
+    ZipArchiveWriter,
+    add_to_archive,
+    copy_file_data,
+    get_archive_type,
+    walk_tree,
+    wopen_archive,
+    write_raw_zip_member,
+)
+
+
+@pytest.fixture
+def files(tempdir: Path) -> Path:
+    """A directory with files of various sizes and compressibility."""
+
+    rnd = random.Random(42)
+    root = tempdir / "files"
+    (root / "sub" / "dir").mkdir(parents=True)
+    (root / "empty.txt").write_bytes(b"")
+    (root / "small.txt").write_bytes(b"hello world\n")
+    (root / "sub" / "text.txt").write_bytes(b"".join(b"line %d\n" % i for i in range(50000)))
+    (root / "sub" / "dir" / "random.bin").write_bytes(bytes(rnd.getrandbits(8) for _ in range(300000)))
+    for i in range(20):
+        (root / "sub" / f"file{i}.txt").write_bytes(b"x" * rnd.randint(0, 20000))
+    return root
+
+
+def _write(path: Path, type_: str, files: Path, **kwargs: int | None) -> bytes:
+    with wopen_archive(path, type_, **kwargs) as archive:  # type: ignore[arg-type]
+        add_to_archive(archive, "files", files)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize("compression_level", [None, 1, 6, 9])
+def test__ZipArchiveWriter__parallel_output_is_byte_identical(
+    tempdir: Path, files: Path, compression_level: int | None
+) -> None:
+    sequential = _write(tempdir / "a.zip", "zip", files, compression_level=compression_level, workers=1)
+    parallel = _write(tempdir / "b.zip", "zip", files, compression_level=compression_level, workers=4)
+    assert sequential == parallel
+
+
+def test__TarArchiveWriter__parallel_gzip_does_not_depend_on_workers(tempdir: Path, files: Path) -> None:
+    sequential = _write(tempdir / "a.tar.gz", "tar.gz", files, workers=1)
+    parallel_2 = _write(tempdir / "b.tar.gz", "tar.gz", files, workers=2)
+    parallel_8 = _write(tempdir / "c.tar.gz", "tar.gz", files, workers=8)
+    assert parallel_2 == parallel_8
+
+    # The tar payload is the same as with the sequential writer, except for the gzip stream around it.
+    with tarfile.open(fileobj=io.BytesIO(sequential)) as a, tarfile.open(fileobj=io.BytesIO(parallel_8)) as b:
+        assert a.getnames() == b.getnames()
+        for member in a.getmembers():
+            assert a.extractfile(member).read() == b.extractfile(member.name).read()  # type: ignore[union-attr]
+
+
+@pytest.mark.parametrize("size", [0, 1, ParallelGzipWriter.BLOCK_SIZE, ParallelGzipWriter.BLOCK_SIZE * 5 + 17])
+def test__ParallelGzipWriter__output_can_be_decompressed(size: int) -> None:
+    data = b"".join(b"%d " % (i % 1000) for i in range(size))[:size]
+    buffer = io.BytesIO()
+    writer = ParallelGzipWriter(buffer, compression_level=6, workers=3)
+    buffer.close = lambda: None  # type: ignore[method-assign]
+    chunks = [data[i:j] for i, j in zip(range(0, size, 1000), range(1000, size + 1000, 1000))]
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+    assert gzip.decompress(buffer.getvalue()) == data
+
+
+@pytest.mark.parametrize(
+    "filename,archive_type",
+    [
+        ("dist.zip", "zip"),
+        ("dist.tar", "tar"),
+        ("dist.tar.gz", "tar.gz"),
+        ("dist-1.0.0.tgz", "tar.gz"),
+        ("dist.tar.zst", "tar.zst"),
+        ("dist.tzst", "tar.zst"),
+        ("dist.tlz4", "tar.lz4"),
+    ],
+)
+def test__get_archive_type(filename: str, archive_type: str) -> None:
+    assert get_archive_type(Path(filename)) == archive_type
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test__TarArchiveWriter__zstd(tempdir: Path, files: Path, workers: int) -> None:
+    zstandard = pytest.importorskip("zstandard")
+    _write(tempdir / "a.tar.zst", "tar.zst", files, compression_level=3, workers=workers)
+    with (tempdir / "a.tar.zst").open("rb") as fp, zstandard.ZstdDecompressor().stream_reader(fp) as reader:
+        with tarfile.open(fileobj=reader, mode="r|") as archive:
+            assert "files/sub/text.txt" in [m.name for m in archive]
+
+
+def test__TarArchiveWriter__lz4(tempdir: Path, files: Path) -> None:
+    lz4_frame = pytest.importorskip("lz4.frame")
+    _write(tempdir / "a.tar.lz4", "tar.lz4", files)
+    with lz4_frame.open(tempdir / "a.tar.lz4", "rb") as fp, tarfile.open(fileobj=fp, mode="r|") as archive:
+        assert "files/sub/text.txt" in [m.name for m in archive]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test__ZipArchiveWriter__incremental_reuses_unchanged_members(tempdir: Path, files: Path, workers: int) -> None:
+    def write_incremental() -> tuple[bytes, int]:
+        writer = wopen_archive(tempdir / "a.zip", "zip", compression_level=6, workers=workers, incremental=True)
+        with writer:
+            add_to_archive(writer, "files", files)
+        assert isinstance(writer, ZipArchiveWriter)
+        return (tempdir / "a.zip").read_bytes(), writer._reused
+
+    num_files = sum(1 for p in files.rglob("*") if p.is_file())
+    assert write_incremental()[1] == 0
+    assert ZipArchiveWriter.get_manifest_file(tempdir / "a.zip").is_file()
+    assert write_incremental()[1] == num_files
+
+    # Changing the contents of a file recompresses it, touching it only causes the file to be hashed.
+    (files / "small.txt").write_bytes(b"hello kraken\n")
+    text_file = files / "sub" / "text.txt"
+    os.utime(text_file, ns=(text_file.stat().st_atime_ns, text_file.stat().st_mtime_ns + 10**9))
+    data, reused = write_incremental()
+    assert reused == num_files - 1
+    assert data == _write(tempdir / "b.zip", "zip", files, compression_level=6, workers=workers)
+
+    # The previous archive is not reused if the compression settings change.
+    with wopen_archive(tempdir / "a.zip", "zip", compression_level=1, incremental=True) as writer:
+        add_to_archive(writer, "files", files)
+    assert writer._reused == 0  # type: ignore[attr-defined]
+
+
+def test__ZipArchiveWriter__incremental_copies_reused_members_without_buffering(
+    tempdir: Path, files: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    expected = _write(tempdir / "a.zip", "zip", files, compression_level=6, workers=4, incremental=True)
+    # Only members that are compressed again are buffered in a temporary file.
+    monkeypatch.setattr("kraken.std.dist.tempfile", None)
+    assert _write(tempdir / "a.zip", "zip", files, compression_level=6, workers=4, incremental=True) == expected
+
+
+@pytest.mark.parametrize(
+    "archive_type,kwargs",
+    [
+        ("zip", {"compression_level": 6, "workers": 4}),
+        ("zip", {"compression_level": 6, "incremental": True}),
+        ("zip", {}),
+        ("tar", {}),
+    ],
+)
+def test__wopen_archive__falls_back_to_public_api(
+    tempdir: Path, files: Path, monkeypatch: pytest.MonkeyPatch, archive_type: str, kwargs: dict[str, int]
+) -> None:
+    expected = _write(tempdir / f"a.{archive_type}", archive_type, files, **kwargs)
+    monkeypatch.setattr("kraken.std.dist._RAW_WRITE_SUPPORTED", False)
+    assert _write(tempdir / f"b.{archive_type}", archive_type, files, **kwargs) == expected
+    assert _write(tempdir / f"b.{archive_type}", archive_type, files, **kwargs) == expected
+    with pytest.raises(NotImplementedError), zipfile.ZipFile(tempdir / "c.zip", "w") as archive:
+        write_raw_zip_member(archive, zipfile.ZipInfo("a.txt"), 0, 0, io.BytesIO())
+
+
+def test__ZipArchiveWriter__incremental_keeps_previous_archive_on_failure(tempdir: Path, files: Path) -> None:
+    first = _write(tempdir / "a.zip", "zip", files, compression_level=6, incremental=True)
+    manifest = ZipArchiveWriter.get_manifest_file(tempdir / "a.zip").read_text()
+
+    with pytest.raises(FileNotFoundError):
+        with wopen_archive(tempdir / "a.zip", "zip", compression_level=6, incremental=True) as writer:
+            writer.add_file("missing.txt", tempdir / "missing.txt")
+            add_to_archive(writer, "files", files)
+
+    assert (tempdir / "a.zip").read_bytes() == first
+    assert ZipArchiveWriter.get_manifest_file(tempdir / "a.zip").read_text() == manifest
+    assert not (tempdir / "a.zip.tmp").exists()
+
+
+@pytest.mark.parametrize("archive_type", ["zip", "tar", "tar.gz", "tar.xz"])
+def test__wopen_archive__reproducible(
+    tempdir: Path, files: Path, archive_type: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    (files / "link.txt").symlink_to("small.txt")
+
+    def write(path: Path, workers: int = 1) -> bytes:
+        with wopen_archive(path, archive_type, workers=workers, reproducible=True) as archive:
+            add_to_archive(archive, "files", files, follow_symlinks=False)
+            archive.add_file("dir", files / "sub")
+        return path.read_bytes()
+
+    first = write(tempdir / f"a.{archive_type}")
+    for path in [files, *files.rglob("*")]:
+        os.utime(path, (1234567890, 1234567890), follow_symlinks=False)
+    (files / "small.txt").chmod(0o600)
+    (files / "sub").chmod(0o700)
+    assert write(tempdir / f"b.{archive_type}") == first
+    assert write(tempdir / f"b.{archive_type}", workers=4) == first
+
+    if archive_type == "zip":
+        with zipfile.ZipFile(tempdir / "a.zip") as archive:
+            for name in ["files/link.txt", "dir/"]:
+                assert archive.getinfo(name).date_time == (1980, 1, 1, 0, 0, 0)
+            assert stat.S_ISLNK(archive.getinfo("files/link.txt").external_attr >> 16)
+            assert archive.getinfo("dir/").is_dir()
+
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    assert write(tempdir / f"c.{archive_type}") != first
+
+
+def test__DistributionTask__output_sha256(tempdir: Path, files: Path) -> None:
+    context = Context(tempdir / "build")
+    project = Project("test", tempdir, None, context)
+    task = project.do(
+        "dist",
+        DistributionTask,
+        output_file=tempdir / "dist.tar.gz",
+        resources=[ConfiguredResource("files", files, IndividualDistOptions(arcname="files"))],
+        reproducible=True,
+    )
+    task.execute()
+    assert task.output_sha256.get() == hashlib.sha256((tempdir / "dist.tar.gz").read_bytes()).hexdigest()
+
+
+def test__walk_tree__handles_deep_trees_and_symlinks(tempdir: Path) -> None:
+    deep = tempdir / "tree" / "/".join(["d"] * 50)
+    deep.mkdir(parents=True)
+    (deep / "file.txt").write_text("deep")
+    (tempdir / "tree" / "a.txt").write_text("a")
+    (tempdir / "tree" / "link.txt").symlink_to("a.txt")
+    (tempdir / "tree" / "loop").symlink_to(".")
+    (tempdir / "tree" / "broken").symlink_to("does-not-exist")
+
+    members = {arcname: st for arcname, _, st in walk_tree("tree", tempdir / "tree")}
+    assert list(members) == ["tree/a.txt", "tree/broken"] + ["tree/" + "d/" * 50 + "file.txt", "tree/link.txt"]
+    assert stat.S_ISREG(members["tree/link.txt"].st_mode)
+    assert stat.S_ISLNK(members["tree/broken"].st_mode)
+
+    members = {arcname: st for arcname, _, st in walk_tree("tree", tempdir / "tree", follow_symlinks=False)}
+    assert "tree/loop" in members
+    assert stat.S_ISLNK(members["tree/link.txt"].st_mode)
+
+
+@pytest.mark.parametrize("archive_type", ["zip", "tar"])
+def test__ArchiveWriter__add_path_without_following_symlinks(tempdir: Path, archive_type: str) -> None:
+    (tempdir / "tree").mkdir()
+    (tempdir / "tree" / "a.txt").write_text("a")
+    (tempdir / "tree" / "link.txt").symlink_to("a.txt")
+
+    with wopen_archive(tempdir / f"a.{archive_type}", archive_type) as writer:
+        writer.add_path("tree", tempdir / "tree", follow_symlinks=False)
+
+    if archive_type == "zip":
+        with zipfile.ZipFile(tempdir / "a.zip") as zf:
+            info = zf.getinfo("tree/link.txt")
+            assert stat.S_ISLNK(info.external_attr >> 16)
+            assert zf.read(info) == b"a.txt"
+    else:
+        with tarfile.open(tempdir / "a.tar") as tf:
+            assert tf.getmember("tree/link.txt").issym()
+            assert tf.getmember("tree/link.txt").linkname == "a.txt"
+
+
+@pytest.mark.parametrize("archive_type", ["zip", "tar"])
+def test__ArchiveWriter__output_matches_stdlib(tempdir: Path, files: Path, archive_type: str) -> None:
+    data = _write(tempdir / f"a.{archive_type}", archive_type, files)
+    paths = [(arcname, path) for arcname, path, _ in walk_tree("files", files)]
+    if archive_type == "zip":
+        with zipfile.ZipFile(tempdir / "b.zip", "w") as zf:
+            for arcname, path in paths:
+                zf.write(path, arcname)
+    else:
+        with tarfile.open(tempdir / "b.tar", "w") as tf:
+            for arcname, path in paths:
+                tf.add(path, arcname, recursive=False)
+    assert data == (tempdir / f"b.{archive_type}").read_bytes()
+
+
+def test__add_to_archive__stores_matching_files_uncompressed(tempdir: Path, files: Path) -> None:
+    with wopen_archive(tempdir / "a.zip", "zip", compression_level=6, workers=2) as writer:
+        add_to_archive(writer, "files", files, store=["*.bin"])
+    with zipfile.ZipFile(tempdir / "a.zip") as zf:
+        assert zf.getinfo("files/sub/dir/random.bin").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("files/sub/text.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.read("files/sub/dir/random.bin") == (files / "sub" / "dir" / "random.bin").read_bytes()
+        assert zf.testzip() is None
+
+
+@pytest.mark.parametrize("to_file", [True, False])
+def test__copy_file_data(tempdir: Path, to_file: bool) -> None:
+    data = bytes(range(256)) * 4096
+    (tempdir / "src").write_bytes(data)
+    with (tempdir / "src").open("rb") as src, (tempdir / "dest").open("w+b") if to_file else io.BytesIO() as dest:
+        src.seek(100)
+        dest.write(b"header")
+        copy_file_data(src, dest, len(data) - 200)
+        dest.write(b"trailer")
+        assert src.tell() == len(data) - 100
+        dest.seek(0)
+        assert dest.read() == b"header" + data[100:-100] + b"trailer"
+
+        with pytest.raises(EOFError):
+            copy_file_data(src, dest, 1024 * 1024)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import subprocess as sp
+import sys
+from pathlib import Path
+
+import pytest
+
+from kraken.std.python.mypy_daemon import MypyDaemonKey, MypyDaemonPool
+
+# Stands in for dmypy: records the commands and reports the daemon as unhealthy if the `wedged` file exists.
+FAKE_DMYPY = f"""#!{sys.executable}
+import os, sys
+_, _, status_file, command = sys.argv[:4]
+with open(os.environ["DMYPY_LOG"], "a") as fp:
+    fp.write("%s %s\\n" % (command, os.path.basename(status_file)))
+sys.exit(int(command == "status" and os.path.exists(os.environ["DMYPY_WEDGED"])))
+"""
+
+
+@pytest.fixture
+def log_file(tempdir: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    bin_dir = tempdir / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "dmypy").write_text(FAKE_DMYPY)
+    (bin_dir / "dmypy").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    monkeypatch.setenv("DMYPY_LOG", str(tempdir / "log"))
+    monkeypatch.setenv("DMYPY_WEDGED", str(tempdir / "wedged"))
+    (tempdir / "log").touch()
+    return tempdir / "log"
+
+
+def _commands(log_file: Path) -> list[str]:
+    commands = log_file.read_text().splitlines()
+    log_file.write_text("")
+    return [c.split()[0] for c in commands]
+
+
+def test__MypyDaemonPool__restarts_and_evicts_daemons(tempdir: Path, log_file: Path) -> None:
+    config_file = tempdir / "mypy.ini"
+    config_file.write_text("[mypy]\n")
+    pool = MypyDaemonPool(tempdir / "dmypy", max_daemons=2)
+    key_a = MypyDaemonKey(sys.executable, str(config_file), "3.7")
+    key_b = MypyDaemonKey(sys.executable, str(config_file), "3.8")
+    key_c = MypyDaemonKey(sys.executable, None, None)
+
+    # Pretend that `dmypy run` started the daemon.
+    status_file = pool.acquire(key_a)
+    pool.release(key_a)
+    assert _commands(log_file) == []
+    status_file.write_text("{}")
+
+    # A healthy daemon is reused.
+    assert pool.acquire(key_a) == status_file
+    pool.release(key_a)
+    assert _commands(log_file) == ["status"]
+
+    # A daemon that does not respond is killed.
+    (tempdir / "wedged").touch()
+    pool.acquire(key_a)
+    pool.release(key_a)
+    assert _commands(log_file) == ["status", "kill"]
+    assert not status_file.exists()
+    (tempdir / "wedged").unlink()
+
+    # A daemon whose configuration changed is killed.
+    status_file.write_text("{}")
+    config_file.write_text("[mypy]\nstrict = True\n")
+    pool.acquire(key_a)
+    pool.release(key_a)
+    assert _commands(log_file) == ["kill"]
+
+    # The least recently used daemon is stopped when the pool is full.
+    status_file.write_text("{}")
+    pool.acquire(key_b)
+    pool.release(key_b)
+    pool.acquire(key_c)
+    pool.release(key_c)
+    assert _commands(log_file) == ["stop"]
+    assert not status_file.exists()
+
+    # Idle daemons are stopped.
+    pool.get_status_file(key_b).write_text("{}")
+    pool.idle_ttl = 0
+    pool.acquire(key_c)
+    assert _commands(log_file) == ["stop"]
+    assert list(pool._read_state()) == [key_c.digest()]
+
+
+def test__MypyDaemonKey__depends_on_flags() -> None:
+    key = MypyDaemonKey(sys.executable, None, None, ("--strict",))
+    assert key.digest() != MypyDaemonKey(sys.executable, None, None, ()).digest()
+    assert key.digest() == MypyDaemonKey(sys.executable, None, None, ("--strict",)).digest()
+
+
+def test__MypyDaemonPool__acquire_is_safe_across_processes(tempdir: Path, log_file: Path) -> None:
+    script = (
+        "import sys\n"
+        "from pathlib import Path\n"
+        "from kraken.std.python.mypy_daemon import MypyDaemonKey, MypyDaemonPool\n"
+        "pool = MypyDaemonPool(Path(sys.argv[1]), max_daemons=100)\n"
+        "for i in range(10):\n"
+        "    pool.acquire(MypyDaemonKey(sys.executable, None, sys.argv[2] + '.' + str(i)))\n"
+    )
+    processes = [sp.Popen([sys.executable, "-c", script, str(tempdir / "dmypy"), str(index)]) for index in range(8)]
+    assert [p.wait() for p in processes] == [0] * 8
+    assert len(MypyDaemonPool(tempdir / "dmypy")._read_state()) == 80
+
+
+def test__MypyDaemonPool__does_not_stop_leased_daemons(tempdir: Path, log_file: Path) -> None:
+    pool = MypyDaemonPool(tempdir / "dmypy", max_daemons=1, idle_ttl=0)
+    key_a = MypyDaemonKey(sys.executable, None, "3.7")
+    key_b = MypyDaemonKey(sys.executable, None, "3.8")
+
+    # Pretend that another process is running Mypy with the daemon.
+    with sp.Popen(["sleep", "60"]) as other:
+        pool.acquire(key_a).write_text("{}")
+        pool.release(key_a)
+        state = pool._read_state()
+        state[key_a.digest()]["leases"] = [other.pid]
+        pool._write_state(state)
+
+        # The daemon is neither health-checked, evicted nor discarded while it is leased.
+        (tempdir / "wedged").touch()
+        pool.acquire(key_a)
+        pool.acquire(key_b)
+        pool.discard(key_a)
+        assert _commands(log_file) == []
+        assert pool.get_status_file(key_a).exists()
+        assert pool._read_state()[key_a.digest()]["leases"] == [other.pid]
+
+        other.kill()
+
+    # The lease of a process that exited is ignored.
+    pool.release(key_b)
+    pool.acquire(key_b)
+    assert _commands(log_file) == ["stop"]
+    assert not pool.get_status_file(key_a).exists()
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import json
+import subprocess as sp
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytest
+from kraken.core.api import Context, Project
+
+from kraken.std.descriptors.resource import Resource
+from kraken.std.python import PytestTask
+from kraken.std.python.impact import ImpactMap
+from kraken.std.python.tasks.pytest_task import merge_exit_codes, read_test_durations, split_tests
+
+
+def _git(cwd: Path, *args: str) -> None:
+    sp.check_call(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args], cwd=cwd)
+
+
+def test__split_tests__balances_durations() -> None:
+    tests = ["a", "b", "c", "d", "e", "f"]
+    durations = {"a": 1.0, "b": 6.0, "c": 2.0, "d": 3.0, "e": 4.0}
+    shards = split_tests(tests, durations, 3)
+    assert shards == [["a", "b"], ["c", "e"], ["d", "f"]]
+    assert sorted(t for shard in shards for t in shard) == tests
+    assert split_tests(["a"], {}, 2) == [["a"], []]
+
+
+def test__merge_exit_codes() -> None:
+    assert merge_exit_codes([0, 0]) == 0
+    assert merge_exit_codes([0, 5]) == 0
+    assert merge_exit_codes([5, 5]) == 5
+    assert merge_exit_codes([5, 1, 2]) == 1
+    assert merge_exit_codes([0, 5, 3]) == 3
+
+
+def test__PytestTask__junit_xml_without_shards(tempdir: Path) -> None:
+    (tempdir / "src").mkdir()
+    (tempdir / "tests").mkdir()
+    (tempdir / "tests" / "test_a.py").write_text("def test_a():\n    pass\n")
+
+    project = Project("test", tempdir, None, Context(tempdir / "build"))
+    task = project.do("pytest", PytestTask, doctest_modules=False, junit_xml=Path("reports/junit.xml"))
+    assert task.execute().is_succeeded()
+    junit = ET.parse(tempdir / "reports" / "junit.xml").getroot()
+    assert len(junit.findall("testsuite/testcase")) == 1
+
+
+def test__PytestTask__shards(tempdir: Path) -> None:
+    (tempdir / "src").mkdir()
+    (tempdir / "tests").mkdir()
+    (tempdir / "tests" / "test_a.py").write_text(
+        "import os, pytest\n"
+        "@pytest.mark.parametrize('i', range(10))\n"
+        "def test_a(i):\n"
+        "    assert os.environ['KRAKEN_PYTEST_SHARD'] in '0123'\n"
+        "def test_fail():\n"
+        "    assert False\n"
+    )
+
+    project = Project("test", tempdir, None, Context(tempdir / "build"))
+    task = project.do("pytest", PytestTask, shards=4, doctest_modules=False)
+    assert task.execute().is_failed()
+
+    junit = ET.parse(tempdir / "build" / "pytest" / "pytest.junit.xml").getroot()
+    assert junit.find("testsuite").get("tests") == "11"  # type: ignore[union-attr]
+    assert junit.find("testsuite").get("failures") == "1"  # type: ignore[union-attr]
+    assert len(junit.findall("testsuite/testcase")) == 11
+    assert len(read_test_durations(task.get_durations_file())) == 11
+
+
+@pytest.mark.parametrize("shards", [1, 2])
+def test__PytestTask__impact_analysis(tempdir: Path, shards: int) -> None:
+    pytest.importorskip("coverage")
+
+    (tempdir / "src" / "pkg").mkdir(parents=True)
+    (tempdir / "tests").mkdir()
+    (tempdir / "src" / "pkg" / "__init__.py").write_text("")
+    (tempdir / "src" / "pkg" / "a.py").write_text("def f():\n    return 1\n")
+    (tempdir / "src" / "pkg" / "b.py").write_text("def g():\n    return 1\n")
+    (tempdir / "conftest.py").write_text("import sys\nsys.path.insert(0, 'src')\n")
+    (tempdir / "tests" / "test_a.py").write_text("from pkg.a import f\ndef test_a():\n    assert f() > 0\n")
+    (tempdir / "tests" / "test_b.py").write_text("from pkg.b import g\ndef test_b():\n    assert g() > 0\n")
+    (tempdir / ".gitignore").write_text("/build\n__pycache__\n")
+    _git(tempdir, "init", "-q", "-b", "main")
+    _git(tempdir, "add", ".")
+    _git(tempdir, "commit", "-q", "-m", "initial")
+
+    project = Project("test", tempdir, None, Context(tempdir / "build"))
+    task = project.do(
+        "pytest", PytestTask, shards=shards, doctest_modules=False, impact_analysis=True, impact_base_ref="main"
+    )
+
+    def run() -> list[str]:
+        """Run the task and return the IDs of the tests that were deselected."""
+
+        assert task.execute().is_succeeded()
+        deselect_file = task.get_output_directory() / "deselect.json"
+        if not deselect_file.exists():
+            return []
+        deselected: list[str] = json.loads(deselect_file.read_text())
+        deselect_file.unlink()
+        return deselected
+
+    # The first run records the files that the tests depend on.
+    assert run() == []
+    impact_map = ImpactMap.read(task.get_impact_file())
+    assert impact_map is not None
+    assert "src/pkg/a.py" in impact_map.tests["tests/test_a.py::test_a"]
+    assert "src/pkg/b.py" not in impact_map.tests["tests/test_a.py::test_a"]
+
+    (tempdir / "src" / "pkg" / "a.py").write_text("def f():\n    return 2\n")
+    assert run() == ["tests/test_b.py::test_b"]
+    assert run() == ["tests/test_b.py::test_b"]
+    assert ImpactMap.read(task.get_impact_file()).runs_since_full_run == 2  # type: ignore[union-attr]
+
+    # Changing a conftest.py file runs all tests.
+    (tempdir / "conftest.py").write_text("import sys\nsys.path.insert(0, 'src')\n\n")
+    assert run() == []
+    assert ImpactMap.read(task.get_impact_file()).runs_since_full_run == 0  # type: ignore[union-attr]
+
+    # ... but only once, even though it still differs from the base ref.
+    assert run() == ["tests/test_b.py::test_b"]
+
+
+@pytest.mark.parametrize("shards", [1, 2])
+def test__PytestTask__coverage(tempdir: Path, shards: int) -> None:
+    pytest.importorskip("coverage")
+
+    (tempdir / "src" / "pkg").mkdir(parents=True)
+    (tempdir / "tests").mkdir()
+    (tempdir / "src" / "pkg" / "__init__.py").write_text("def f(x):\n    if x:\n        return 1\n    return 2\n")
+    (tempdir / "conftest.py").write_text("import sys\nsys.path.insert(0, 'src')\n")
+    (tempdir / "tests" / "test_a.py").write_text("from pkg import f\ndef test_a():\n    assert f(True) == 1\n")
+    (tempdir / "tests" / "test_b.py").write_text("from pkg import f\ndef test_b():\n    assert f(False) == 2\n")
+
+    project = Project("test", tempdir, None, Context(tempdir / "build"))
+    task = project.do(
+        "pytest", PytestTask, shards=shards, doctest_modules=False, coverage=True, coverage_reports=["xml", "json"]
+    )
+    assert task.execute().is_succeeded()
+
+    reports = {r.name: r.path for r in task.get_outputs(Resource)}
+    assert set(reports) == {"coverage-xml", "coverage-json"}
+    assert ET.parse(reports["coverage-xml"]).getroot().get("line-rate") == "1"
+    assert json.loads(reports["coverage-json"].read_text())["totals"]["percent_covered"] == 100
+    assert not list(task.get_output_directory().glob(".coverage.*"))
+
+
+def test__PytestTask__impact_analysis_with_coverage_records_test_helpers(tempdir: Path) -> None:
+    pytest.importorskip("coverage")
+
+    (tempdir / "src" / "pkg").mkdir(parents=True)
+    (tempdir / "tests").mkdir()
+    (tempdir / "src" / "pkg" / "__init__.py").write_text("def f():\n    return 1\n")
+    (tempdir / "conftest.py").write_text("import sys\nsys.path.insert(0, 'src')\nsys.path.insert(0, 'tests')\n")
+    (tempdir / "tests" / "helpers.py").write_text("def expected():\n    return 1\n")
+    (tempdir / "tests" / "test_a.py").write_text(
+        "from helpers import expected\nfrom pkg import f\ndef test_a():\n    assert f() == expected()\n"
+    )
+    (tempdir / "tests" / "test_b.py").write_text("def test_b():\n    pass\n")
+    (tempdir / ".gitignore").write_text("/build\n__pycache__\n")
+    _git(tempdir, "init", "-q", "-b", "main")
+    _git(tempdir, "add", ".")
+    _git(tempdir, "commit", "-q", "-m", "initial")
+
+    project = Project("test", tempdir, None, Context(tempdir / "build"))
+    task = project.do(
+        "pytest",
+        PytestTask,
+        doctest_modules=False,
+        impact_analysis=True,
+        impact_base_ref="main",
+        coverage=True,
+        coverage_reports=["json"],
+    )
+    assert task.execute().is_succeeded()
+    impact_map = ImpactMap.read(task.get_impact_file())
+    assert impact_map is not None
+    assert "tests/helpers.py" in impact_map.tests["tests/test_a.py::test_a"]
+
+    # The test helpers are measured for the impact map, but not reported.
+    report = json.loads(task.get_coverage_report_file("json").read_text())
+    assert [Path(f).name for f in report["files"]] == ["__init__.py"]
+
+    # The coverage of runs that only run the affected tests is not measured, the reports of the full run are kept.
+    (tempdir / "tests" / "helpers.py").write_text("def expected():\n    return 2\n")
+    assert task.execute().is_failed()
+    assert json.loads((task.get_output_directory() / "deselect.json").read_text()) == ["tests/test_b.py::test_b"]
+    assert json.loads(task.get_coverage_report_file("json").read_text()) == report
+
+    # All tests run if the reports are missing.
+    (tempdir / "tests" / "helpers.py").write_text("def expected():\n    return 1\n")
+    task.get_coverage_report_file("json").unlink()
+    (task.get_output_directory() / "deselect.json").unlink()
+    assert task.execute().is_succeeded()
+    assert not (task.get_output_directory() / "deselect.json").exists()
+    assert task.get_coverage_report_file("json").exists()
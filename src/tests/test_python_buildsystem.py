@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+from kraken.core.api import Context, Project
+
+from kraken.std.python.buildsystem import detect_build_system, is_valid_venv
+from kraken.std.python.buildsystem.poetry import PoetryManagedEnvironment
+from kraken.std.python.buildsystem.slap import SlapManagedEnvironment
+from kraken.std.python.settings import PythonSettings
+
+
+def _make_venv(path: Path) -> Path:
+    (path / "bin").mkdir(parents=True)
+    (path / "pyvenv.cfg").write_text(f"home = {Path(sys.executable).parent}\n")
+    (path / "bin" / "python").symlink_to(sys.executable)
+    return path
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX venv layout")
+def test__PoetryManagedEnvironment__caches_path_in_build_directory(
+    tempdir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    venv = _make_venv(tempdir / "venv")
+    project_dir = tempdir / "project"
+    project_dir.mkdir()
+    (project_dir / "pyproject.toml").write_text("[build-system]\nrequires = ['poetry-core']\n")
+    (project_dir / "poetry.lock").write_text("")
+    monkeypatch.setenv("POETRY_CONFIG_DIR", str(tempdir / "poetry-config"))
+    monkeypatch.setenv("POETRY_CACHE_DIR", str(tempdir / "poetry-cache"))
+    monkeypatch.delenv("POETRY_VIRTUALENVS_IN_PROJECT", raising=False)
+
+    calls = []
+
+    def _get_poetry_environment_path(self: PoetryManagedEnvironment) -> Path | None:
+        calls.append(self)
+        return venv
+
+    monkeypatch.setattr(PoetryManagedEnvironment, "_get_poetry_environment_path", _get_poetry_environment_path)
+
+    def get_path() -> Path:
+        build_system = detect_build_system(project_dir, tempdir / "build")
+        assert build_system is not None
+        return build_system.get_managed_environment().get_path()
+
+    assert is_valid_venv(venv)
+    assert get_path() == venv
+    assert get_path() == venv
+    assert len(calls) == 1
+
+    # Changing the lock file invalidates the cache.
+    (project_dir / "poetry.lock").write_text("# changed\n")
+    assert get_path() == venv
+    assert len(calls) == 2
+
+    # So does removing the environment.
+    (venv / "pyvenv.cfg").unlink()
+    assert not is_valid_venv(venv)
+    assert get_path() == venv
+    assert len(calls) == 3
+    (venv / "pyvenv.cfg").write_text(f"home = {Path(sys.executable).parent}\n")
+
+    # So does changing Poetry's global configuration, `poetry env use` or the Poetry environment variables.
+    (tempdir / "poetry-config").mkdir()
+    (tempdir / "poetry-config" / "config.toml").write_text("[virtualenvs]\nin-project = true\n")
+    assert get_path() == venv
+    assert len(calls) == 4
+    (tempdir / "poetry-cache" / "virtualenvs").mkdir(parents=True)
+    (tempdir / "poetry-cache" / "virtualenvs" / "envs.toml").write_text("[project]\nminor = '3.11'\n")
+    assert get_path() == venv
+    assert len(calls) == 5
+    monkeypatch.setenv("POETRY_VIRTUALENVS_IN_PROJECT", "false")
+    assert get_path() == venv
+    assert get_path() == venv
+    assert len(calls) == 6
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX venv layout")
+def test__SlapManagedEnvironment__install_clears_cache(tempdir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    venv = _make_venv(tempdir / "venv")
+    monkeypatch.setattr(SlapManagedEnvironment, "_get_slap_environment_path", lambda self: venv)
+    monkeypatch.setattr("subprocess.check_call", lambda *args, **kwargs: 0)
+    env = SlapManagedEnvironment(tempdir, tempdir / "build")
+    env.get_path()
+    assert (tempdir / "build" / "python" / "managed-env.json").is_file()
+
+    env.install(PythonSettings(Project("test", tempdir, None, Context(tempdir / "build"))))
+    assert not (tempdir / "build" / "python" / "managed-env.json").exists()
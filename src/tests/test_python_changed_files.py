@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import subprocess as sp
+from pathlib import Path
+from typing import Any
+
+import pytest
+from kraken.core.api import Context, Project
+
+from kraken.std.git import git_changed_files
+from kraken.std.python import BlackTask, Flake8Task, PyUpgradeCheckTask, PyUpgradeTask
+
+
+def _git(cwd: Path, *args: str) -> None:
+    sp.check_call(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args], cwd=cwd)
+
+
+@pytest.fixture
+def repo(tempdir: Path) -> Path:
+    (tempdir / "src").mkdir()
+    (tempdir / "src" / "a.py").write_text("a = 1\n")
+    (tempdir / "src" / "b.py").write_text("b = 1\n")
+    (tempdir / "pyproject.toml").write_text("")
+    (tempdir / ".gitignore").write_text("/build\n")
+    _git(tempdir, "init", "-q", "-b", "main")
+    _git(tempdir, "add", ".")
+    _git(tempdir, "commit", "-q", "-m", "initial")
+    _git(tempdir, "checkout", "-q", "-b", "feature")
+    return tempdir.resolve()
+
+
+def test__git_changed_files(repo: Path) -> None:
+    (repo / "src" / "a.py").write_text("a = 2\n")
+    _git(repo, "commit", "-q", "-am", "change a")
+    (repo / "src" / "b.py").unlink()
+    (repo / "src" / "c.py").write_text("c = 1\n")
+    assert git_changed_files(repo, "main") == [repo / "src" / "a.py", repo / "src" / "b.py", repo / "src" / "c.py"]
+    assert git_changed_files(repo / "src", "main", untracked=False) == [repo / "src" / "a.py", repo / "src" / "b.py"]
+
+    with pytest.raises(ValueError):
+        git_changed_files(repo, "does-not-exist")
+
+
+def test__EnvironmentAwareDispatchTask__changed_files_only(repo: Path) -> None:
+    project = Project("test", repo, None, Context(repo / "build"))
+    black = project.do("black", BlackTask, changed_files_only=True, changed_files_base_ref="main")
+    flake8 = project.do("flake8", Flake8Task, changed_files_only=True, changed_files_base_ref="main")
+
+    assert black.execute().is_skipped()
+
+    (repo / "src" / "a.py").write_text("a = 2\n")
+    (repo / "README.md").write_text("")
+    black._changed_files = black.get_changed_files()
+    assert black.get_execute_command() == ["black", str(repo / "src" / "a.py")]
+
+    # Changes to configuration files, including those specific to the tool, cause a full run.
+    (repo / ".flake8").write_text("")
+    black._changed_files = black.get_changed_files()
+    flake8._changed_files = flake8.get_changed_files()
+    assert black.get_execute_command() == ["black", str(repo / "src" / "a.py")]
+    assert flake8._changed_files is None
+    assert flake8.get_execute_command() == ["flake8", "src"]
+
+
+def test__PyUpgradeTask__changed_files_only(repo: Path) -> None:
+    project = Project("test", repo, None, Context(repo / "build"))
+    kwargs: dict[str, Any] = {
+        "additional_files": [Path("src")],
+        "changed_files_only": True,
+        "changed_files_base_ref": "main",
+    }
+    pyupgrade = project.do("pyupgrade", PyUpgradeTask, **kwargs)
+    check = project.do("pyupgrade.check", PyUpgradeCheckTask, **kwargs)
+
+    assert pyupgrade.execute().is_skipped()
+    assert check.execute().is_skipped()
+
+    (repo / "src" / "a.py").write_text("a = 2\n")
+    pyupgrade._changed_files = pyupgrade.get_changed_files()
+    assert pyupgrade.get_files() == [repo / "src" / "a.py"]
+    assert pyupgrade.get_execute_command()[-1:] == [str(repo / "src" / "a.py")]
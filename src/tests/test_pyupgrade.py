@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+from kraken.core.api import Context, Project
+
+from kraken.std.python import PyUpgradeCheckTask
+
+# Stands in for pyupgrade: replaces `OLD` with `NEW` in the files and records which files it was called with.
+FAKE_PYUPGRADE = f"""#!{sys.executable}
+import os, sys
+files = [a for a in sys.argv[1:] if not a.startswith("--")]
+with open(os.environ["PYUPGRADE_LOG"], "a") as fp:
+    fp.write("%d\\n" % len(files))
+changed = False
+for file in files:
+    with open(file) as fp:
+        content = fp.read()
+    if "OLD" in content:
+        changed = True
+        with open(file, "w") as fp:
+            fp.write(content.replace("OLD", "NEW"))
+sys.exit(int(changed))
+"""
+
+
+@pytest.fixture
+def log_file(tempdir: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    bin_dir = tempdir / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "pyupgrade").write_text(FAKE_PYUPGRADE)
+    (bin_dir / "pyupgrade").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{sys.exec_prefix}/bin:/usr/bin:/bin")
+    monkeypatch.setenv("PYUPGRADE_LOG", str(tempdir / "log"))
+    monkeypatch.delenv("VIRTUAL_ENV", raising=False)
+    return tempdir / "log"
+
+
+def test__PyUpgradeCheckTask__shards_files_and_caches_clean_files(tempdir: Path, log_file: Path) -> None:
+    src = tempdir / "src"
+    (src / "excluded").mkdir(parents=True)
+    for i in range(50):
+        (src / f"mod{i}.py").write_text(f"x = {i}\n")
+    (src / "excluded" / "mod.py").write_text("OLD\n")
+
+    project = Project("test", tempdir, None, Context(tempdir / "build"))
+    task = project.do(
+        "pyupgrade.check",
+        PyUpgradeCheckTask,
+        additional_files=[Path("src")],
+        exclude=[Path("src/excluded")],
+        workers=2,
+    )
+
+    # Files created after the task was configured are picked up, too.
+    (src / "mod50.py").write_text("OLD\n")
+    assert task.execute().is_failed()
+    assert sorted(map(int, log_file.read_text().split())) == [25, 26]
+    assert (src / "mod50.py").read_text() == "OLD\n"
+
+    # Only the file that pyupgrade would change is checked again.
+    log_file.unlink()
+    assert task.execute().is_failed()
+    assert log_file.read_text().split() == ["1"]
+
+    log_file.unlink()
+    (src / "mod50.py").write_text("NEW\n")
+    assert task.execute().is_succeeded()
+    assert log_file.read_text().split() == ["1"]
+
+    log_file.unlink()
+    assert task.execute().is_succeeded()
+    assert not log_file.exists()
+
+    # Changing the settings invalidates the cache.
+    task.keep_runtime_typing.set(True)
+    assert task.execute().is_succeeded()
+    assert sum(map(int, log_file.read_text().split())) == 51
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import os
+import socket
+import sys
+import textwrap
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from kraken.std.sccache import (
+    GcsCache,
+    LocalCache,
+    MemcachedCache,
+    RedisCache,
+    S3Cache,
+    SccacheManager,
+    SccacheServerRefs,
+    SccacheStats,
+    TieredCache,
+    get_hit_rate_drop,
+    is_server_listening,
+)
+
+FAKE_SCCACHE = """
+import os, signal, socket, subprocess, sys, time
+port = int(os.environ["SCCACHE_SERVER_PORT"])
+pid_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.pid")
+if sys.argv[1:] == ["--start-server"]:
+    code = "import socket, sys, time; s = socket.socket(); s.bind(('127.0.0.1', int(sys.argv[1]))); s.listen(); "
+    code += "time.sleep(60)"
+    proc = subprocess.Popen([sys.executable, "-c", code, str(port)])
+    with open(pid_file, "w") as fp:
+        fp.write(str(proc.pid))
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+elif sys.argv[1:] == ["--stop-server"]:
+    os.kill(int(open(pid_file).read()), signal.SIGTERM)
+    os.remove(pid_file)
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            time.sleep(0.05)
+        except OSError:
+            break
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@pytest.fixture
+def fake_sccache(tempdir: Path) -> Path:
+    path = tempdir / "sccache"
+    path.write_text(f"#!{sys.executable}\n" + textwrap.dedent(FAKE_SCCACHE))
+    path.chmod(0o755)
+    return path
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the fake sccache binary is a Python script with a shebang")
+def test__SccacheManager__shares_server_and_last_user_stops_it(tempdir: Path, fake_sccache: Path) -> None:
+    port = _free_port()
+    first = SccacheManager(None, bin=fake_sccache, port=port, state_dir=tempdir / "state")
+    second = SccacheManager(None, bin=fake_sccache, port=port, state_dir=tempdir / "state")
+
+    first.start()
+    assert is_server_listening(port)
+    server_pid = (tempdir / "server.pid").read_text()
+
+    second.start()
+    assert (tempdir / "server.pid").read_text() == server_pid, "second manager should attach to the running server"
+    refs_file = tempdir / "state" / f"{first.get_cache_key()}.json"
+    assert SccacheServerRefs.load(refs_file).pids == [os.getpid(), os.getpid()]
+
+    first.stop()
+    assert is_server_listening(port)
+    second.stop()
+    assert not is_server_listening(port)
+    assert not refs_file.exists()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the fake sccache binary is a Python script with a shebang")
+def test__SccacheManager__shares_server_for_same_cache_location_on_other_port(
+    tempdir: Path, fake_sccache: Path
+) -> None:
+    port, other_port = _free_port(), _free_port()
+    cache = LocalCache(tempdir / "cache")
+    first = SccacheManager(cache, bin=fake_sccache, port=port, state_dir=tempdir / "state")
+    second = SccacheManager(cache, bin=fake_sccache, port=other_port, state_dir=tempdir / "state")
+
+    first.start()
+    second.start()
+    try:
+        assert second.get_port() == port
+        assert second.get_env()["SCCACHE_SERVER_PORT"] == str(port)
+        assert not is_server_listening(other_port)
+    finally:
+        second.stop()
+        first.stop()
+    assert not is_server_listening(port)
+    assert second.get_port() == other_port
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the fake sccache binary is a Python script with a shebang")
+def test__SccacheManager__rejects_server_with_different_cache_config(tempdir: Path, fake_sccache: Path) -> None:
+    port = _free_port()
+    first = SccacheManager(LocalCache(tempdir / "a"), bin=fake_sccache, port=port, state_dir=tempdir / "state")
+    second = SccacheManager(LocalCache(tempdir / "b"), bin=fake_sccache, port=port, state_dir=tempdir / "state")
+    first.start()
+    try:
+        with pytest.raises(RuntimeError, match="different cache configuration"):
+            second.start()
+    finally:
+        first.stop()
+
+
+def _simulate_crash(refs_file: Path) -> None:
+    refs = SccacheServerRefs.load(refs_file)
+    refs.pids = [2**22 + 12345]
+    refs.save()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the fake sccache binary is a Python script with a shebang")
+def test__SccacheManager__takes_over_server_left_behind_by_crashed_run(tempdir: Path, fake_sccache: Path) -> None:
+    port = _free_port()
+    crashed = SccacheManager(None, bin=fake_sccache, port=port, state_dir=tempdir / "state")
+    crashed.start()
+    server_pid = (tempdir / "server.pid").read_text()
+    refs_file = tempdir / "state" / f"{crashed.get_cache_key()}.json"
+    _simulate_crash(refs_file)
+
+    manager = SccacheManager(None, bin=fake_sccache, port=port, state_dir=tempdir / "state")
+    manager.start()
+    assert (tempdir / "server.pid").read_text() == server_pid
+    refs = SccacheServerRefs.load(refs_file)
+    assert (refs.pids, refs.owner, refs.external) == ([os.getpid()], os.getpid(), False)
+    manager.stop()
+    assert not is_server_listening(port)
+    assert not refs_file.exists()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the fake sccache binary is a Python script with a shebang")
+def test__SccacheManager__restarts_server_left_behind_for_other_cache_config(tempdir: Path, fake_sccache: Path) -> None:
+    port = _free_port()
+    crashed = SccacheManager(LocalCache(tempdir / "a"), bin=fake_sccache, port=port, state_dir=tempdir / "state")
+    crashed.start()
+    server_pid = (tempdir / "server.pid").read_text()
+    crashed_refs_file = tempdir / "state" / f"{crashed.get_cache_key()}.json"
+    _simulate_crash(crashed_refs_file)
+
+    manager = SccacheManager(LocalCache(tempdir / "b"), bin=fake_sccache, port=port, state_dir=tempdir / "state")
+    manager.start()
+    assert (tempdir / "server.pid").read_text() != server_pid
+    assert not crashed_refs_file.exists()
+    manager.stop()
+    assert not is_server_listening(port)
+
+
+def test__SccacheServerRefs__prunes_dead_processes(tempdir: Path) -> None:
+    refs = SccacheServerRefs(tempdir / "refs.json", [os.getpid(), 2**22 + 12345], 4226)
+    refs.save()
+    assert SccacheServerRefs.load(tempdir / "refs.json") == SccacheServerRefs(
+        tempdir / "refs.json", [os.getpid()], 4226
+    )
+
+
+SCCACHE_STATS_JSON = {
+    "stats": {
+        "compile_requests": 20,
+        "cache_hits": {"counts": {"Rust": 12, "C/C++": 3}, "adv_counts": {}},
+        "cache_misses": {"counts": {"Rust": 5}, "adv_counts": {}},
+        "cache_read_errors": 0,
+        "cache_write_errors": 1,
+        "compiler_write_duration": {"secs": 10, "nanos": 500000000},
+        "compilations": 5,
+    },
+    "cache_location": 'Local disk: "/home/user/.cache/sccache"',
+    "cache_size": 1024,
+    "max_cache_size": 10737418240,
+}
+
+
+def test__SccacheStats__from_json() -> None:
+    stats = SccacheStats.from_json(SCCACHE_STATS_JSON)
+    assert stats.cache_location == 'Local disk: "/home/user/.cache/sccache"'
+    assert stats.hits == {"Rust": 12, "C/C++": 3}
+    assert stats.misses == {"Rust": 5}
+    assert stats.cache_write_errors == 1
+    assert stats.hit_rate == 0.75
+    assert stats.average_compile_time == 2.1
+
+
+def test__SccacheStats__delta() -> None:
+    start = SccacheStats("", hits={"Rust": 10}, misses={"Rust": 2}, compilations=2, compilation_time=4.0)
+    end = SccacheStats("", hits={"Rust": 12, "C/C++": 3}, misses={"Rust": 5}, compilations=5, compilation_time=10.0)
+    delta = end - start
+    assert delta.hits == {"Rust": 2, "C/C++": 3}
+    assert delta.misses == {"Rust": 3}
+    assert delta.hit_rate == 0.625
+    assert delta.average_compile_time == 2.0
+    assert (start - start).hit_rate is None
+
+
+def test__get_hit_rate_drop() -> None:
+    assert get_hit_rate_drop([], 0.5) is None
+    assert get_hit_rate_drop([{"hit_rate": None}], 0.5) is None
+    history = [{"hit_rate": 0.0}] + [{"hit_rate": 0.9}] * 10
+    assert get_hit_rate_drop(history, 0.5) == pytest.approx(0.4)
+
+
+@pytest.fixture
+def listening_port() -> Iterator[int]:
+    """A local socket that stands in for a Redis, Memcached or MinIO server."""
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        yield int(sock.getsockname()[1])
+
+
+def test__cache_configs__to_env() -> None:
+    assert S3Cache("bucket", endpoint="http://127.0.0.1:9000", access_key_id="a", secret_access_key="b").to_env() == {
+        "SCCACHE_BUCKET": "bucket",
+        "SCCACHE_ENDPOINT": "http://127.0.0.1:9000",
+        "SCCACHE_S3_USE_SSL": "false",
+        "AWS_ACCESS_KEY_ID": "a",
+        "AWS_SECRET_ACCESS_KEY": "b",
+    }
+    assert RedisCache("redis://127.0.0.1:6379", expiration=3600).to_env() == {
+        "SCCACHE_REDIS": "redis://127.0.0.1:6379",
+        "SCCACHE_REDIS_EXPIRATION": "3600",
+    }
+    assert MemcachedCache("tcp://127.0.0.1:11211", key_prefix="ci").to_env() == {
+        "SCCACHE_MEMCACHED": "tcp://127.0.0.1:11211",
+        "SCCACHE_MEMCACHED_KEY_PREFIX": "ci",
+    }
+    assert GcsCache("bucket", read_only=True).to_env() == {
+        "SCCACHE_GCS_BUCKET": "bucket",
+        "SCCACHE_GCS_RW_MODE": "READ_ONLY",
+    }
+
+
+def test__cache_configs__is_available(listening_port: int) -> None:
+    closed_port = _free_port()
+    assert RedisCache(f"redis://127.0.0.1:{listening_port}/0").is_available()
+    assert not RedisCache(f"redis://127.0.0.1:{closed_port}/0").is_available()
+    assert MemcachedCache(f"tcp://127.0.0.1:{listening_port}").is_available()
+    assert S3Cache("bucket", endpoint=f"http://127.0.0.1:{listening_port}").is_available()
+    assert not S3Cache("bucket", endpoint=f"http://127.0.0.1:{closed_port}").is_available()
+
+
+def test__TieredCache__falls_back_if_fast_cache_is_unavailable(tempdir: Path, listening_port: int) -> None:
+    fallback = LocalCache(tempdir)
+    fast = RedisCache(f"redis://127.0.0.1:{listening_port}")
+    assert TieredCache(fast, fallback).resolve() is fast
+    assert TieredCache(RedisCache(f"redis://127.0.0.1:{_free_port()}"), fallback).to_env() == fallback.to_env()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from fnmatch import fnmatch
+
+import pytest
+
+from kraken.std.util.pathmatch import PathMatcher
+
+PATHS = [
+    "README.md",
+    "src/main.py",
+    "src/pkg/__init__.py",
+    "src/pkg/test_main.py",
+    "build/dist/app.tar.gz",
+    "node_modules/foo/index.js",
+    "docs/[draft].md",
+    "a/b/c/d.txt",
+]
+
+
+@pytest.mark.parametrize("pattern", ["*.py", "src/*", "build", "*/pkg/*", "test_*.py", "[!s]*", "?.txt", "*[draft]*"])
+def test__PathMatcher__matches_like_fnmatch_on_path_and_name(pattern: str) -> None:
+    matcher = PathMatcher([pattern])
+    for path in PATHS:
+        expected = fnmatch(path, pattern) or fnmatch(path.rpartition("/")[2], pattern)
+        assert matcher.match(path) == expected, path
+
+
+@pytest.mark.parametrize(
+    "patterns,path,is_dir,expected",
+    [
+        (["/build"], "build", True, True),
+        (["/build"], "src/build", True, False),
+        (["/build"], "build/dist/app.tar.gz", False, True),
+        (["build/"], "build", False, False),
+        (["build/"], "src/build", True, True),
+        (["build/"], "src/build/app", False, True),
+        (["/src/*.py"], "src/main.py", False, True),
+        (["/src/*.py"], "src/pkg/__init__.py", False, False),
+        (["**/pkg"], "src/pkg", True, True),
+        (["**/pkg"], "pkg", True, True),
+        (["src/**"], "src/pkg/test_main.py", False, True),
+        (["src/**"], "src", True, False),
+        (["a/**/d.txt"], "a/d.txt", False, True),
+        (["a/**/d.txt"], "a/b/c/d.txt", False, True),
+        (["a/**/d.txt"], "b/a/d.txt", False, False),
+        (["*.py", "!test_*.py"], "src/main.py", False, True),
+        (["*.py", "!test_*.py"], "src/pkg/test_main.py", False, False),
+        (["*.py", "!test_*.py", "/src/pkg/test_main.py"], "src/pkg/test_main.py", False, True),
+        (["\\!important"], "!important", False, True),
+        ([], "README.md", False, False),
+    ],
+)
+def test__PathMatcher__gitignore_semantics(patterns: list[str], path: str, is_dir: bool, expected: bool) -> None:
+    assert PathMatcher(patterns).match(path, is_dir) == expected